@@ -0,0 +1,88 @@
+""" RBTree against AVLTree on read/write mixes, the choice behind TaskManagerApp's --backend
+
+run from src/:  python -m benchmarks.backends [n_tasks] [n_ops]
+"""
+
+import random
+import sys
+import time
+
+from structs.avl import AVLTree
+from structs.bplus_tree import BPlusTree
+from structs.rbt import RBTree
+
+BACKENDS = (RBTree, AVLTree, BPlusTree)
+REPEATS = 3
+# share of lookups, the rest is split evenly between inserts and deletes
+MIXES = {"read only": 1., "read heavy (95% reads)": .95, "balanced (50%)": .5, "write heavy (10%)": .1}
+
+
+def mean_depth(tree) -> float:
+    total, stack = 0, [(tree.root, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if node != tree.nil:
+            total += depth
+            stack += [(node.left, depth + 1), (node.right, depth + 1)]
+    return total / max(1, len(tree))
+
+
+def operations(n_tasks: int, n_ops: int, reads: float, seed: int) -> list:
+    """ ("search" | "insert" | "delete", priority) with every delete hitting a live key and every insert a new one """
+
+    rng = random.Random(seed)
+    live = list(range(0, 2 * n_tasks, 2))
+    fresh = 2 * n_tasks + 1
+    ops = []
+    for _ in range(n_ops):
+        roll = rng.random()
+        if roll < reads:
+            ops.append(("search", live[rng.randrange(len(live))]))
+        elif roll < reads + (1 - reads) / 2:
+            ops.append(("insert", fresh))
+            live.append(fresh)
+            fresh += 2
+        else:
+            index = rng.randrange(len(live))
+            live[index], live[-1] = live[-1], live[index]
+            ops.append(("delete", live.pop()))
+    return ops
+
+
+def run(tree, ops: list) -> float:
+    search, insert, delete = tree.search, tree.insert, tree.delete
+    start_time = time.time()
+    for op, priority in ops:
+        if op == "search":
+            search(priority)
+        elif op == "insert":
+            insert(priority, "task")
+        else:
+            delete(priority)
+    return len(ops) / (time.time() - start_time)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    n_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 10 ** 6
+    keys = list(range(0, 2 * n_tasks, 2))
+    shuffled = random.Random(0).sample(keys, n_tasks)
+
+    for tree_cls in BACKENDS:
+        if not tree_cls.drawable:
+            continue
+        tree = tree_cls()
+        for key in shuffled:
+            tree.insert(key, "task")
+        print(f"{tree_cls.__name__}: mean depth {mean_depth(tree):.2f} after {n_tasks} random inserts")
+
+    for name, reads in MIXES.items():
+        ops = operations(n_tasks, n_ops, reads, seed=1)
+        results = {}
+        for tree_cls in BACKENDS:
+            # best of a few runs on fresh trees, the first one also warms up caches and the allocator
+            results[tree_cls.__name__] = max(run(tree_cls.from_sorted((key, "task") for key in keys), ops)
+                                             for _ in range(REPEATS))
+        winner = max(results, key=results.get)
+        print(f"{name}: " + ", ".join(f"{backend} {rate:,.0f} ops/s" for backend, rate in results.items())
+              + f" -> {winner}")
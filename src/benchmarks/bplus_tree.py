@@ -0,0 +1,61 @@
+""" BPlusTree against the binary trees: memory per task, lookup latency and range scans at a few fanouts
+
+run from src/:  python -m benchmarks.bplus_tree [n_tasks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+from structs.avl import AVLTree
+from structs.bplus_tree import BPlusTree
+from structs.rbt import RBTree
+
+N_LOOKUPS = 200_000
+N_SCANS = 1_000
+SCAN_LENGTH = 1_000
+
+
+def build(factory, n_tasks: int):
+    """ (tree, bytes per task) of a bulk build; one shared task string so only the structure is measured """
+
+    tracemalloc.start()
+    tree = factory((priority, "task") for priority in range(n_tasks))
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree, mem_usage / n_tasks
+
+
+def lookup_latency(tree, priorities) -> float:
+    search = tree.search
+    start_time = time.perf_counter()
+    for priority in priorities:
+        search(priority)
+    return (time.perf_counter() - start_time) / len(priorities)
+
+
+def scan_throughput(tree, starts) -> float:
+    start_time = time.perf_counter()
+    count = sum(1 for start in starts for _ in tree.range(start, start + SCAN_LENGTH - 1))
+    return count / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    rng = random.Random(0)
+    priorities = [rng.randrange(n_tasks) for _ in range(N_LOOKUPS)]
+    starts = [rng.randrange(max(1, n_tasks - SCAN_LENGTH)) for _ in range(N_SCANS)]
+
+    backends = {"RBTree": RBTree.from_sorted, "AVLTree": AVLTree.from_sorted}
+    for fanout in (16, 64, 256):
+        backends[f"BPlusTree({fanout})"] = partial(BPlusTree.from_sorted, fanout=fanout)
+
+    for name, factory in backends.items():
+        tree, per_task = build(factory, n_tasks)
+        latency = lookup_latency(tree, priorities)
+        scanned = scan_throughput(tree, starts)
+        print(f"{name:>15}: {per_task:6.1f} bytes/task, search {latency * 1e6:5.2f}us, "
+              f"range scan {scanned:,.0f} tasks/s")
+        del tree
@@ -0,0 +1,50 @@
+""" bulk load and batched insert vs one insert per task
+
+run from src/:  python -m benchmarks.bulk_load [n_tasks]
+"""
+
+import gc
+import random
+import sys
+import time
+
+from structs.rbt import RBTree
+
+
+def timed(action):
+    """ runs action on a clean heap so trees from previous runs do not slow down the collector """
+
+    gc.collect()
+    start_time = time.time()
+    action()
+    return time.time() - start_time
+
+
+def insert_one_by_one(items):
+    rbt = RBTree()
+    for priority, task in items:
+        rbt.insert(priority, task)
+    return rbt
+
+
+def insert_in_two_batches(items):
+    half = len(items) // 2
+    rbt = RBTree()
+    rbt.insert_many(items[:half])
+    rbt.insert_many(items[half:])
+    return rbt
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    items = [(priority, f"task {priority}") for priority in range(n_tasks)]
+    shuffled = random.sample(items, n_tasks)
+
+    baseline = timed(lambda: insert_one_by_one(shuffled))
+    print(f"insert one by one: {baseline:.2f}s")
+
+    exec_time = timed(lambda: RBTree.from_sorted(items))
+    print(f"from_sorted: {exec_time:.2f}s ({baseline / exec_time:.1f}x faster)")
+
+    exec_time = timed(lambda: insert_in_two_batches(shuffled))
+    print(f"insert_many, two unsorted batches: {exec_time:.2f}s ({baseline / exec_time:.1f}x faster)")
@@ -0,0 +1,75 @@
+""" ConcurrentRBTree throughput over reader/writer mixes, against one global lock around RBTree
+
+run from src/:  python -m benchmarks.concurrent_throughput [n_tasks] [n_threads]
+"""
+
+import random
+import sys
+import threading
+import time
+
+from structs.concurrent_rbt import ConcurrentRBTree
+from structs.rbt import RBTree
+
+
+class GlobalLockTree:
+    """ what producers did before: every call serialized behind one mutex """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.lock = threading.Lock()
+
+    def search(self, value):
+        with self.lock:
+            return self.tree.search(value)
+
+    def range(self, lo, hi):
+        with self.lock:
+            return list(self.tree.range(lo, hi))
+
+    def insert(self, value, task):
+        with self.lock:
+            self.tree.insert(value, task)
+
+    def delete(self, value):
+        with self.lock:
+            self.tree.delete(value)
+
+
+def worker(tree, n_ops, read_share, n_tasks, seed):
+    rng = random.Random(seed)
+    for _ in range(n_ops):
+        key = rng.randrange(n_tasks)
+        if rng.random() < read_share:
+            if rng.random() < 0.9:
+                tree.search(key)
+            else:
+                tree.range(key, key + 50)
+        elif rng.random() < 0.5:
+            tree.insert(key, "task")
+        else:
+            tree.delete(key)
+
+
+def ops_per_second(tree, n_threads, n_ops, read_share, n_tasks):
+    threads = [threading.Thread(target=worker, args=(tree, n_ops, read_share, n_tasks, seed))
+               for seed in range(n_threads)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return n_threads * n_ops / (time.time() - start_time)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    items = [(priority, "task") for priority in range(0, n_tasks, 2)]
+
+    for read_share in (0.99, 0.9, 0.5, 0.1):
+        for name, tree in (("global lock", GlobalLockTree(RBTree.from_sorted(items))),
+                           ("rw lock", ConcurrentRBTree(RBTree.from_sorted(items)))):
+            result = ops_per_second(tree, n_threads, 20_000, read_share, n_tasks)
+            print(f"{read_share:.0%} reads, {name}: {result:,.0f} ops/s")
+        print()
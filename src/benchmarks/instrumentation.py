@@ -0,0 +1,42 @@
+""" what the instrumented tree reports for a few priority distributions, and what recording costs
+
+run from src/:  python -m benchmarks.instrumentation [n_tasks]
+"""
+
+import random
+import sys
+import time
+
+from structs.instrumented_rbt import instrument, uninstrument
+from structs.rbt import RBTree
+
+
+def workload(tree, keys):
+    start_time = time.time()
+    for key in keys:
+        tree.insert(key, "task")
+    for key in keys:
+        tree.search(key)
+    for key in keys:
+        tree.delete(key)
+    return time.time() - start_time
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    distributions = {"sequential": list(range(n_tasks)),
+                     "random": random.sample(range(n_tasks), n_tasks),
+                     "few hot priorities": [random.randrange(100) * n_tasks + i for i in range(n_tasks)]}
+
+    for name, keys in distributions.items():
+        plain = workload(RBTree(), keys)
+        tree = instrument(RBTree())
+        recorded = workload(tree, keys)
+        stats = uninstrument(tree)
+        print(f"{name}: {plain:.2f}s plain, {recorded:.2f}s instrumented ({recorded / plain:.2f}x)")
+        print(f"    rotations per insert+delete {sum(stats.rotations.values()) / n_tasks:.2f}, "
+              f"fix-up iterations per insert {stats.fixup_iterations['insert'] / n_tasks:.2f}, "
+              f"per delete {stats.fixup_iterations['delete'] / n_tasks:.2f}")
+        print(f"    mean search path {stats.paths['search'].as_dict()['mean']:.1f}, "
+              f"longest {stats.paths['search'].max}, "
+              f"mean insert latency {stats.latency['insert'].as_dict()['mean'] * 1e6:.1f}us")
@@ -0,0 +1,47 @@
+""" heap cost and lookup speed of a mapped snapshot vs a loaded RBTree
+
+run from src/:  python -m benchmarks.mapped_snapshot [n_tasks]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from storage.mapped_snapshot import MappedSnapshot
+from storage.snapshot import read_snapshot, write_snapshot
+from structs.rbt import RBTree
+
+
+def traced(action):
+    tracemalloc.start()
+    result = action()
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, mem_usage
+
+
+def lookups_per_second(tree, keys):
+    start_time = time.time()
+    for key in keys:
+        tree.search(key)
+    return len(keys) / (time.time() - start_time)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    path = os.path.join(tempfile.mkdtemp(), "tasks.snapshot")
+    write_snapshot(RBTree.from_sorted((priority, f"task {priority}") for priority in range(n_tasks)), path)
+    keys = [random.randrange(n_tasks) for _ in range(100_000)]
+
+    rbt, rbt_memory = traced(lambda: RBTree.from_sorted(read_snapshot(path)[1]))
+    snapshot, snapshot_memory = traced(lambda: MappedSnapshot(path))
+
+    print(f"RBTree loaded from snapshot: {rbt_memory / 2 ** 20:.1f} MiB of heap, "
+          f"{lookups_per_second(rbt, keys):,.0f} lookups/s")
+    print(f"mapped snapshot: {snapshot_memory / 2 ** 20:.3f} MiB of heap, "
+          f"{lookups_per_second(snapshot, keys):,.0f} lookups/s")
+    snapshot.close()
+    os.remove(path)
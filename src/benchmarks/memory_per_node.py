@@ -0,0 +1,46 @@
+""" memory per node of RBTree vs ArrayRBTree
+
+run from src/:  python -m benchmarks.memory_per_node [n_tasks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.rbt import RBTree
+from structs.array_rbt import ArrayRBTree
+
+
+def build(tree_cls, keys):
+    # one shared task string so only the per-node structure is measured
+    tree = tree_cls()
+    for key in keys:
+        tree.insert(key, "task")
+    return tree
+
+
+def measure(tree_cls, keys):
+    """ returns insert time of an untraced build and traced memory of a second build """
+
+    start_time = time.time()
+    build(tree_cls, keys)
+    exec_time = time.time() - start_time
+
+    tracemalloc.start()
+    tree = build(tree_cls, keys)
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tree, exec_time, mem_usage
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    keys = random.sample(range(10 * n_tasks), n_tasks)
+
+    for tree_cls in (RBTree, ArrayRBTree):
+        tree, exec_time, mem_usage = measure(tree_cls, keys)
+        print(f"{tree_cls.__name__}: {n_tasks} tasks inserted in {exec_time:.2f}s")
+        print(f"{tree_cls.__name__}: {mem_usage / n_tasks:.1f} bytes per node")
+        print()
+        del tree
@@ -0,0 +1,42 @@
+""" many tasks on few priority levels: duplicate keys in a plain RBTree against TaskMultiMap's FIFO buckets
+
+run from src/:  python -m benchmarks.multimap [n_tasks] [n_priorities]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.multimap import TaskMultiMap
+from structs.rbt import RBTree
+
+
+def run(tree, priorities: list) -> tuple:
+    """ (enqueue s, dequeue s, tree nodes, bytes per task) for queueing every task and then popping all of them;
+    enqueueing runs traced, so compare its rates with each other only """
+
+    tracemalloc.start()
+    start_time = time.time()
+    for priority in priorities:
+        tree.insert(priority, "task")
+    enqueue = time.time() - start_time
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = len(tree.tree) if isinstance(tree, TaskMultiMap) else len(tree)
+    start_time = time.time()
+    while tree.pop_max() != tree.nil:
+        pass
+    return enqueue, time.time() - start_time, nodes, mem_usage / len(priorities)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    n_priorities = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    priorities = [random.randrange(n_priorities) for _ in range(n_tasks)]
+
+    for name, tree in (("RBTree with duplicate keys", RBTree()), ("TaskMultiMap", TaskMultiMap())):
+        enqueue, dequeue, nodes, per_task = run(tree, priorities)
+        print(f"{name}: {nodes} tree nodes, {per_task:.1f} bytes/task, "
+              f"enqueue {n_tasks / enqueue:,.0f} tasks/s, dequeue {n_tasks / dequeue:,.0f} tasks/s")
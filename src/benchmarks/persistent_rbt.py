@@ -0,0 +1,64 @@
+""" PersistentRBTree against RBTree: cost of a stable view, of changes, and memory per kept version
+
+run from src/:  python -m benchmarks.persistent_rbt [n_tasks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.persistent_rbt import PersistentNode, PersistentRBTree
+from structs.rbt import RBTree
+
+N_CHANGES = 20_000
+N_LOOKUPS = 100_000
+
+
+def per_op(operation, arguments) -> float:
+    start_time = time.perf_counter()
+    for argument in arguments:
+        operation(argument)
+    return (time.perf_counter() - start_time) / len(arguments)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    rng = random.Random(0)
+    items = [(priority, "task") for priority in range(0, 2 * n_tasks, 2)]
+    plain = RBTree.from_sorted(items)
+    persistent = PersistentRBTree.from_sorted(items)
+
+    # a stable view: RBTree can only be copied, the persistent tree hands out its root
+    start_time = time.perf_counter()
+    RBTree.from_sorted((node.value, node.task) for node in plain)
+    print(f"view: RBTree copy {(time.perf_counter() - start_time) * 1e3:.0f}ms, "
+          f"snapshot {per_op(lambda _: persistent.snapshot(), range(1000)) * 1e6:.2f}us")
+
+    new_keys = [rng.randrange(n_tasks) * 2 + 1 for _ in range(N_CHANGES)]
+    for name, tree in (("RBTree", plain), ("PersistentRBTree", persistent)):
+        inserting = per_op(lambda key: tree.insert(key, "new"), new_keys)
+        deleting = per_op(tree.delete, new_keys)
+        print(f"{name:>16}: insert {inserting * 1e6:.1f}us, delete {deleting * 1e6:.1f}us")
+
+    # every version stays reachable through the undo history, so its growth is the allocation per change
+    persistent = PersistentRBTree.from_sorted(items)
+    persistent.undo_history = type(persistent.undo_history)(maxlen=N_CHANGES)
+    tracemalloc.start()
+    for key in new_keys:
+        persistent.insert(key, "new")
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_change = mem_usage / N_CHANGES
+    node_size = sys.getsizeof(PersistentNode(0, "", "red", None, None, 1, 0))
+    print(f"kept versions: {per_change:.0f} bytes per change (about {per_change / node_size:.0f} copied nodes, "
+          f"log2 n = {n_tasks.bit_length()})")
+
+    # point-in-time reads: lookups in an old version cost what lookups in the current one do
+    old = persistent.snapshot()
+    for _ in range(N_CHANGES):
+        persistent.insert(rng.randrange(n_tasks) * 2 + 1, "newer")
+    lookups = [rng.randrange(2 * n_tasks) for _ in range(N_LOOKUPS)]
+    print(f"search: current {per_op(persistent.search, lookups) * 1e6:.2f}us, "
+          f"{N_CHANGES} changes old {per_op(old.search, lookups) * 1e6:.2f}us, "
+          f"RBTree {per_op(plain.search, lookups) * 1e6:.2f}us")
@@ -0,0 +1,59 @@
+""" RBTree as a priority queue against heapq
+
+run from src/:  python -m benchmarks.priority_queue [n_tasks]
+"""
+
+import heapq
+import random
+import sys
+import time
+
+from structs.rbt import RBTree
+
+
+def timed(action):
+    start_time = time.time()
+    action()
+    return time.time() - start_time
+
+
+def heap_workload(keys):
+    heap = []
+    for key in keys:
+        # heapq is a min-heap, so the highest priority is stored negated
+        heapq.heappush(heap, (-key, "task"))
+    for _ in range(len(keys)):
+        heap[0]
+        heapq.heappop(heap)
+
+
+def rbt_workload(keys):
+    rbt = RBTree()
+    for key in keys:
+        rbt.insert(key, "task")
+    for _ in range(len(keys)):
+        rbt.peek_max()
+        rbt.pop_max()
+
+
+def rbt_search_delete_workload(keys):
+    """ how pop-highest was done before: walk to the maximum, then delete it by value """
+
+    rbt = RBTree()
+    for key in keys:
+        rbt.insert(key, "task")
+    for _ in range(len(keys)):
+        node = rbt.root
+        while node.right != rbt.nil:
+            node = node.right
+        rbt.delete(node.value)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    keys = random.sample(range(10 * n_tasks), n_tasks)
+
+    for name, workload in (("heapq push + peek/pop", heap_workload),
+                           ("RBTree insert + peek_max/pop_max", rbt_workload),
+                           ("RBTree insert + walk to max/delete(value)", rbt_search_delete_workload)):
+        print(f"{name}: {timed(lambda: workload(keys)):.2f}s for {n_tasks} tasks")
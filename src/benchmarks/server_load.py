@@ -0,0 +1,78 @@
+""" load generator for task_server: p50/p99 latency and ops/s with pipelined clients
+
+run from src/:  python -m benchmarks.server_load [--port PORT] [--clients 8] [--depth 32] [--requests 20000]
+without --port an in-process server is started on a free port
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from task_client import TaskClient
+from task_server import TaskServer
+
+
+async def run_client(client: TaskClient, n_requests: int, depth: int, latencies: list, seed: int):
+    rng = random.Random(seed)
+    sent = 0
+    while sent < n_requests:
+        batch = []
+        for _ in range(min(depth, n_requests - sent)):
+            priority = rng.randrange(10 ** 6)
+            roll = rng.random()
+            if roll < 0.4:
+                batch.append(("insert", {"priority": priority, "task": f"task {priority}"}))
+            elif roll < 0.7:
+                batch.append(("find", {"priority": priority}))
+            elif roll < 0.9:
+                batch.append(("pop", {}))
+            else:
+                batch.append(("range", {"lo": priority, "hi": priority + 1000, "limit": 10}))
+        start_time = time.perf_counter()
+        futures = [client.send(op, **args) for op, args in batch]
+        await client.writer.drain()
+        for future in futures:
+            await future
+            latencies.append(time.perf_counter() - start_time)
+        sent += len(batch)
+
+
+def percentile(sorted_values: list, share: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+async def main(args):
+    server = None
+    port = args.port
+    if port is None:
+        server = TaskServer()
+        await server.start(port=0)
+        port = server.port
+
+    clients = [await TaskClient().connect(args.host, port) for _ in range(args.clients)]
+    latencies = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(client, args.requests, args.depth, latencies, seed)
+                           for seed, client in enumerate(clients)))
+    exec_time = time.perf_counter() - start_time
+
+    latencies.sort()
+    print(f"{len(latencies)} requests from {args.clients} clients, pipeline depth {args.depth}")
+    print(f"throughput: {len(latencies) / exec_time:,.0f} ops/s")
+    print(f"latency p50: {percentile(latencies, 0.5) * 1000:.2f}ms, p99: {percentile(latencies, 0.99) * 1000:.2f}ms")
+
+    for client in clients:
+        await client.close()
+    if server is not None:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20_000, help="per client")
+    asyncio.run(main(parser.parse_args()))
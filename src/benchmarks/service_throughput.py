@@ -0,0 +1,40 @@
+""" throughput of the add/change/delete/find paths the GUI buttons use, without a display
+
+run from src/:  python -m benchmarks.service_throughput [n_tasks]
+"""
+
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from storage.task_store import TaskStore
+from structs.concurrent_rbt import RWLock
+from task_service import TaskService
+
+
+def timed(name: str, n_ops: int, operation, priorities):
+    start_time = time.time()
+    for priority in priorities:
+        operation(priority)
+    exec_time = time.time() - start_time
+    print(f"{name}: {n_ops / exec_time:,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    priorities = random.sample(range(n_tasks * 10), n_tasks)
+
+    for locked in (False, True):
+        directory = tempfile.mkdtemp()
+        try:
+            service = TaskService(TaskStore(directory), RWLock() if locked else None)
+            print("with the GUI's lock" if locked else "without a lock")
+            timed("    add", n_tasks, lambda priority: service.add(priority, f"task {priority}"), priorities)
+            timed("    change", n_tasks, lambda priority: service.add(priority, "changed"), priorities)
+            timed("    find", n_tasks, service.find, priorities)
+            timed("    delete", n_tasks, service.delete, priorities)
+            service.close()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,62 @@
+""" ShardedStore throughput with 1, 2, 4, ... shards up to the number of cores, against one RBTree in process
+
+run from src/:  python -m benchmarks.sharded_store [n_ops] [batch_size]
+
+Only batched requests can scale: every batch costs one round trip per shard, and the shards work on their
+batches at the same time while the router pickles the next one.
+"""
+
+import os
+import random
+import sys
+import time
+
+from storage.sharded_store import ShardedStore, _apply
+from structs.rbt import RBTree
+
+KEYSPACE = 1 << 32
+
+
+def requests_of(rng, n_ops: int) -> list:
+    """ half inserts, a quarter finds and a quarter deletes over random priorities """
+
+    requests = []
+    for _ in range(n_ops):
+        priority = rng.randrange(KEYSPACE)
+        op = rng.choice(("insert", "insert", "find", "delete"))
+        requests.append((op, (priority, "task") if op == "insert" else (priority,)))
+    return requests
+
+
+def in_process(requests: list) -> float:
+    tree = RBTree()
+    start_time = time.perf_counter()
+    for op, args in requests:
+        _apply(tree, op, args)
+    return len(requests) / (time.perf_counter() - start_time)
+
+
+def sharded(requests: list, n_shards: int, batch_size: int) -> float:
+    store = ShardedStore(n_shards, hi=KEYSPACE)
+    try:
+        start_time = time.perf_counter()
+        for start in range(0, len(requests), batch_size):
+            store.execute_many(requests[start:start + batch_size])
+        return len(requests) / (time.perf_counter() - start_time)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    n_ops = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    requests = requests_of(random.Random(0), n_ops)
+    print(f"{os.cpu_count()} cores, batches of {batch_size}")
+
+    baseline = in_process(requests)
+    print(f"in process: {baseline:,.0f} ops/s")
+    n_shards = 1
+    while n_shards <= os.cpu_count():
+        throughput = sharded(requests, n_shards, batch_size)
+        print(f"{n_shards:>3} shards: {throughput:,.0f} ops/s, {throughput / baseline:.2f}x in process")
+        n_shards *= 2
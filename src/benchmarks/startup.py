@@ -0,0 +1,58 @@
+""" cold start of the GUI: how long importing task_manager_app takes, checked against a budget
+
+run from src/:  python -m benchmarks.startup [budget_ms]
+
+Every run is a fresh interpreter with -X importtime, the first one also pays for cold disk caches. Exits with 1 when
+the best run is over budget or when a module that should only load on the first draw of the tree is imported.
+"""
+
+import subprocess
+import sys
+import time
+
+BUDGET_MS = 600
+RUNS = 5
+TOP = 10
+# DisplayTree imports these when it draws for the first time
+DEFERRED = ("matplotlib", "numpy", "networkx")
+
+
+def import_times() -> tuple:
+    """ (wall ms, {top level module: cumulative ms}, every imported module) for one fresh import of the app """
+
+    start_time = time.time()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import task_manager_app"],
+                            capture_output=True, text=True)
+    wall = (time.time() - start_time) * 1000
+    if result.returncode:
+        sys.exit(result.stderr)
+
+    top_level, imported = {}, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported.add(name.strip())
+        # nested imports are indented under the module that triggered them
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative) / 1000
+    return wall, top_level, imported
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    runs = [import_times() for _ in range(RUNS)]
+    walls = [wall for wall, _, _ in runs]
+    print(f"interpreter + import: first {walls[0]:.0f}ms, best {min(walls):.0f}ms")
+
+    _, top_level, imported = min(runs, key=lambda run: run[0])
+    print("slowest imports of the best run:")
+    for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:TOP]:
+        print(f"    {cumulative:8.1f}ms  {name}")
+
+    total = sum(top_level.values())
+    print(f"total import time {total:.0f}ms, budget {budget:.0f}ms")
+    eager = sorted(name for name in imported if name.split(".")[0] in DEFERRED)
+    if eager:
+        print(f"loaded before the first draw: {', '.join(eager[:TOP])}")
+    sys.exit(1 if total > budget or eager else 0)
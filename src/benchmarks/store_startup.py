@@ -0,0 +1,41 @@
+""" TaskStore startup: snapshot bulk load vs replaying every insert from the log
+
+run from src/:  python -m benchmarks.store_startup [n_tasks]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from storage.task_store import TaskStore
+from structs.rbt import RBTree
+
+
+def timed_open(directory):
+    start_time = time.time()
+    store = TaskStore(directory, compact_every=sys.maxsize)
+    exec_time = time.time() - start_time
+    store.close()
+    return exec_time
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 7
+    directory = tempfile.mkdtemp()
+    try:
+        store = TaskStore(directory, sync_every=10_000, compact_every=sys.maxsize)
+        store.tree = RBTree.from_sorted((priority, f"task number {priority}") for priority in range(n_tasks))
+        for priority in range(n_tasks):
+            store.log.append(1, priority, f"task number {priority}")
+        store.close()
+        print(f"log replay of {n_tasks} inserts: {timed_open(directory):.2f}s")
+
+        store = TaskStore(directory, compact_every=sys.maxsize)
+        store.compact()
+        store.close()
+        size = os.path.getsize(store.snapshot_path)
+        print(f"snapshot load of {n_tasks} tasks ({size / 2 ** 20:.0f} MiB): {timed_open(directory):.2f}s")
+    finally:
+        shutil.rmtree(directory)
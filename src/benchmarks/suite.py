@@ -0,0 +1,188 @@
+""" benchmark matrix of the tree structures: insert, search, delete, iteration and len for every key order and size,
+plus memory per node; results are saved as JSON so two commits can be compared
+
+run from src/:  python -m benchmarks.suite [--sizes 1e3,1e4,1e5] [--compare benchmarks/results/<commit>.json]
+the full matrix is --sizes 1e3,1e4,1e5,1e6,1e7 and takes a long while
+
+Times are nanoseconds per operation, the best of a few repeats for small sizes. Without --out the results go to
+benchmarks/results/<commit>.json. With --compare every measurement that moved by more than --threshold is listed,
+and the exit code is 1 when one of them got slower.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from structs.avl import AVLTree
+from structs.bplus_tree import BPlusTree
+from structs.rbt import RBTree
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+LEN_CALLS = 1000
+# one shared task string so only the per-node structure is measured
+TASK = "task"
+
+Structure = namedtuple("Structure", "new insert search delete length")
+
+STRUCTURES = {
+    "RBTree": Structure(RBTree, RBTree.insert, RBTree.search, RBTree.delete, len),
+    "AVLTree": Structure(AVLTree, AVLTree.insert, AVLTree.search, AVLTree.delete, len),
+    "BPlusTree": Structure(BPlusTree, BPlusTree.insert, BPlusTree.search, BPlusTree.delete, len),
+}
+
+
+def sawtooth(n: int) -> list:
+    """ ascending runs of sqrt(n) keys, the runs themselves in descending order """
+
+    run = max(1, int(n ** .5))
+    return [key for start in range((n - 1) // run * run, -1, -run) for key in range(start, min(start + run, n))]
+
+
+def zigzag(n: int) -> list:
+    """ lowest, highest, second lowest, second highest...: inserts alternate between the two sides of the tree """
+
+    return [n - 1 - i // 2 if i % 2 else i // 2 for i in range(n)]
+
+
+ORDERS = {
+    "sequential": lambda n, rng: list(range(n)),
+    "reversed": lambda n, rng: list(range(n - 1, -1, -1)),
+    "random": lambda n, rng: rng.sample(range(n), n),
+    "zigzag": lambda n, rng: zigzag(n),
+    "sawtooth": lambda n, rng: sawtooth(n),
+}
+
+
+def timed(operation, tree, keys) -> float:
+    """ nanoseconds per call of operation(tree, key) """
+
+    gc.collect()
+    start_time = time.perf_counter_ns()
+    for key in keys:
+        operation(tree, key)
+    return (time.perf_counter_ns() - start_time) / max(1, len(keys))
+
+
+def run_once(structure: Structure, keys: list, lookups: list) -> dict:
+    tree = structure.new()
+    results = {"insert": timed(lambda tree, key: structure.insert(tree, key, TASK), tree, keys),
+               "search": timed(structure.search, tree, lookups)}
+
+    gc.collect()
+    start_time = time.perf_counter_ns()
+    count = sum(1 for _ in tree)
+    results["iterate"] = (time.perf_counter_ns() - start_time) / max(1, count)
+    assert count == len(keys)
+
+    if structure.length is not None:
+        results["len"] = timed(lambda tree, _: structure.length(tree), tree, range(LEN_CALLS))
+    results["delete"] = timed(structure.delete, tree, keys)
+    return results
+
+
+def memory_per_node(structure: Structure, keys: list) -> float:
+    tracemalloc.start()
+    tree = structure.new()
+    for key in keys:
+        structure.insert(tree, key, TASK)
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return mem_usage / max(1, len(keys))
+
+
+def run_suite(structures: list, orders: list, sizes: list, memory_max: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        repeats = max(1, min(5, 10 ** 5 // size))
+        lookups = rng.sample(range(size), size)
+        for order in orders:
+            keys = ORDERS[order](size, rng)
+            for name in structures:
+                runs = [run_once(STRUCTURES[name], keys, lookups) for _ in range(repeats)]
+                for op in runs[0]:
+                    ns = min(run[op] for run in runs)
+                    results.append({"structure": name, "order": order, "size": size, "op": op, "value": ns,
+                                    "unit": "ns/op"})
+                    print(f"{name:>9} {order:>10} {size:>9} {op:>8}: {ns:10.0f} ns/op", flush=True)
+
+        if size <= memory_max:
+            keys = ORDERS["random"](size, rng)
+            for name in structures:
+                per_node = memory_per_node(STRUCTURES[name], keys)
+                results.append({"structure": name, "order": "random", "size": size, "op": "memory",
+                                "value": per_node, "unit": "bytes/node"})
+                print(f"{name:>9} {'random':>10} {size:>9}   memory: {per_node:10.1f} bytes/node", flush=True)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def result_key(result: dict) -> tuple:
+    return result["structure"], result["order"], result["size"], result["op"]
+
+
+def compare(base: dict, results: list, threshold: float) -> int:
+    """ prints measurements that moved by more than threshold, returns how many got slower or bigger """
+
+    old = {result_key(result): result["value"] for result in base["results"]}
+    regressions = 0
+    print(f"compared with {base['meta']['commit']}:")
+    for result in results:
+        before = old.get(result_key(result))
+        if not before:
+            continue
+        change = result["value"] / before - 1
+        if abs(change) > threshold:
+            regressions += change > 0
+            print(f"    {'slower' if change > 0 else 'faster'} {change:+7.1%}  {' '.join(map(str, result_key(result)))}"
+                  f"  {before:.1f} -> {result['value']:.1f} {result['unit']}")
+    if not regressions:
+        print(f"    nothing got worse by more than {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark matrix of the tree structures")
+    parser.add_argument("--sizes", default="1e3,1e4,1e5", help="comma separated, 1e7 is accepted")
+    parser.add_argument("--structures", default=",".join(STRUCTURES))
+    parser.add_argument("--orders", default=",".join(ORDERS))
+    parser.add_argument("--memory-max", type=float, default=1e6, help="largest size whose memory is traced")
+    parser.add_argument("--out", help="where to save results, default benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=.1, help="relative change worth reporting")
+    args = parser.parse_args()
+
+    results = run_suite(args.structures.split(","), args.orders.split(","),
+                        [int(float(size)) for size in args.sizes.split(",")], int(args.memory_max))
+    meta = {"commit": git_commit(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(), "machine": platform.machine(),
+            "platform": platform.platform()}
+
+    path = args.out or os.path.join(RESULTS_DIR, f"{meta['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"meta": meta, "results": results}, file, indent=1)
+    print(f"saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            sys.exit(1 if compare(json.load(file), results, args.threshold) else 0)
@@ -0,0 +1,61 @@
+""" memory per task of RBTree against ArenaRBTree on repetitive and on unique descriptions
+
+run from src/:  python -m benchmarks.text_arena [n_tasks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.rbt import RBTree
+from structs.text_arena import ArenaRBTree
+
+TEMPLATES = ["call customer {}", "review pull request {}", "send invoice {}", "restart worker {}", "backup shard {}"]
+N_SUBJECTS = 200
+
+
+def repetitive(rng, n_tasks: int) -> list:
+    """ templated descriptions, 1000 distinct ones; every task gets a fresh string like a request would """
+
+    return [rng.choice(TEMPLATES).format(rng.randrange(N_SUBJECTS)) for _ in range(n_tasks)]
+
+
+def unique(rng, n_tasks: int) -> list:
+    return [rng.choice(TEMPLATES).format(f"{i} of batch {rng.randrange(10 ** 6)}") for i in range(n_tasks)]
+
+
+def run(tree_cls: type, descriptions: list) -> tuple:
+    """ (bytes per task, inserts/s, reads/s) of inserting in random order; the strings are created while traced,
+    like they would arrive from clients, so keeping them is part of the tree's cost """
+
+    priorities = random.Random(1).sample(range(len(descriptions)), len(descriptions))
+    tracemalloc.start()
+    tree = tree_cls()
+    for priority in priorities:
+        tree.insert(priority, "".join(descriptions[priority]))
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # untraced timings
+    tree = tree_cls()
+    start_time = time.perf_counter()
+    for priority in priorities:
+        tree.insert(priority, "".join(descriptions[priority]))
+    inserting = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for node in tree:
+        str(node)
+    reading = time.perf_counter() - start_time
+    return mem_usage / len(descriptions), len(descriptions) / inserting, len(descriptions) / reading
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    rng = random.Random(0)
+    for workload, descriptions in (("repetitive", repetitive(rng, n_tasks)), ("unique", unique(rng, n_tasks))):
+        print(workload)
+        for tree_cls in (RBTree, ArenaRBTree):
+            per_task, inserts, reads = run(tree_cls, descriptions)
+            print(f"    {tree_cls.__name__:>11}: {per_task:6.1f} bytes/task, insert {inserts:,.0f}/s, "
+                  f"str(node) {reads:,.0f}/s")
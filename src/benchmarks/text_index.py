@@ -0,0 +1,73 @@
+""" TextIndex lookups against scanning every task, and what keeping the index costs
+
+run from src/:  python -m benchmarks.text_index [n_tasks]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.rbt import RBTree
+from structs.text_index import TextIndex, normalize, tokenize
+
+N_QUERIES = 200
+WORDS = ["write", "report", "call", "review", "fix", "deploy", "plan", "test", "email", "budget", "meeting", "draft"]
+
+
+def describe(rng) -> str:
+    return " ".join(rng.sample(WORDS, 3)) + f" {rng.randrange(10 ** 6)}"
+
+
+def scan(tree, mode: str, query: str) -> list:
+    query = normalize(query)
+    if mode == "exact":
+        return [node.value for node in tree if normalize(node.task) == query]
+    if mode == "prefix":
+        return [node.value for node in tree if normalize(node.task).startswith(query)]
+    tokens = tokenize(query)
+    return [node.value for node in tree if tokens <= tokenize(node.task)]
+
+
+def per_query(lookup, queries) -> float:
+    start_time = time.perf_counter()
+    for query in queries:
+        lookup(query)
+    return (time.perf_counter() - start_time) / len(queries)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    rng = random.Random(0)
+    tree = RBTree.from_sorted((priority, describe(rng)) for priority in range(n_tasks))
+    tasks = [node.task for node in tree]
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    index = TextIndex.from_items((node.value, node.task) for node in tree)
+    build = time.perf_counter() - start_time
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"build {build:.2f}s (traced), {mem_usage / n_tasks:.0f} bytes/task")
+
+    queries = {
+        "exact": [rng.choice(tasks) for _ in range(N_QUERIES)],
+        "prefix": [" ".join(rng.choice(tasks).split()[:2]) for _ in range(N_QUERIES)],
+        "tokens": [" ".join(rng.sample(WORDS, 3)) for _ in range(N_QUERIES)],
+    }
+    lookups = {"exact": index.find_exact, "prefix": index.find_prefix, "tokens": index.find_tokens}
+    n_scans = max(1, N_QUERIES * 10 ** 4 // n_tasks)
+    for mode, texts in queries.items():
+        indexed = per_query(lookups[mode], texts)
+        scanned = per_query(lambda query: scan(tree, mode, query), texts[:n_scans])
+        print(f"{mode:>6}: index {indexed * 1e3:8.3f}ms, scan {scanned * 1e3:8.1f}ms, {scanned / indexed:,.0f}x")
+
+    # an update is a remove and an add, which is what TaskStore pays on top of the tree
+    changes = [(rng.randrange(n_tasks), describe(rng)) for _ in range(10 ** 4)]
+    start_time = time.perf_counter()
+    for priority, task in changes:
+        node = tree.search(priority)
+        index.remove(priority, node.task)
+        index.add(priority, task)
+        node.task = task
+    print(f"update {(time.perf_counter() - start_time) / len(changes) * 1e6:.1f}us per description change")
@@ -0,0 +1,94 @@
+""" TimerWheel with millions of pending deadlines against a heap of (deadline, key) and against scanning every
+deadline on each sweep
+
+run from src/:  python -m benchmarks.timer_wheel [n_timers]
+"""
+
+import heapq
+import random
+import sys
+import time
+import tracemalloc
+
+from structs.timer_wheel import TimerWheel
+
+# deadlines are spread over an hour, the sweeps look at the first minute of it one second at a time
+HORIZON = 3600.
+N_SWEEPS = 60
+N_SCAN_SWEEPS = 3
+
+
+class HeapTimers:
+    """ the usual alternative: a heap ordered by deadline, cancelled entries are skipped when they come up """
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+
+    def schedule(self, key, deadline: float):
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def advance(self, now: float) -> list:
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == deadline:
+                del self.deadlines[key]
+                expired.append(key)
+        return expired
+
+
+def scan_sweep(deadlines: dict, now: float) -> list:
+    expired = [key for key, deadline in deadlines.items() if deadline <= now]
+    for key in expired:
+        del deadlines[key]
+    return expired
+
+
+def run(timers, deadlines: list) -> tuple:
+    """ (schedules/s, bytes per timer, cancels/s, us per expired key over the sweeps) """
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for key, deadline in enumerate(deadlines):
+        timers.schedule(key, deadline)
+    scheduled = time.perf_counter() - start_time
+    mem_usage, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cancelled = range(0, len(deadlines), 10)
+    start_time = time.perf_counter()
+    for key in cancelled:
+        timers.cancel(key)
+    cancelling = time.perf_counter() - start_time
+
+    count = 0
+    start_time = time.perf_counter()
+    for second in range(1, N_SWEEPS + 1):
+        count += len(timers.advance(float(second)))
+    sweeping = time.perf_counter() - start_time
+    return (len(deadlines) / scheduled, mem_usage / len(deadlines), len(cancelled) / cancelling,
+            sweeping / max(1, count) * 1e6)
+
+
+if __name__ == "__main__":
+    n_timers = int(sys.argv[1]) if len(sys.argv) > 1 else 2 * 10 ** 6
+    rng = random.Random(0)
+    deadlines = [rng.uniform(0, HORIZON) for _ in range(n_timers)]
+
+    for name, timers in (("TimerWheel", TimerWheel(clock=lambda: 0.)), ("heap", HeapTimers())):
+        schedules, per_timer, cancels, per_expired = run(timers, deadlines)
+        print(f"{name:>10}: schedule {schedules:,.0f}/s (traced), {per_timer:.0f} bytes/timer, "
+              f"cancel {cancels:,.0f}/s, sweep {per_expired:.2f}us per expired task")
+        del timers
+
+    pending = dict(enumerate(deadlines))
+    start_time = time.perf_counter()
+    for second in range(1, N_SCAN_SWEEPS + 1):
+        scan_sweep(pending, float(second))
+    print(f"      scan: {(time.perf_counter() - start_time) / N_SCAN_SWEEPS * 1e3:.0f}ms per sweep "
+          f"whatever expires, against the wheel's cost per expired task above")
@@ -0,0 +1,45 @@
+""" full-tree iteration throughput, recursive generators vs the iterative traversals
+
+run from src/:  python -m benchmarks.traversal [n_tasks]
+"""
+
+import sys
+import time
+
+from structs.avl import AVLTree
+from structs.rbt import RBTree
+
+
+def recursive_in_order(node, nil):
+    """ the generator-per-frame walk both trees used before """
+
+    if not node or node is nil:
+        return
+    yield from recursive_in_order(node.left, nil)
+    yield node
+    yield from recursive_in_order(node.right, nil)
+
+
+def throughput(nodes):
+    start_time = time.time()
+    count = sum(1 for _ in nodes)
+    return count / (time.time() - start_time)
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    items = [(priority, "task") for priority in range(n_tasks)]
+
+    rbt = RBTree.from_sorted(items)
+    avl = AVLTree()
+    for priority, task in items:
+        avl.insert(priority, task)
+
+    for name, tree, nil in (("RB tree", rbt, RBTree.nil), ("AVL tree", avl, AVLTree.nil)):
+        before = throughput(recursive_in_order(tree.root, nil))
+        after = throughput(tree.in_order())
+        print(f"{name} recursive in-order: {before:,.0f} nodes/s")
+        print(f"{name} iterative in-order: {after:,.0f} nodes/s ({after / before:.1f}x)")
+        print(f"{name} iterative pre-order: {throughput(tree.pre_order()):,.0f} nodes/s")
+        print(f"{name} iterative post-order: {throughput(tree.post_order()):,.0f} nodes/s")
+        print()
@@ -0,0 +1,43 @@
+""" cost of laying out a big tree for DisplayTree, full view and zoomed in
+
+run from src/:  python -m benchmarks.tree_layout [n_tasks]
+"""
+
+import sys
+import time
+
+from structs.rbt import RBTree
+from tree_layout import expanded_viewport, layout_tree
+
+# what DisplayTree passes for a 500 px wide axes and ~40 px nodes
+NODES_ACROSS = 12.5
+FULL_VIEW_DEPTH = 8
+
+
+def timed_layout(tree, viewport):
+    min_width = (viewport[1] - viewport[0]) / NODES_ACROSS
+    start_time = time.time()
+    nodes, summaries = layout_tree(tree, viewport, min_width)
+    return time.time() - start_time, nodes, summaries
+
+
+def zoom_in(tree, n_tasks: int, steps: int = 3) -> list:
+    """ (name, seconds, nodes, summaries) of the full view and of zooming into its middle summary, at most steps
+    layouts; zooming stops early once everything in view is drawn as nodes """
+
+    viewport = (-.5, n_tasks - .5, -FULL_VIEW_DEPTH - .5, .5)
+    rows = []
+    for name in ("full view", "zoomed into a summary", "zoomed again")[:steps]:
+        exec_time, nodes, summaries = timed_layout(tree, viewport)
+        rows.append((name, exec_time, nodes, summaries))
+        if not summaries:
+            break
+        viewport = expanded_viewport(summaries[len(summaries) // 2])
+    return rows
+
+
+if __name__ == "__main__":
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    tree = RBTree.from_sorted((priority, f"task {priority}") for priority in range(n_tasks))
+    for name, exec_time, nodes, summaries in zoom_in(tree, n_tasks):
+        print(f"{name}: {len(nodes)} nodes + {len(summaries)} summaries laid out in {exec_time * 1000:.2f}ms")
@@ -0,0 +1,92 @@
+import mmap
+import sys
+from bisect import bisect_left
+
+from storage.snapshot import HEADER, read_header
+
+
+class SnapshotNode:
+    """ task read from a mapped snapshot, prints like RBNode """
+
+    __slots__ = ("value", "task")
+
+    def __init__(self, value: int, task: str):
+        self.value = value
+        self.task = task
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotNode) and self.value == other.value and self.task == other.task
+
+    def __hash__(self):
+        return hash((self.value, self.task))
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class MappedSnapshot:
+    """ read-only view of a snapshot file written by storage.snapshot.write_snapshot
+
+    The file is mapped, never parsed: priorities and offsets are used in place through memoryviews and only the
+    tasks that are actually read get decoded. Every process mapping the same file shares one page-cached copy.
+    """
+
+    nil = SnapshotNode(0, "")
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise OSError("mapped snapshots are stored little-endian and can only be used in place on such hosts")
+
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.generation, self.count = read_header(self.map)
+        keys_start = HEADER.size
+        offsets_start = keys_start + 8 * self.count
+        self.blob_start = offsets_start + 8 * (self.count + 1)
+
+        view = memoryview(self.map)
+        self.keys = view[keys_start:offsets_start].cast("q")
+        self.offsets = view[offsets_start:self.blob_start].cast("Q")
+        view.release()
+
+    def __task(self, i: int) -> str:
+        start = self.blob_start + self.offsets[i]
+        end = self.blob_start + self.offsets[i + 1]
+        return str(self.map[start:end], "utf-8")
+
+    def __node(self, i: int) -> SnapshotNode:
+        return SnapshotNode(self.keys[i], self.__task(i))
+
+    def search(self, value: int) -> SnapshotNode:
+        """ binary search over the mapped priorities, nil if not found """
+
+        i = bisect_left(self.keys, value)
+        if i < self.count and self.keys[i] == value:
+            return self.__node(i)
+        return self.nil
+
+    def range(self, lo: int, hi: int):
+        """ yields nodes with lo <= priority <= hi in ascending order """
+
+        i = bisect_left(self.keys, lo)
+        while i < self.count and self.keys[i] <= hi:
+            yield self.__node(i)
+            i += 1
+
+    def __iter__(self):
+        return (self.__node(i) for i in range(self.count))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.keys.release()
+        self.offsets.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,235 @@
+""" tasks partitioned by priority range over worker processes, each owning its own tree, so the trees work on as
+many cores as there are shards
+
+The router in the calling process keeps the sorted boundaries between the shards. Point operations go to the
+shard owning the priority, range scans and pop_max are scattered to every shard involved and gathered back. All
+requests to a shard travel in batches over a pipe and the shards work on their batches at the same time, so
+throughput comes from execute_many, which pays one round trip per shard for a whole batch.
+"""
+
+import heapq
+import multiprocessing
+import os
+from bisect import bisect_right
+from itertools import islice
+
+from structs.rbt import RBTree
+
+ADDED = "added"
+CHANGED = "changed"
+
+
+def _apply(tree, op: str, args: tuple):
+    """ one request inside a shard; insert replaces an existing task like TaskServer does """
+
+    if op == "insert":
+        priority, task = args
+        if not tree.multimap and tree.replace(priority, task):
+            return CHANGED
+        tree.insert(priority, task)
+        return ADDED
+    if op == "delete":
+        if tree.search(args[0]) == tree.nil:
+            return False
+        tree.delete(args[0])
+        return True
+    if op == "find":
+        node = tree.search(args[0])
+        return None if node == tree.nil else node.task
+    if op == "range":
+        lo, hi, limit = args
+        return [(node.value, node.task) for node in islice(tree.range(lo, hi), limit)]
+    if op == "top":
+        # the count highest tasks, highest first, without removing them
+        nodes = (tree.select(k) for k in range(min(args[0], len(tree))))
+        return [(node.value, node.task) for node in nodes]
+    if op == "take":
+        # removes and returns the count highest (or lowest) tasks, for pop_max and for moving tasks between shards
+        count, highest = args
+        pop = tree.pop_max if highest else tree.pop_min
+        return [(node.value, node.task) for node in (pop() for _ in range(min(count, len(tree))))]
+    if op == "load":
+        for priority, task in args[0]:
+            tree.insert(priority, task)
+        return len(args[0])
+    if op == "len":
+        return len(tree)
+    raise ValueError(f"unknown operation {op!r}")
+
+
+def _tagged(items: list, shard: int):
+    """ (priority, task, shard) triples of one shard's answer, for merging answers of several shards """
+
+    return (item + (shard,) for item in items)
+
+
+def _serve_shard(connection, tree_cls: type):
+    """ worker process: answers every batch of (op, args) requests with the list of their results """
+
+    tree = tree_cls()
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            break
+        results = []
+        for op, args in batch:
+            try:
+                results.append(_apply(tree, op, args))
+            except Exception as error:
+                # the router raises it for this request, the worker goes on serving the others
+                results.append(error)
+        connection.send(results)
+    connection.close()
+
+
+class ShardedStore:
+    """ router over n_shards worker processes, shard i owning priorities in [bounds[i - 1], bounds[i])
+
+    tree_cls is any SortedMap backend with one task per priority; a multimap would have to move whole buckets
+    between shards and is refused. bounds starts out cutting [lo, hi) into equal pieces and moves with
+    rebalance: every rebalance_every routed requests the router checks whether a shard holds more than hot_factor
+    times the average number of tasks and, if so, moves tasks from its edge to the smaller neighbour and shifts
+    the boundary between them. The router is not thread safe; one process or thread owns it.
+    """
+
+    def __init__(self, n_shards: int = None, lo: int = 0, hi: int = 1 << 32, tree_cls: type = RBTree,
+                 hot_factor: float = 2., rebalance_every: int = 100_000):
+        if tree_cls.multimap:
+            raise ValueError("a sharded store needs one task per priority, not a multimap")
+        n_shards = n_shards or os.cpu_count()
+        self.bounds = [lo + (hi - lo) * i // n_shards for i in range(1, n_shards)]
+        self.hot_factor = hot_factor
+        self.rebalance_every = rebalance_every
+        self.routed = 0
+        self.connections = []
+        self.workers = []
+        for _ in range(n_shards):
+            connection, worker_end = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve_shard, args=(worker_end, tree_cls), daemon=True)
+            worker.start()
+            worker_end.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def shard_of(self, priority: int) -> int:
+        return bisect_right(self.bounds, priority)
+
+    def __scatter(self, batches: dict) -> dict:
+        """ sends {shard: [(op, args), ...]} to all shards first, then collects {shard: results} """
+
+        for shard, batch in batches.items():
+            self.connections[shard].send(batch)
+        results = {shard: self.connections[shard].recv() for shard in batches}
+        for shard_results in results.values():
+            for result in shard_results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def __call(self, shard: int, op: str, *args):
+        return self.__scatter({shard: [(op, args)]})[shard][0]
+
+    def execute_many(self, requests) -> list:
+        """ routes (op, args) point requests (insert, delete, find), one batch per shard, results in request order """
+
+        batches = {}
+        places = []
+        for op, args in requests:
+            shard = self.shard_of(args[0])
+            batch = batches.setdefault(shard, [])
+            places.append((shard, len(batch)))
+            batch.append((op, tuple(args)))
+        results = self.__scatter(batches)
+        self.__count_routed(len(places))
+        return [results[shard][index] for shard, index in places]
+
+    def insert(self, priority: int, task: str) -> str:
+        """ ADDED, or CHANGED when the priority already had a task """
+
+        return self.execute_many([("insert", (priority, task))])[0]
+
+    def delete(self, priority: int) -> bool:
+        return self.execute_many([("delete", (priority,))])[0]
+
+    def find(self, priority: int):
+        return self.execute_many([("find", (priority,))])[0]
+
+    def range(self, lo: int, hi: int, limit: int = None) -> list:
+        """ (priority, task) pairs with lo <= priority <= hi in ascending order """
+
+        shards = range(self.shard_of(lo), self.shard_of(hi) + 1)
+        results = self.__scatter({shard: [("range", (lo, hi, limit))] for shard in shards})
+        # the shards own disjoint, ordered ranges, so their answers only have to be put one after another
+        items = [item for shard in shards for item in results[shard][0]]
+        return items if limit is None else items[:limit]
+
+    def pop_max(self, count: int = 1) -> list:
+        """ removes and returns the count highest (priority, task) pairs, highest first
+
+        Every shard shows its count highest tasks, a k-way merge of those picks the global winners and each shard
+        is then told how many of them are its own.
+        """
+
+        shards = range(len(self.connections))
+        tops = self.__scatter({shard: [("top", (count,))] for shard in shards})
+        merged = heapq.merge(*(_tagged(tops[shard][0], shard) for shard in shards), reverse=True)
+        winners = {}
+        for _, _, shard in islice(merged, count):
+            winners[shard] = winners.get(shard, 0) + 1
+        taken = self.__scatter({shard: [("take", (n, True))] for shard, n in winners.items()})
+        return list(heapq.merge(*(taken[shard][0] for shard in taken), reverse=True))
+
+    def sizes(self) -> list:
+        results = self.__scatter({shard: [("len", ())] for shard in range(len(self.connections))})
+        return [results[shard][0] for shard in range(len(self.connections))]
+
+    def __len__(self):
+        return sum(self.sizes())
+
+    def __count_routed(self, count: int):
+        self.routed += count
+        if self.routed >= self.rebalance_every:
+            self.routed = 0
+            self.rebalance()
+
+    def rebalance(self) -> int:
+        """ evens out shards holding more than hot_factor times the average, returns the number of tasks moved """
+
+        sizes = self.sizes()
+        average = sum(sizes) / len(sizes)
+        moved = 0
+        while len(sizes) > 1:
+            hot = max(range(len(sizes)), key=sizes.__getitem__)
+            neighbours = [shard for shard in (hot - 1, hot + 1) if 0 <= shard < len(sizes)]
+            cold = min(neighbours, key=sizes.__getitem__)
+            # every move shrinks the gap between two shards, so this ends
+            count = (sizes[hot] - sizes[cold]) // 2
+            if sizes[hot] <= max(1., self.hot_factor * average) or count == 0:
+                break
+            moved += self.__move(hot, cold, count)
+            sizes[hot] -= count
+            sizes[cold] += count
+        return moved
+
+    def __move(self, source: int, target: int, count: int) -> int:
+        """ moves the count tasks of source nearest to target over and shifts the boundary between them """
+
+        if count <= 0:
+            return 0
+        upwards = target > source
+        items = self.__call(source, "take", count, upwards)
+        if upwards:
+            # target now starts at the lowest moved priority
+            self.bounds[source] = min(priority for priority, _ in items)
+        else:
+            # source now starts right after the highest moved priority
+            self.bounds[target] = max(priority for priority, _ in items) + 1
+        self.__call(target, "load", items)
+        return len(items)
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for worker in self.workers:
+            worker.join()
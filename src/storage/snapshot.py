@@ -0,0 +1,116 @@
+""" sorted binary snapshot of a task tree
+
+layout (little-endian):
+    magic      8 bytes  b"TMSNAP01"
+    generation uint64   last write-ahead log generation folded into the snapshot
+    count      uint64   number of tasks
+    keys       int64[count]       priorities in ascending order
+    offsets    uint64[count + 1]  byte offsets of each task inside the blob
+    blob       utf-8 task descriptions back to back
+    deadlines  optional, only written when some task has one:
+               uint64 count, int64[count] priorities, float64[count] wall-clock deadlines (seconds since the epoch)
+"""
+
+import os
+import struct
+import sys
+from array import array
+
+from structs.rbt import gc_paused
+
+MAGIC = b"TMSNAP01"
+HEADER = struct.Struct("<8sQQ")
+COUNT = struct.Struct("<Q")
+
+
+def _little_endian(column: array) -> array:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def write_snapshot(tree, path: str, generation: int = 0, deadlines: dict = None):
+    """ writes tree in priority order and the {priority: wall-clock deadline} of its tasks that have one, the file
+    is replaced atomically so a crash never leaves half a snapshot """
+
+    keys = array("q")
+    offsets = array("Q", [0])
+    chunks = []
+    end = 0
+    for node in tree:
+        data = node.task.encode()
+        end += len(data)
+        keys.append(node.value)
+        offsets.append(end)
+        chunks.append(data)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, generation, len(keys)))
+        file.write(_little_endian(keys).tobytes())
+        file.write(_little_endian(offsets).tobytes())
+        file.write(b"".join(chunks))
+        if deadlines:
+            priorities = sorted(deadlines)
+            file.write(COUNT.pack(len(priorities)))
+            file.write(_little_endian(array("q", priorities)).tobytes())
+            file.write(_little_endian(array("d", (deadlines[priority] for priority in priorities))).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_header(data) -> tuple:
+    """ returns (generation, count) and checks the magic """
+
+    magic, generation, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a task snapshot")
+    return generation, count
+
+
+def read_snapshot(path: str) -> tuple:
+    """ returns (generation, list of (priority, task) pairs in priority order) """
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    generation, count = read_header(data)
+    keys = array("q")
+    offsets = array("Q")
+    keys_start = HEADER.size
+    offsets_start = keys_start + 8 * count
+    blob_start = offsets_start + 8 * (count + 1)
+    keys.frombytes(data[keys_start:offsets_start])
+    offsets.frombytes(data[offsets_start:blob_start])
+    keys, offsets = _little_endian(keys), _little_endian(offsets)
+
+    blob = data[blob_start:blob_start + offsets[-1]]
+    with gc_paused():
+        text = blob.decode()
+        if len(text) != len(blob):
+            # multi-byte characters: byte offsets do not match string indices, decode task by task
+            text = memoryview(blob)
+            items = [(key, str(text[start:end], "utf-8")) for key, start, end in zip(keys, offsets, offsets[1:])]
+        else:
+            items = [(key, text[start:end]) for key, start, end in zip(keys, offsets, offsets[1:])]
+    return generation, items
+
+
+def read_snapshot_deadlines(path: str) -> dict:
+    """ {priority: wall-clock deadline} stored after the tasks, empty for snapshots without deadlines """
+
+    with open(path, "rb") as file:
+        _, count = read_header(file.read(HEADER.size))
+        file.seek(HEADER.size + 8 * count + 8 * count)
+        blob_size = array("Q", file.read(8))
+        file.seek(_little_endian(blob_size)[0], os.SEEK_CUR)
+        trailer = file.read()
+
+    if not trailer:
+        return {}
+    (count,) = COUNT.unpack_from(trailer, 0)
+    priorities = array("q", trailer[COUNT.size:COUNT.size + 8 * count])
+    deadlines = array("d", trailer[COUNT.size + 8 * count:COUNT.size + 16 * count])
+    return dict(zip(_little_endian(priorities), _little_endian(deadlines)))
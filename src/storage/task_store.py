@@ -0,0 +1,228 @@
+import os
+from collections import deque
+
+from storage import wal
+from storage.snapshot import read_snapshot, read_snapshot_deadlines, write_snapshot
+from structs.rbt import RBTree
+from structs.sorted_map import SortedMap
+from structs.text_index import TextIndex
+
+SNAPSHOT_NAME = "tasks.snapshot"
+WAL_PREFIX = "tasks.wal."
+
+
+class TaskStore:
+    """ RBTree that survives restarts: mutations go to a write-ahead log, which is periodically compacted
+    into a sorted snapshot
+
+    Logs are numbered by generation. A snapshot remembers the last generation it contains, so a crash during
+    compaction at worst replays a log that is already folded in, and such logs are skipped on startup.
+    With text_index the store also keeps a TextIndex of the descriptions, built after loading and updated by
+    insert, delete and update, which are the only ways descriptions change. Without it build_index builds the
+    index the first time a search needs it.
+
+    deadlines maps priorities to the wall-clock time their task expires at, logged and snapshotted with the tasks;
+    deleting a task drops its deadline. With a persistent tree, undo and redo bring back the deadline a task had
+    before the change they step over.
+    """
+
+    def __init__(self, directory: str, sync_every: int = 64, sync_interval: float = 1., compact_every: int = 100_000,
+                 tree_cls: type = RBTree, text_index: bool = False):
+        self.directory = directory
+        # any SortedMap backend, the files on disk do not depend on it
+        self.tree_cls = tree_cls
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+
+        self.generation = 0
+        self.deadlines = {}
+        self.tree = self.__load()
+        # deadline of the changed priority before each change on the tree's undo and redo histories
+        self.deadline_undo = deque(maxlen=self.tree.undo_history.maxlen) if self.tree.persistent else None
+        self.deadline_redo = []
+        self.index = TextIndex.from_items((node.value, node.task) for node in self.tree) if text_index else None
+        self.log = self.__open_log(self.generation + 1)
+
+    def build_index(self) -> TextIndex:
+        """ the text index, read from the tree the first time it is asked for; kept in sync from then on """
+
+        if self.index is None:
+            self.index = TextIndex.from_items((node.value, node.task) for node in self.tree)
+        return self.index
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_NAME)
+
+    def __log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{WAL_PREFIX}{generation}")
+
+    def __log_generations(self) -> list:
+        return sorted(int(name[len(WAL_PREFIX):]) for name in os.listdir(self.directory)
+                      if name.startswith(WAL_PREFIX))
+
+    def __open_log(self, generation: int) -> wal.WriteAheadLog:
+        self.generation = generation
+        return wal.WriteAheadLog(self.__log_path(generation), self.sync_every, self.sync_interval)
+
+    def __load(self) -> SortedMap:
+        """ bulk builds the snapshot in linear time, then replays only the logs written after it """
+
+        snapshot_generation = 0
+        tree = self.tree_cls()
+        if os.path.exists(self.snapshot_path):
+            snapshot_generation, items = read_snapshot(self.snapshot_path)
+            tree = self.tree_cls.from_sorted(items)
+            self.deadlines = read_snapshot_deadlines(self.snapshot_path)
+
+        self.generation = snapshot_generation
+        for generation in self.__log_generations():
+            if generation <= snapshot_generation:
+                os.remove(self.__log_path(generation))
+                continue
+            for op, priority, task in wal.replay(self.__log_path(generation)):
+                self.__apply(tree, self.deadlines, op, priority, task)
+            self.generation = generation
+        if tree.persistent:
+            # undo reaches back to the start of this session, not into replayed ones
+            tree.undo_history.clear()
+        return tree
+
+    @staticmethod
+    def __apply(tree: SortedMap, deadlines: dict, op: int, priority: int, task: str):
+        if op == wal.INSERT:
+            tree.insert(priority, task)
+        elif op == wal.DELETE:
+            tree.delete(priority)
+            deadlines.pop(priority, None)
+        elif op == wal.UPDATE:
+            tree.replace(priority, task)
+        elif op == wal.DEADLINE:
+            if task:
+                deadlines[priority] = float(task)
+            else:
+                deadlines.pop(priority, None)
+
+    def search(self, priority: int):
+        return self.tree.search(priority)
+
+    def insert(self, priority: int, task: str):
+        self.__remember_deadline(priority)
+        self.log.append(wal.INSERT, priority, task)
+        self.tree.insert(priority, task)
+        if self.index is not None:
+            self.index.add(priority, task)
+        self.__maybe_compact()
+
+    def delete(self, priority: int):
+        node = self.tree.search(priority)
+        if node != self.tree.nil:
+            self.__remember_deadline(priority)
+        self.log.append(wal.DELETE, priority)
+        # the task delete removes, which is the oldest one of a multimap bucket
+        if self.index is not None and node != self.tree.nil:
+            self.index.remove(priority, node.task)
+        self.tree.delete(priority)
+        self.deadlines.pop(priority, None)
+        self.__maybe_compact()
+
+    def update(self, priority: int, task: str):
+        """ changes description of an existing task in place """
+
+        node = self.tree.search(priority)
+        if node == self.tree.nil:
+            return
+        self.__remember_deadline(priority)
+        self.log.append(wal.UPDATE, priority, task)
+        if self.index is not None:
+            self.index.remove(priority, node.task)
+            self.index.add(priority, task)
+        self.tree.replace(priority, task)
+        self.__maybe_compact()
+
+    def set_deadline(self, priority: int, deadline: float = None):
+        """ logs the wall-clock time priority's task expires at, None drops its deadline """
+
+        if deadline is None:
+            if self.deadlines.pop(priority, None) is None:
+                return
+            self.log.append(wal.DEADLINE, priority)
+        else:
+            self.deadlines[priority] = deadline
+            self.log.append(wal.DEADLINE, priority, repr(deadline))
+        self.__maybe_compact()
+
+    def __remember_deadline(self, priority: int):
+        """ keeps the deadline priority has before a change of the tree, for undo """
+
+        if self.deadline_undo is not None:
+            self.deadline_undo.append(self.deadlines.get(priority))
+            self.deadline_redo.clear()
+
+    def __swap_deadline(self, priority: int, deadline) -> float:
+        """ gives priority the deadline it had on the other side of an undone or redone change, returns its current
+        one """
+
+        current = self.deadlines.get(priority)
+        if deadline != current:
+            self.set_deadline(priority, deadline)
+        return current
+
+    def undo(self):
+        """ steps a PersistentRBTree back one change and logs what that did, returns the edit (priority, task
+        before, task after) it took back or None if there is nothing to undo """
+
+        edit = self.tree.undo()
+        if edit is None:
+            return None
+        priority, before, after = edit
+        self.__log_edit(priority, after, before)
+        self.deadline_redo.append(self.__swap_deadline(priority, self.deadline_undo.pop()))
+        return edit
+
+    def redo(self):
+        edit = self.tree.redo()
+        if edit is None:
+            return None
+        self.__log_edit(*edit)
+        self.deadline_undo.append(self.__swap_deadline(edit[0], self.deadline_redo.pop()))
+        return edit
+
+    def __log_edit(self, priority: int, before, after):
+        """ logs the change of priority's task from before to after, None meaning no task, and indexes it """
+
+        if after is None:
+            self.log.append(wal.DELETE, priority)
+        elif before is None:
+            self.log.append(wal.INSERT, priority, after)
+        else:
+            self.log.append(wal.UPDATE, priority, after)
+        if self.index is not None:
+            if before is not None:
+                self.index.remove(priority, before)
+            if after is not None:
+                self.index.add(priority, after)
+        self.__maybe_compact()
+
+    def __maybe_compact(self):
+        if self.log.records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """ folds every log written so far into a fresh snapshot and starts a new log """
+
+        self.log.close()
+        folded = self.generation
+        write_snapshot(self.tree, self.snapshot_path, folded, self.deadlines)
+        for generation in self.__log_generations():
+            if generation <= folded:
+                os.remove(self.__log_path(generation))
+        self.log = self.__open_log(folded + 1)
+
+    def sync(self):
+        self.log.sync()
+
+    def close(self):
+        self.log.close()
@@ -0,0 +1,80 @@
+""" append-only write-ahead log of task tree mutations
+
+every record is  crc32 uint32 | op uint8 | priority int64 | length uint32 | task utf-8,
+the checksum covers everything after itself so a torn tail left by a crash is detected and dropped;
+a DEADLINE record carries the wall-clock deadline of the priority's task as its text, empty when it was dropped
+"""
+
+import os
+import struct
+import time
+import zlib
+
+INSERT = 1
+DELETE = 2
+UPDATE = 3
+DEADLINE = 4
+
+RECORD = struct.Struct("<IBqI")
+BODY = struct.Struct("<BqI")
+
+
+class WriteAheadLog:
+    """ appends records and fsyncs them in batches: every sync_every records or sync_interval seconds
+
+    Every record is handed to the OS as it is appended, so a crash of the process loses nothing. Only the fsync
+    is batched: an OS crash or power loss can lose the records appended since the last sync, at most sync_every
+    of them, written within sync_interval seconds unless no append or sync call comes along to notice the time.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 1.):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.file = open(path, "ab")
+        self.pending = 0
+        self.records = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, op: int, priority: int, task: str = ""):
+        data = task.encode()
+        body = BODY.pack(op, priority, len(data)) + data
+        self.file.write(struct.pack("<I", zlib.crc32(body)) + body)
+        self.file.flush()
+        self.pending += 1
+        self.records += 1
+
+        if self.pending >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """ makes everything appended so far durable """
+
+        if self.pending:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def replay(path: str):
+    """ yields (op, priority, task) records, stops at the first torn or corrupted record and cuts it off """
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    pos = 0
+    while pos + RECORD.size <= len(data):
+        crc, op, priority, length = RECORD.unpack_from(data, pos)
+        end = pos + RECORD.size + length
+        if end > len(data) or zlib.crc32(data[pos + 4:end]) != crc:
+            break
+        yield op, priority, data[pos + RECORD.size:end].decode()
+        pos = end
+
+    if pos != len(data):
+        with open(path, "r+b") as file:
+            file.truncate(pos)
@@ -0,0 +1,493 @@
+from array import array
+
+from structs.rbt import RBNode
+from structs.sorted_map import SortedMap
+
+RED = 1
+BLACK = 0
+
+# priorities live in an int64 column
+MIN_PRIORITY = -(1 << 63)
+MAX_PRIORITY = (1 << 63) - 1
+
+
+def _check_priority(value: int):
+    if not MIN_PRIORITY <= value <= MAX_PRIORITY:
+        raise ValueError(f"priority {value} does not fit ArrayRBTree's int64 keys")
+
+
+class ArrayRBNode:
+    """ lightweight handle to a node of ArrayRBTree, mirrors RBNode attributes
+
+    A handle remembers the generation of its slot. Deleting the node bumps it, so a handle kept past the delete
+    raises ValueError instead of reading whatever task reuses the slot later. pop_min and pop_max
+    return a detached RBNode instead, which stays readable.
+    """
+
+    __slots__ = ("tree", "index", "generation")
+
+    def __init__(self, tree, index: int):
+        self.tree = tree
+        self.index = index
+        self.generation = tree.generations[index]
+
+    def __slot(self) -> int:
+        if self.tree.generations[self.index] != self.generation:
+            raise ValueError("the node was deleted from its tree")
+        return self.index
+
+    @property
+    def value(self) -> int:
+        return self.tree.keys[self.__slot()]
+
+    @property
+    def task(self) -> str:
+        return self.tree.tasks[self.__slot()]
+
+    @task.setter
+    def task(self, task: str):
+        self.tree.tasks[self.__slot()] = task
+
+    @property
+    def color(self) -> str:
+        return "red" if self.tree.colors[self.__slot()] == RED else "black"
+
+    @property
+    def size(self) -> int:
+        return self.tree.sizes[self.__slot()]
+
+    @property
+    def left(self):
+        return ArrayRBNode(self.tree, self.tree.left[self.__slot()])
+
+    @property
+    def right(self):
+        return ArrayRBNode(self.tree, self.tree.right[self.__slot()])
+
+    @property
+    def parent(self):
+        if self.tree.parent[self.__slot()] == 0:
+            return None
+        return ArrayRBNode(self.tree, self.tree.parent[self.index])
+
+    def __eq__(self, other):
+        return (isinstance(other, ArrayRBNode) and self.tree is other.tree and self.index == other.index
+                and self.generation == other.generation)
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index, self.generation))
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class ArrayRBTree(SortedMap):
+    """ Red-Black tree stored as parallel arrays (struct-of-arrays) with integer node handles
+
+    Handle 0 is the nil leaf. Deleted handles go to a free list and are reused by later inserts,
+    so the columns never shrink but also never fragment. Subtree sizes are a column too, so select, rank and
+    the tree layout work as on RBTree; see benchmarks/memory_per_node.py for what the columns save per node.
+    Unlike the other backends it only takes priorities from MIN_PRIORITY to MAX_PRIORITY, others raise ValueError.
+    """
+
+    def __init__(self):
+        self.keys = array("q", [0])
+        self.left = array("i", [0])
+        self.right = array("i", [0])
+        self.parent = array("i", [0])
+        self.colors = bytearray([BLACK])
+        # nodes in the subtree of each handle, 0 for nil
+        self.sizes = array("q", [0])
+        self.tasks = [""]
+        # bumped whenever a slot is freed, see ArrayRBNode
+        self.generations = array("Q", [0])
+
+        self.free = []
+        self.count = 0
+        self.root_index = 0
+        self.version = 0
+
+        self.nil = ArrayRBNode(self, 0)
+
+    @classmethod
+    def from_sorted(cls, items):
+        """ builds a tree from (priority, task) pairs sorted by priority in O(n) """
+
+        tree = cls()
+        for value, task in items:
+            _check_priority(value)
+            if len(tree.keys) > 1 and value < tree.keys[-1]:
+                raise ValueError("items have to be sorted by priority")
+            tree.keys.append(value)
+            tree.tasks.append(task)
+        n = len(tree.keys) - 1
+        tree.left = array("i", [0]) * (n + 1)
+        tree.right = array("i", [0]) * (n + 1)
+        tree.parent = array("i", [0]) * (n + 1)
+        tree.sizes = array("q", [0]) * (n + 1)
+        tree.generations = array("Q", [0]) * (n + 1)
+        tree.colors = bytearray(n + 1)
+        tree.count = n
+        tree.version += 1
+        if not n:
+            return tree
+
+        # handles 1..n are in priority order; splitting at the middle gives minimal height, so only the deepest
+        # level can be incomplete and colouring exactly that level red keeps every black height equal
+        red_depth = n.bit_length() - 1
+        stack = [(1, n + 1, 0, False, 0)]
+        while stack:
+            lo, hi, parent, is_left, depth = stack.pop()
+            if lo == hi:
+                continue
+            mid = (lo + hi) // 2
+            tree.parent[mid] = parent
+            tree.sizes[mid] = hi - lo
+            if depth == red_depth and depth > 0:
+                tree.colors[mid] = RED
+            if not parent:
+                tree.root_index = mid
+            elif is_left:
+                tree.left[parent] = mid
+            else:
+                tree.right[parent] = mid
+            stack.append((lo, mid, mid, True, depth + 1))
+            stack.append((mid + 1, hi, mid, False, depth + 1))
+        return tree
+
+    @property
+    def root(self) -> ArrayRBNode:
+        return ArrayRBNode(self, self.root_index)
+
+    def search(self, value: int) -> ArrayRBNode:
+        """ searching for node with val == value, returns nil handle if not found """
+
+        return ArrayRBNode(self, self.__search(value))
+
+    def __search(self, value: int) -> int:
+        keys, left, right = self.keys, self.left, self.right
+        cur = self.root_index
+        while cur and keys[cur] != value:
+            cur = left[cur] if value < keys[cur] else right[cur]
+        return cur
+
+    def __new_node(self, value: int, task: str) -> int:
+        """ takes a free handle or grows every column by one slot """
+
+        if self.free:
+            idx = self.free.pop()
+            self.keys[idx] = value
+            self.tasks[idx] = task
+            self.left[idx] = self.right[idx] = self.parent[idx] = 0
+            self.colors[idx] = RED
+            self.sizes[idx] = 1
+            return idx
+
+        self.keys.append(value)
+        self.left.append(0)
+        self.right.append(0)
+        self.parent.append(0)
+        self.colors.append(RED)
+        self.sizes.append(1)
+        self.tasks.append(task)
+        self.generations.append(0)
+        return len(self.keys) - 1
+
+    def insert(self, value: int, task: str):
+        """ inserting new node into the tree """
+
+        # before a slot is taken, so a priority that does not fit leaves the tree as it was
+        _check_priority(value)
+        node = self.__new_node(value, task)
+        self.version += 1
+        keys, left, right, sizes = self.keys, self.left, self.right, self.sizes
+
+        parent = 0
+        cur = self.root_index
+
+        # looking for place to insert, every node on the way gains one descendant
+        while cur:
+            parent = cur
+            sizes[cur] += 1
+            cur = left[cur] if value < keys[cur] else right[cur]
+
+        self.parent[node] = parent
+        if not parent:
+            self.root_index = node
+        elif value < keys[parent]:
+            left[parent] = node
+        else:
+            right[parent] = node
+
+        self.count += 1
+        self.__balance_insert(node)
+
+    def __balance_insert(self, node: int):
+        """ fixing violations after inserting a node """
+
+        left, right, parent, colors = self.left, self.right, self.parent, self.colors
+
+        while colors[parent[node]] == RED:
+            p = parent[node]
+            g = parent[p]
+            if p == right[g]:
+                u = left[g]
+                if colors[u] == RED:
+                    colors[u] = colors[p] = BLACK
+                    colors[g] = RED
+                    node = g
+                else:
+                    if node == left[p]:
+                        node = p
+                        self.__rotate_right(node)
+                        p = parent[node]
+                    colors[p] = BLACK
+                    colors[g] = RED
+                    self.__rotate_left(g)
+            else:
+                u = right[g]
+                if colors[u] == RED:
+                    colors[u] = colors[p] = BLACK
+                    colors[g] = RED
+                    node = g
+                else:
+                    if node == right[p]:
+                        node = p
+                        self.__rotate_left(node)
+                        p = parent[node]
+                    colors[p] = BLACK
+                    colors[g] = RED
+                    self.__rotate_right(g)
+        # root always has to be black
+        colors[self.root_index] = BLACK
+
+    def delete(self, value: int):
+        """ deleting node with val == value if node exists """
+
+        z = self.__search(value)
+        if z:
+            self.delete_slot(z)
+
+    def delete_slot(self, z: int):
+        """ unlinks the node stored at handle z, the one meant even among equal priorities """
+
+        self.version += 1
+
+        left, right, parent, colors, sizes = self.left, self.right, self.parent, self.colors, self.sizes
+        original_color = colors[z]
+
+        # the node leaving its place is z, or its successor when z has two children
+        removed = z
+        if left[z] and right[z]:
+            removed = right[z]
+            while left[removed]:
+                removed = left[removed]
+        cur = removed
+        while cur:
+            sizes[cur] -= 1
+            cur = parent[cur]
+
+        if not left[z]:
+            x = right[z]
+            x_parent = parent[z]
+            self.__replace_node(z, x)
+        elif not right[z]:
+            x = left[z]
+            x_parent = parent[z]
+            self.__replace_node(z, x)
+        else:
+            y = removed
+            original_color = colors[y]
+            x = right[y]
+            if parent[y] == z:
+                x_parent = y
+            else:
+                x_parent = parent[y]
+                self.__replace_node(y, x)
+                right[y] = right[z]
+                parent[right[y]] = y
+            self.__replace_node(z, y)
+            left[y] = left[z]
+            parent[left[y]] = y
+            colors[y] = colors[z]
+            sizes[y] = sizes[z]
+
+        if original_color == BLACK:
+            self.__balance_delete(x, x_parent)
+
+        # releasing handle and the task reference it kept alive
+        self.tasks[z] = ""
+        self.generations[z] += 1
+        self.free.append(z)
+        self.count -= 1
+
+    def __balance_delete(self, x: int, x_parent: int):
+        """ fixing violations after removing a node """
+
+        left, right, parent, colors = self.left, self.right, self.parent, self.colors
+
+        while x != self.root_index and colors[x] == BLACK:
+            if x == left[x_parent]:
+                s = right[x_parent]
+                if colors[s] == RED:
+                    colors[s] = BLACK
+                    colors[x_parent] = RED
+                    self.__rotate_left(x_parent)
+                    s = right[x_parent]
+                if colors[left[s]] == BLACK and colors[right[s]] == BLACK:
+                    colors[s] = RED
+                    x = x_parent
+                    x_parent = parent[x]
+                else:
+                    if colors[right[s]] == BLACK:
+                        colors[left[s]] = BLACK
+                        colors[s] = RED
+                        self.__rotate_right(s)
+                        s = right[x_parent]
+                    colors[s] = colors[x_parent]
+                    colors[x_parent] = BLACK
+                    colors[right[s]] = BLACK
+                    self.__rotate_left(x_parent)
+                    x = self.root_index
+            else:
+                s = left[x_parent]
+                if colors[s] == RED:
+                    colors[s] = BLACK
+                    colors[x_parent] = RED
+                    self.__rotate_right(x_parent)
+                    s = left[x_parent]
+                if colors[left[s]] == BLACK and colors[right[s]] == BLACK:
+                    colors[s] = RED
+                    x = x_parent
+                    x_parent = parent[x]
+                else:
+                    if colors[left[s]] == BLACK:
+                        colors[right[s]] = BLACK
+                        colors[s] = RED
+                        self.__rotate_left(s)
+                        s = left[x_parent]
+                    colors[s] = colors[x_parent]
+                    colors[x_parent] = BLACK
+                    colors[left[s]] = BLACK
+                    self.__rotate_right(x_parent)
+                    x = self.root_index
+        colors[x] = BLACK
+
+    def __rotate_left(self, node: int):
+        """ left rotation around node """
+
+        left, right, parent = self.left, self.right, self.parent
+        child = right[node]
+        right[node] = left[child]
+        if left[child]:
+            parent[left[child]] = node
+        parent[child] = parent[node]
+        if not parent[node]:
+            self.root_index = child
+        elif node == left[parent[node]]:
+            left[parent[node]] = child
+        else:
+            right[parent[node]] = child
+        left[child] = node
+        parent[node] = child
+        self.sizes[child] = self.sizes[node]
+        self.sizes[node] = self.sizes[left[node]] + self.sizes[right[node]] + 1
+
+    def __rotate_right(self, node: int):
+        """ right rotation around node """
+
+        left, right, parent = self.left, self.right, self.parent
+        child = left[node]
+        left[node] = right[child]
+        if right[child]:
+            parent[right[child]] = node
+        parent[child] = parent[node]
+        if not parent[node]:
+            self.root_index = child
+        elif node == right[parent[node]]:
+            right[parent[node]] = child
+        else:
+            left[parent[node]] = child
+        right[child] = node
+        parent[node] = child
+        self.sizes[child] = self.sizes[node]
+        self.sizes[node] = self.sizes[left[node]] + self.sizes[right[node]] + 1
+
+    def __replace_node(self, old: int, new: int):
+        """ forgetting about old node and placing new node instead """
+
+        p = self.parent[old]
+        if not p:
+            self.root_index = new
+        elif old == self.left[p]:
+            self.left[p] = new
+        else:
+            self.right[p] = new
+        if new:
+            self.parent[new] = p
+
+    def __in_order(self):
+        """ iterative in-order walk over handles, no recursion and no stack """
+
+        left, right, parent = self.left, self.right, self.parent
+        cur = self.root_index
+        if not cur:
+            return
+        while left[cur]:
+            cur = left[cur]
+        while cur:
+            yield cur
+            if right[cur]:
+                cur = right[cur]
+                while left[cur]:
+                    cur = left[cur]
+            else:
+                child = cur
+                cur = parent[cur]
+                while cur and child == right[cur]:
+                    child = cur
+                    cur = parent[cur]
+
+    def in_order(self):
+        return (ArrayRBNode(self, idx) for idx in self.__in_order())
+
+    def __iter__(self):
+        return self.in_order()
+
+    def __len__(self):
+        return self.count
+
+    def __extreme(self, side: array) -> int:
+        cur = self.root_index
+        while side[cur]:
+            cur = side[cur]
+        return cur
+
+    def minimum(self) -> ArrayRBNode:
+        """ node with the lowest priority, nil for an empty tree """
+
+        return ArrayRBNode(self, self.__extreme(self.left))
+
+    def maximum(self) -> ArrayRBNode:
+        """ node with the highest priority, nil for an empty tree """
+
+        return ArrayRBNode(self, self.__extreme(self.right))
+
+    def __pop(self, idx: int):
+        """ deletes the node and returns it as a detached RBNode, the handle itself dies with the delete """
+
+        if not idx:
+            return self.nil
+        detached = RBNode(self.keys[idx], self.tasks[idx], "black")
+        self.delete_slot(idx)
+        return detached
+
+    def pop_min(self):
+        """ removes and returns the lowest priority node, nil if the tree is empty """
+
+        return self.__pop(self.__extreme(self.left))
+
+    def pop_max(self):
+        """ removes and returns the highest priority node, nil if the tree is empty """
+
+        return self.__pop(self.__extreme(self.right))
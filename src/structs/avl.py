@@ -1,143 +1,196 @@
+from structs.rbt import gc_paused
+from structs.sorted_map import SortedMap
+
+
 class Node:
-    def __init__(self, priority: int, task: str, left=None, right=None):
+    # no per-instance __dict__: keeps nodes small when the tree holds millions of tasks
+    __slots__ = ("value", "task", "left", "right", "height", "size")
+
+    # AVL nodes have no colour, DisplayTree draws them all alike
+    color = "black"
+
+    def __init__(self, value: int, task: str, left=None, right=None):
         self.height = 1
-        self.priority = priority
+        self.size = 1
+        self.value = value
         self.task = task
         self.left = left
         self.right = right
 
+    @property
+    def priority(self) -> int:
+        return self.value
+
     def __str__(self):
-        return f"Task {self.priority} priority is: {self.task}"
+        return f"{self.task}"
 
 
-class AVLTree:
+class AVLTree(SortedMap):
+    """ AVL tree with the same interface as RBTree
+
+    Heights differ by at most one between siblings, so the tree is never deeper than ~1.44 log n against RBTree's
+    2 log n: worst-case lookups are shorter, inserts and deletes rotate more. Nodes keep no parent pointer, changes
+    walk back up along the search path they went down. A delete of a node with two children moves its successor's
+    priority and task into it, so node objects do not keep their identity across deletes the way RBTree's do.
+    """
+
+    # nil node for tree, height and size 0
+    nil = Node(0, "")
+    nil.height = nil.size = 0
+
     def __init__(self):
-        self.root = None
+        self.root = self.nil
+        self.version = 0
+
+    @classmethod
+    def from_sorted(cls, items):
+        """ builds a tree from (priority, task) pairs sorted by priority in O(n) """
+
+        tree = cls()
+        with gc_paused():
+            nodes = [Node(value, task) for value, task in items]
+            for i in range(1, len(nodes)):
+                if nodes[i].value < nodes[i - 1].value:
+                    raise ValueError("items have to be sorted by priority")
+            tree.root = tree.__link_sorted(nodes, 0, len(nodes))
+        tree.version += 1
+        return tree
+
+    def __link_sorted(self, nodes: list, lo: int, hi: int) -> Node:
+        """ splitting at the middle gives a perfectly balanced tree, the recursion is only log n deep """
+
+        if lo == hi:
+            return self.nil
+        mid = (lo + hi) // 2
+        node = nodes[mid]
+        node.left = self.__link_sorted(nodes, lo, mid)
+        node.right = self.__link_sorted(nodes, mid + 1, hi)
+        self.__update(node)
+        return node
 
     @staticmethod
-    def height(node):
-        if not node:
-            return 0
-        return node.height
-
-    def __update_height(self, node: Node):
-        node.height = max(self.height(node.left), self.height(node.right)) + 1
+    def height(node) -> int:
+        return node.height if node else 0
 
-    def __get_balance(self, node):
-        if not node:
-            return 0
-        return self.height(node.left) - self.height(node.right)
+    @staticmethod
+    def __update(node: Node):
+        left, right = node.left, node.right
+        node.height = (left.height if left.height > right.height else right.height) + 1
+        node.size = left.size + right.size + 1
 
-    def __left_rotation(self, node_a):
+    def __left_rotation(self, node_a: Node) -> Node:
         node_b = node_a.right
         node_a.right = node_b.left
         node_b.left = node_a
 
-        self.__update_height(node_a)
-        self.__update_height(node_b)
+        self.__update(node_a)
+        self.__update(node_b)
 
         return node_b
 
-    def __right_rotation(self, node_a):
+    def __right_rotation(self, node_a: Node) -> Node:
         node_b = node_a.left
         node_a.left = node_b.right
         node_b.right = node_a
 
-        self.__update_height(node_a)
-        self.__update_height(node_b)
+        self.__update(node_a)
+        self.__update(node_b)
 
         return node_b
 
-    def __balance(self, node):
-        if self.__get_balance(node) > 1:
-            if self.__get_balance(node.left) < 0:
+    def __balance(self, node: Node) -> Node:
+        balance = node.left.height - node.right.height
+        if balance > 1:
+            if node.left.left.height < node.left.right.height:
                 node.left = self.__left_rotation(node.left)
             return self.__right_rotation(node)
 
-        elif self.__get_balance(node) < -1:
-            if self.__get_balance(node.right) > 0:
+        elif balance < -1:
+            if node.right.right.height < node.right.left.height:
                 node.right = self.__right_rotation(node.right)
             return self.__left_rotation(node)
 
         return node
 
-    def __insert(self, node: Node, priority: int, task: str):
-        if not node:
-            return Node(priority, task)
-        elif priority < node.priority:
-            node.left = self.__insert(node.left, priority, task)
-        elif priority > node.priority:
-            node.right = self.__insert(node.right, priority, task)
-        else:
-            node.task = task
-
-        self.__update_height(node)
+    def __rebalance_path(self, path: list):
+        """ updates heights and sizes and rotates bottom-up along a search path, re-linking rotated subtrees to
+        their parents """
+
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            self.__update(node)
+            subtree = self.__balance(node)
+            if subtree is not node:
+                if i == 0:
+                    self.root = subtree
+                elif path[i - 1].left is node:
+                    path[i - 1].left = subtree
+                else:
+                    path[i - 1].right = subtree
+
+    def __search_path(self, value: int):
+        """ nodes from the root down to the node with value (or to where it would hang) """
+
+        path = []
+        node = self.root
+        while node is not self.nil and node.value != value:
+            path.append(node)
+            node = node.left if value < node.value else node.right
+        return path, node
+
+    def search(self, value: int) -> Node:
+        """ searching for node with val == value, nil if there is none """
+
+        nil = self.nil
+        node = self.root
+        while node is not nil and node.value != value:
+            node = node.left if value < node.value else node.right
+        return node
 
-        return self.__balance(node)
+    def insert(self, value: int, task: str):
+        """ inserting new node into the tree, an existing priority gets its task replaced """
 
-    def __pre_order(self, node: Node):
-        if not node:
+        self.version += 1
+        path, node = self.__search_path(value)
+        if node is not self.nil:
+            node.task = task
             return
-        print(node)
-        self.__pre_order(node.left)
-        self.__pre_order(node.right)
 
-    def __in_order(self, node: Node):
-        if not node:
+        node = Node(value, task, self.nil, self.nil)
+        if not path:
+            self.root = node
             return
-        yield from self.__in_order(node.left)
-        yield node
-        yield from self.__in_order(node.right)
+        if value < path[-1].value:
+            path[-1].left = node
+        else:
+            path[-1].right = node
+        self.__rebalance_path(path)
 
-    def __post_order(self, node: Node):
-        if not node:
+    def delete(self, value: int):
+        """ deleting node with val == value if node exists """
+
+        path, node = self.__search_path(value)
+        if node is self.nil:
             return
-        self.__post_order(node.left)
-        self.__post_order(node.right)
-        print(node)
-
-    def __iter__(self):
-        return self.__in_order(self.root)
-
-    def rebalance_root(self):
-        return self.__balance(self.root)
-
-    def insert(self, priority: int, task: str):
-        self.root = self.__insert(self.root, priority, task)
-
-    def __find(self, node: Node, priority: int):
-        if not node or node.priority == priority:
-            return node
-        if node.priority > priority:
-            return self.__find(node.left, priority)
-        elif node.priority < priority:
-            return self.__find(node.right, priority)
-
-    def find_root(self, priority: int):
-        return self.__find(self.root, priority)
-
-    def __find_min(self, node):
-        if node is None:
-            return None
-        return self.__find_min(node.left) if node.left is not None else node
-
-    def __remove_element(self, node, element):
-        if node is None:
-            return None
-        if element < node.priority:
-            node.left = self.__remove_element(node.left, element)
-        elif element > node.priority:
-            node.right = self.__remove_element(node.right, element)
+        self.version += 1
+
+        if node.left is not self.nil and node.right is not self.nil:
+            # successor data moves into node, then the successor itself is removed from the right subtree
+            path.append(node)
+            successor = node.right
+            while successor.left is not self.nil:
+                path.append(successor)
+                successor = successor.left
+            node.value = successor.value
+            node.task = successor.task
+            node = successor
+
+        child = node.left if node.left is not self.nil else node.right
+        if not path:
+            self.root = child
+        elif path[-1].left is node:
+            path[-1].left = child
         else:
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
-            node.priority = self.__find_min(node.right).val
-            node.right = self.__remove_element(node.right, node.priority)
-        if not node:
-            return node
-        return self.__balance(node)
-
-    def remove_root(self, element):
-        self.__remove_element(self.root, element)
+            path[-1].right = child
+
+        self.__rebalance_path(path)
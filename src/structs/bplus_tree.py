@@ -0,0 +1,425 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from structs.rbt import gc_paused
+from structs.sorted_map import SortedMap
+
+DEFAULT_FANOUT = 64
+
+
+class _Leaf:
+    """ up to fanout priorities in one array block, their tasks alongside, linked to both neighbours """
+
+    __slots__ = ("keys", "tasks", "next", "prev")
+
+    def __init__(self, keys=(), tasks=()):
+        self.keys = array("q", keys)
+        self.tasks = list(tasks)
+        self.next = None
+        self.prev = None
+
+
+class _Inner:
+    """ keys[i] is the lowest priority under children[i + 1]; counts[i] is the number of tasks under children[i] """
+
+    __slots__ = ("keys", "children", "counts")
+
+    def __init__(self, keys=(), children=(), counts=()):
+        self.keys = array("q", keys)
+        self.children = list(children)
+        self.counts = array("q", counts)
+
+
+def _total(node) -> int:
+    return len(node.keys) if type(node) is _Leaf else sum(node.counts)
+
+
+class BPlusEntry:
+    """ handle to one task of BPlusTree, mirrors what RBNode offers for value and task
+
+    A handle reads and writes the leaf slot it was created for, so like a cursor it is only valid until the next
+    insert or delete. Entries returned by pop_min/pop_max are detached copies.
+    """
+
+    __slots__ = ("leaf", "index")
+
+    def __init__(self, leaf: _Leaf, index: int):
+        self.leaf = leaf
+        self.index = index
+
+    @property
+    def value(self) -> int:
+        return self.leaf.keys[self.index]
+
+    @property
+    def task(self) -> str:
+        return self.leaf.tasks[self.index]
+
+    @task.setter
+    def task(self, task: str):
+        self.leaf.tasks[self.index] = task
+
+    def __eq__(self, other):
+        return isinstance(other, BPlusEntry) and self.leaf is other.leaf and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.leaf), self.index))
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class BPlusTree(SortedMap):
+    """ B+-tree: priorities in array blocks of up to fanout keys, tasks only in the leaves, leaves linked in order
+
+    A search touches one block per level, log_fanout(n) of them, instead of one node object per level of a binary
+    tree, and the blocks hold raw 8-byte keys instead of a Python object per task. Every node but the root is at
+    least half full. Inner nodes count the tasks under each child, which keeps len, select and rank logarithmic.
+    """
+
+    # there is no binary node structure for DisplayTree to lay out
+    drawable = False
+    nil = BPlusEntry(_Leaf(), 0)
+
+    def __init__(self, fanout: int = DEFAULT_FANOUT):
+        if fanout < 4:
+            raise ValueError("fanout has to be at least 4")
+        self.fanout = fanout
+        self.root = _Leaf()
+        self.count = 0
+        self.version = 0
+
+    @classmethod
+    def from_sorted(cls, items, fanout: int = DEFAULT_FANOUT):
+        """ builds a tree from (priority, task) pairs sorted by priority in O(n), a repeated priority keeps its
+        last task """
+
+        tree = cls(fanout)
+        keys, tasks = array("q"), []
+        with gc_paused():
+            for value, task in items:
+                if keys and value <= keys[-1]:
+                    if value < keys[-1]:
+                        raise ValueError("items have to be sorted by priority")
+                    tasks[-1] = task
+                    continue
+                keys.append(value)
+                tasks.append(task)
+            tree.__link_sorted(keys, tasks)
+        return tree
+
+    @staticmethod
+    def __chunks(n: int, most: int) -> list:
+        """ (start, end) of as few chunks of at most most items as possible, sizes differing by at most one """
+
+        count = -(-n // most)
+        return [(n * i // count, n * (i + 1) // count) for i in range(count)]
+
+    def __link_sorted(self, keys: array, tasks: list):
+        self.version += 1
+        self.count = len(keys)
+        if not keys:
+            self.root = _Leaf()
+            return
+
+        level = [_Leaf(keys[lo:hi], tasks[lo:hi]) for lo, hi in self.__chunks(len(keys), self.fanout)]
+        for left, right in zip(level, level[1:]):
+            left.next, right.prev = right, left
+        lowest = [leaf.keys[0] for leaf in level]
+        totals = [len(leaf.keys) for leaf in level]
+
+        while len(level) > 1:
+            groups = self.__chunks(len(level), self.fanout + 1)
+            level, lowest, totals = ([_Inner(lowest[lo + 1:hi], level[lo:hi], totals[lo:hi]) for lo, hi in groups],
+                                     [lowest[lo] for lo, _ in groups],
+                                     [sum(totals[lo:hi]) for lo, hi in groups])
+        self.root = level[0]
+
+    def __descend(self, value: int):
+        """ leaf that holds or would hold value, and (inner node, child index) for every level above it """
+
+        path = []
+        node = self.root
+        while type(node) is _Inner:
+            index = bisect_right(node.keys, value)
+            path.append((node, index))
+            node = node.children[index]
+        return node, path
+
+    def search(self, value: int) -> BPlusEntry:
+        """ entry with priority == value, nil if there is none """
+
+        node = self.root
+        while type(node) is _Inner:
+            node = node.children[bisect_right(node.keys, value)]
+        index = bisect_left(node.keys, value)
+        if index < len(node.keys) and node.keys[index] == value:
+            return BPlusEntry(node, index)
+        return self.nil
+
+    def insert(self, value: int, task: str):
+        """ inserting a task, an existing priority gets its task replaced """
+
+        self.version += 1
+        leaf, path = self.__descend(value)
+        index = bisect_left(leaf.keys, value)
+        if index < len(leaf.keys) and leaf.keys[index] == value:
+            leaf.tasks[index] = task
+            return
+
+        leaf.keys.insert(index, value)
+        leaf.tasks.insert(index, task)
+        self.count += 1
+        for node, child in path:
+            node.counts[child] += 1
+        if len(leaf.keys) > self.fanout:
+            self.__split(leaf, path)
+
+    def __split(self, node, path: list):
+        """ halves an overfull node and hangs the new right half next to it, splitting ancestors as needed """
+
+        while len(node.keys) > self.fanout:
+            mid = len(node.keys) // 2
+            if type(node) is _Leaf:
+                right = _Leaf(node.keys[mid:], node.tasks[mid:])
+                del node.keys[mid:], node.tasks[mid:]
+                right.next, right.prev = node.next, node
+                if node.next is not None:
+                    node.next.prev = right
+                node.next = right
+                separator = right.keys[0]
+            else:
+                separator = node.keys[mid]
+                right = _Inner(node.keys[mid + 1:], node.children[mid + 1:], node.counts[mid + 1:])
+                del node.keys[mid:], node.children[mid + 1:], node.counts[mid + 1:]
+
+            if not path:
+                self.root = _Inner([separator], [node, right], [_total(node), _total(right)])
+                return
+            parent, index = path.pop()
+            parent.keys.insert(index, separator)
+            parent.children.insert(index + 1, right)
+            parent.counts.insert(index + 1, _total(right))
+            parent.counts[index] -= parent.counts[index + 1]
+            node = parent
+
+    def delete(self, value: int):
+        """ deleting task with priority == value if it exists """
+
+        leaf, path = self.__descend(value)
+        index = bisect_left(leaf.keys, value)
+        if index == len(leaf.keys) or leaf.keys[index] != value:
+            return
+        self.version += 1
+
+        del leaf.keys[index], leaf.tasks[index]
+        self.count -= 1
+        for node, child in path:
+            node.counts[child] -= 1
+        self.__refill(leaf, path)
+
+    def __refill(self, node, path: list):
+        """ tops up a node that fell below half full from a sibling, or merges it into one, going up while parents
+        fall short in turn
+
+        Separators above a leaf that lost its lowest key are left as they are, they still split the keys correctly.
+        """
+
+        least = self.fanout // 2
+        while path and len(node.keys) < least:
+            parent, index = path.pop()
+            left = parent.children[index - 1] if index > 0 else None
+            right = parent.children[index + 1] if index + 1 < len(parent.children) else None
+
+            if left is not None and len(left.keys) > least:
+                self.__borrow_left(parent, index, left, node)
+                return
+            if right is not None and len(right.keys) > least:
+                self.__borrow_right(parent, index, node, right)
+                return
+
+            if left is not None:
+                self.__merge(parent, index - 1, left, node)
+            else:
+                self.__merge(parent, index, node, right)
+            node = parent
+
+        if type(self.root) is _Inner and not self.root.keys:
+            self.root = self.root.children[0]
+
+    @staticmethod
+    def __borrow_left(parent: _Inner, index: int, left, node):
+        if type(node) is _Leaf:
+            node.keys.insert(0, left.keys.pop())
+            node.tasks.insert(0, left.tasks.pop())
+            parent.keys[index - 1] = node.keys[0]
+            moved = 1
+        else:
+            node.keys.insert(0, parent.keys[index - 1])
+            parent.keys[index - 1] = left.keys.pop()
+            node.children.insert(0, left.children.pop())
+            moved = left.counts.pop()
+            node.counts.insert(0, moved)
+        parent.counts[index - 1] -= moved
+        parent.counts[index] += moved
+
+    @staticmethod
+    def __borrow_right(parent: _Inner, index: int, node, right):
+        if type(node) is _Leaf:
+            node.keys.append(right.keys.pop(0))
+            node.tasks.append(right.tasks.pop(0))
+            parent.keys[index] = right.keys[0]
+            moved = 1
+        else:
+            node.keys.append(parent.keys[index])
+            parent.keys[index] = right.keys.pop(0)
+            node.children.append(right.children.pop(0))
+            moved = right.counts.pop(0)
+            node.counts.append(moved)
+        parent.counts[index + 1] -= moved
+        parent.counts[index] += moved
+
+    @staticmethod
+    def __merge(parent: _Inner, index: int, left, right):
+        """ moves right, the child at index + 1, into left and drops it from parent """
+
+        if type(left) is _Leaf:
+            left.keys.extend(right.keys)
+            left.tasks.extend(right.tasks)
+            left.next = right.next
+            if right.next is not None:
+                right.next.prev = left
+        else:
+            left.keys.append(parent.keys[index])
+            left.keys.extend(right.keys)
+            left.children.extend(right.children)
+            left.counts.extend(right.counts)
+        del parent.keys[index]
+        del parent.children[index + 1]
+        parent.counts[index] += parent.counts[index + 1]
+        del parent.counts[index + 1]
+
+    def __first_leaf(self) -> _Leaf:
+        node = self.root
+        while type(node) is _Inner:
+            node = node.children[0]
+        return node
+
+    def __last_leaf(self) -> _Leaf:
+        node = self.root
+        while type(node) is _Inner:
+            node = node.children[-1]
+        return node
+
+    def in_order(self):
+        """ entries in ascending priority order, one leaf block after the other """
+
+        leaf = self.__first_leaf()
+        while leaf is not None:
+            for index in range(len(leaf.keys)):
+                yield BPlusEntry(leaf, index)
+            leaf = leaf.next
+
+    def items(self):
+        """ (priority, task) pairs in ascending order without creating a handle per task """
+
+        leaf = self.__first_leaf()
+        while leaf is not None:
+            yield from zip(leaf.keys, leaf.tasks)
+            leaf = leaf.next
+
+    def __len__(self):
+        return self.count
+
+    def minimum(self) -> BPlusEntry:
+        leaf = self.__first_leaf()
+        return BPlusEntry(leaf, 0) if leaf.keys else self.nil
+
+    def maximum(self) -> BPlusEntry:
+        leaf = self.__last_leaf()
+        return BPlusEntry(leaf, len(leaf.keys) - 1) if leaf.keys else self.nil
+
+    def __pop(self, entry: BPlusEntry) -> BPlusEntry:
+        if entry == self.nil:
+            return entry
+        detached = BPlusEntry(_Leaf([entry.value], [entry.task]), 0)
+        self.delete(detached.value)
+        return detached
+
+    def pop_min(self) -> BPlusEntry:
+        """ removes and returns the lowest priority entry, nil if the tree is empty """
+
+        return self.__pop(self.minimum())
+
+    def pop_max(self) -> BPlusEntry:
+        """ removes and returns the highest priority entry, nil if the tree is empty """
+
+        return self.__pop(self.maximum())
+
+    def select(self, k: int) -> BPlusEntry:
+        """ returns entry with k-th highest priority (k = 0 is the highest), nil if out of range """
+
+        if not 0 <= k < self.count:
+            return self.nil
+        # position counted from the lowest priority
+        position = self.count - 1 - k
+        node = self.root
+        while type(node) is _Inner:
+            index = 0
+            while position >= node.counts[index]:
+                position -= node.counts[index]
+                index += 1
+            node = node.children[index]
+        return BPlusEntry(node, position)
+
+    def rank(self, value: int) -> int:
+        """ returns number of tasks with priority higher than value, so select(rank(value)) finds value """
+
+        at_most = 0
+        node = self.root
+        while type(node) is _Inner:
+            index = bisect_right(node.keys, value)
+            at_most += sum(node.counts[:index])
+            node = node.children[index]
+        return self.count - at_most - bisect_right(node.keys, value)
+
+    def floor(self, value: int) -> BPlusEntry:
+        """ entry with the highest priority <= value or nil """
+
+        leaf, _ = self.__descend(value)
+        index = bisect_right(leaf.keys, value) - 1
+        if index >= 0:
+            return BPlusEntry(leaf, index)
+        # value is below this leaf, which only happens at the left edge or after deletes emptied its front
+        leaf = leaf.prev
+        return BPlusEntry(leaf, len(leaf.keys) - 1) if leaf is not None else self.nil
+
+    def ceiling(self, value: int) -> BPlusEntry:
+        """ entry with the lowest priority >= value or nil """
+
+        leaf, _ = self.__descend(value)
+        index = bisect_left(leaf.keys, value)
+        if index < len(leaf.keys):
+            return BPlusEntry(leaf, index)
+        leaf = leaf.next
+        return BPlusEntry(leaf, 0) if leaf is not None else self.nil
+
+    def range(self, lo: int, hi: int):
+        """ yields entries with lo <= priority <= hi in ascending order, scanning along the linked leaves """
+
+        leaf, _ = self.__descend(lo)
+        index = bisect_left(leaf.keys, lo)
+        while leaf is not None:
+            keys = leaf.keys
+            end = bisect_right(keys, hi)
+            for i in range(index, end):
+                yield BPlusEntry(leaf, i)
+            if end < len(keys):
+                return
+            leaf, index = leaf.next, 0
+
+    def height(self) -> int:
+        depth, node = 1, self.root
+        while type(node) is _Inner:
+            depth, node = depth + 1, node.children[0]
+        return depth
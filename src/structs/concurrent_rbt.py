@@ -0,0 +1,171 @@
+import threading
+
+from structs.rbt import RBTree
+
+
+class LockSide:
+    """ context manager for one side of RWLock, cheaper than a generator based contextmanager on hot paths """
+
+    __slots__ = ("acquire", "release")
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class RWLock:
+    """ many readers or a single writer; a waiting writer holds off new readers so writes are not starved """
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.cond = threading.Condition(self.mutex)
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+        self.read_locked = LockSide(self.acquire_read, self.release_read)
+        self.write_locked = LockSide(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        with self.mutex:
+            while self.writer or self.waiting_writers:
+                self.cond.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.mutex:
+            self.readers -= 1
+            # only a writer can be waiting for the last reader to leave
+            if not self.readers and self.waiting_writers:
+                self.cond.notify_all()
+
+    def acquire_write(self):
+        with self.mutex:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.cond.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.mutex:
+            self.writer = False
+            self.cond.notify_all()
+
+
+class ConcurrentRBTree:
+    """ RBTree that can be shared between threads
+
+    Lookups run in parallel under the read lock, mutations take the write lock. Iteration walks the tree in
+    chunks with a cursor and drops the lock between chunks, so a long scan never stalls writers; it sees
+    every task that stays in the tree for the whole scan. snapshot() gives a consistent copy instead.
+    The locks are not reentrant: do not call back into the tree while holding read_locked/write_locked.
+    """
+
+    def __init__(self, tree: RBTree = None, chunk_size: int = 1024):
+        self.tree = tree if tree is not None else RBTree()
+        self.lock = RWLock()
+        self.chunk_size = chunk_size
+
+    @property
+    def nil(self):
+        return self.tree.nil
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    @property
+    def read_locked(self) -> LockSide:
+        return self.lock.read_locked
+
+    @property
+    def write_locked(self) -> LockSide:
+        return self.lock.write_locked
+
+    def search(self, value: int):
+        with self.lock.read_locked:
+            return self.tree.search(value)
+
+    def select(self, k: int):
+        with self.lock.read_locked:
+            return self.tree.select(k)
+
+    def rank(self, value: int) -> int:
+        with self.lock.read_locked:
+            return self.tree.rank(value)
+
+    def floor(self, value: int):
+        with self.lock.read_locked:
+            return self.tree.floor(value)
+
+    def ceiling(self, value: int):
+        with self.lock.read_locked:
+            return self.tree.ceiling(value)
+
+    def range(self, lo: int, hi: int) -> list:
+        with self.lock.read_locked:
+            return list(self.tree.range(lo, hi))
+
+    def insert(self, value: int, task: str):
+        with self.lock.write_locked:
+            self.tree.insert(value, task)
+
+    def delete(self, value: int):
+        with self.lock.write_locked:
+            self.tree.delete(value)
+
+    def insert_many(self, items):
+        items = list(items)
+        with self.lock.write_locked:
+            self.tree.insert_many(items)
+
+    def delete_many(self, values) -> int:
+        values = list(values)
+        with self.lock.write_locked:
+            return self.tree.delete_many(values)
+
+    def peek_min(self):
+        with self.lock.read_locked:
+            return self.tree.peek_min()
+
+    def peek_max(self):
+        with self.lock.read_locked:
+            return self.tree.peek_max()
+
+    def pop_min(self):
+        with self.lock.write_locked:
+            return self.tree.pop_min()
+
+    def pop_max(self):
+        with self.lock.write_locked:
+            return self.tree.pop_max()
+
+    def snapshot(self) -> list:
+        """ consistent (priority, task) copy of the whole tree """
+
+        with self.lock.read_locked:
+            return [(node.value, node.task) for node in self.tree]
+
+    def __chunk(self, cursor) -> list:
+        chunk = cursor.take(self.chunk_size)
+        # a run of equal priorities is never split, so the next chunk can simply resume after the last priority
+        while chunk and cursor.node != self.tree.nil and cursor.node.value == chunk[-1].value:
+            chunk.append(next(cursor))
+        return chunk
+
+    def __iter__(self):
+        with self.lock.read_locked:
+            chunk = self.__chunk(self.tree.cursor())
+        while chunk:
+            yield from chunk
+            with self.lock.read_locked:
+                chunk = self.__chunk(self.tree.cursor(chunk[-1].value + 1))
+
+    def __len__(self):
+        return len(self.tree)
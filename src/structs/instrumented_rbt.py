@@ -0,0 +1,179 @@
+""" opt-in counters for RBTree: rotations, recolourings, fix-up loop iterations, search path lengths and latencies
+
+RBTree itself only tallies its fix-up loops in two locals and hands them to a no-op count_fixup hook.
+instrument(tree) switches a live tree to InstrumentedRBTree, uninstrument(tree) switches it back, so a tree that
+is not being watched runs the plain code.
+"""
+
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from structs.rbt import RBNode, RBTree
+
+# upper bounds in seconds, the last bucket takes everything slower
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, float("inf"))
+PATH_BUCKETS = (1, 2, 4, 8, 16, 24, 32, 48, 64, float("inf"))
+
+
+class Histogram:
+    """ counts per bucket plus sum and count, the shape of a Prometheus histogram """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "mean": self.sum / self.count if self.count else 0,
+                "buckets": dict(zip(self.buckets, self.counts))}
+
+    def prometheus(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum!r}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class TreeStats:
+    OPS = ("search", "insert", "delete")
+
+    def __init__(self):
+        self.rotations = Counter(left=0, right=0)
+        # every colour written by a fix-up loop, including writes that keep the colour
+        self.recolorings = Counter(insert=0, delete=0)
+        self.fixup_calls = Counter(insert=0, delete=0)
+        self.fixup_iterations = Counter(insert=0, delete=0)
+        self.paths = {op: Histogram(PATH_BUCKETS) for op in self.OPS}
+        self.latency = {op: Histogram(LATENCY_BUCKETS) for op in self.OPS}
+
+    def as_dict(self) -> dict:
+        return {"rotations": dict(self.rotations),
+                "recolorings": dict(self.recolorings),
+                "fixup_calls": dict(self.fixup_calls),
+                "fixup_iterations": dict(self.fixup_iterations),
+                "path_length": {op: histogram.as_dict() for op, histogram in self.paths.items()},
+                "latency_seconds": {op: histogram.as_dict() for op, histogram in self.latency.items()}}
+
+    def prometheus(self, prefix: str = "rbtree") -> str:
+        """ Prometheus text exposition format """
+
+        lines = [f"# TYPE {prefix}_rotations_total counter"]
+        lines += [f'{prefix}_rotations_total{{direction="{side}"}} {count}' for side, count in self.rotations.items()]
+        for name, counter in (("recolorings", self.recolorings), ("fixup_calls", self.fixup_calls),
+                              ("fixup_iterations", self.fixup_iterations)):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines += [f'{prefix}_{name}_total{{op="{op}"}} {count}' for op, count in counter.items()]
+        for name, histograms in (("path_length", self.paths), ("operation_seconds", self.latency)):
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for op, histogram in histograms.items():
+                lines += histogram.prometheus(f"{prefix}_{name}", f'op="{op}"')
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedRBTree(RBTree):
+    """ RBTree that records what every operation costs, through the count_fixup and rotation hooks of RBTree plus
+    timed search, insert and delete """
+
+    def __init__(self):
+        super().__init__()
+        self.stats = TreeStats()
+
+    def search(self, value: int):
+        start_time = time.perf_counter_ns()
+        node = self.__descend(value, "search")
+        self.stats.latency["search"].observe((time.perf_counter_ns() - start_time) / 1e9)
+        return node
+
+    def __descend(self, value: int, op: str) -> RBNode:
+        """ RBTree.search counting the nodes visited on the way """
+
+        length = 0
+        cur_node = self.root
+        while cur_node != self.nil and value != cur_node.value:
+            length += 1
+            cur_node = cur_node.left if value < cur_node.value else cur_node.right
+        self.stats.paths[op].observe(length + (cur_node != self.nil))
+        return cur_node
+
+    def insert(self, value: int, task: str):
+        # the insert path is where the new node would hang, walked once more outside the timed part
+        length = 0
+        cur_node = self.root
+        while cur_node != self.nil:
+            length += 1
+            cur_node = cur_node.left if value < cur_node.value else cur_node.right
+        self.stats.paths["insert"].observe(length)
+
+        start_time = time.perf_counter_ns()
+        super().insert(value, task)
+        self.stats.latency["insert"].observe((time.perf_counter_ns() - start_time) / 1e9)
+
+    def delete(self, value: int):
+        start_time = time.perf_counter_ns()
+        node = self.__descend(value, "delete")
+        if node != self.nil:
+            self.delete_node(node)
+        self.stats.latency["delete"].observe((time.perf_counter_ns() - start_time) / 1e9)
+
+    def count_fixup(self, op: str, iterations: int, recolorings: int):
+        self.stats.fixup_calls[op] += 1
+        self.stats.fixup_iterations[op] += iterations
+        self.stats.recolorings[op] += recolorings
+
+    def _rotate_left(self, node: RBNode):
+        self.stats.rotations["left"] += 1
+        super()._rotate_left(node)
+
+    def _rotate_right(self, node: RBNode):
+        self.stats.rotations["right"] += 1
+        super()._rotate_right(node)
+
+
+_instrumented_classes = {RBTree: InstrumentedRBTree}
+
+
+def _instrumented_cls(plain_cls: type) -> type:
+    if plain_cls not in _instrumented_classes:
+        name = f"Instrumented{plain_cls.__name__}"
+        _instrumented_classes[plain_cls] = type(name, (InstrumentedRBTree, plain_cls), {})
+    return _instrumented_classes[plain_cls]
+
+
+def instrument(tree: RBTree) -> InstrumentedRBTree:
+    """ starts recording on a live tree with fresh stats, nothing is copied
+
+    The tree becomes an instance of InstrumentedRBTree mixed into its own class, so subclasses of RBTree keep their
+    behaviour; uninstrument gives it its class back.
+    """
+
+    plain_cls = type(tree)
+    if not isinstance(tree, InstrumentedRBTree):
+        tree.__class__ = _instrumented_cls(plain_cls)
+        tree.plain_cls = plain_cls
+    tree.stats = TreeStats()
+    return tree
+
+
+def uninstrument(tree: InstrumentedRBTree) -> TreeStats:
+    """ turns a tree back into the class it had before instrument, returns what was recorded """
+
+    stats = tree.stats
+    del tree.stats
+    tree.__class__ = tree.__dict__.pop("plain_cls", RBTree)
+    return stats
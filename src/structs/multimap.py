@@ -0,0 +1,186 @@
+from collections import deque
+from itertools import groupby
+
+from structs.rbt import RBTree
+
+
+class QueuedTask:
+    """ one task of a TaskMultiMap as iteration, range and the pops hand it out, detached from the map """
+
+    __slots__ = ("value", "task")
+
+    def __init__(self, value: int, task: str):
+        self.value = value
+        self.task = task
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class BucketHead:
+    """ the oldest task of a priority as search returns it; writing task replaces that task in place """
+
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def value(self) -> int:
+        return self.node.value
+
+    @property
+    def task(self) -> str:
+        return self.node.task[0]
+
+    @task.setter
+    def task(self, task: str):
+        self.node.task[0] = task
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class TaskMultiMap:
+    """ any number of tasks per priority: the backend tree holds one node per distinct priority, whose task is a
+    FIFO bucket (a deque) of everything queued under it
+
+    The tree stays as big as the number of priority levels however many tasks wait on them. insert queues behind
+    the tasks of the same priority and delete, pop_min and pop_max take the oldest one, so after finding the node
+    both ends of a bucket are O(1). Lookups and pops hand out the task with the priority like RBTree's nodes do,
+    which keeps TaskStore, TaskService and TaskServer working unchanged: the write-ahead log replays the same
+    queue order and snapshots store every task in priority, then queue order.
+    """
+
+    # insert queues another task under an existing priority instead of colliding with it
+    multimap = True
+    # the nodes carry buckets, not task labels
+    drawable = False
+    persistent = False
+    text_tasks = False
+    backend = RBTree
+    nil = QueuedTask(0, "")
+
+    def __init__(self):
+        self.tree = self.backend()
+        self.count = 0
+        self.version = 0
+
+    @classmethod
+    def of(cls, backend: type) -> type:
+        """ TaskMultiMap keeping its buckets in another SortedMap backend
+
+        Buckets change in place, so a persistent backend would let its snapshots and undo history see later
+        pushes and pops; such backends are refused, as are backends that can only hold string tasks.
+        """
+
+        if backend.persistent:
+            raise ValueError(f"{backend.__name__} keeps old versions, which in-place buckets would change")
+        if backend.text_tasks:
+            raise ValueError(f"{backend.__name__} only holds string tasks, not buckets")
+        return type(f"{backend.__name__}MultiMap", (cls,), {"backend": backend})
+
+    @classmethod
+    def from_sorted(cls, items):
+        """ builds the map from (priority, task) pairs sorted by priority, equal priorities kept in their order """
+
+        multimap = cls()
+        buckets = [(value, deque(task for _, task in group)) for value, group in groupby(items, lambda item: item[0])]
+        multimap.tree = cls.backend.from_sorted(buckets)
+        multimap.count = sum(len(bucket) for _, bucket in buckets)
+        multimap.version += 1
+        return multimap
+
+    def search(self, value: int):
+        """ oldest task with priority == value, nil if there is none """
+
+        node = self.tree.search(value)
+        return self.nil if node == self.tree.nil else BucketHead(node)
+
+    def insert(self, value: int, task: str):
+        """ queues task behind the ones already waiting with the same priority """
+
+        self.version += 1
+        self.count += 1
+        node = self.tree.search(value)
+        if node == self.tree.nil:
+            self.tree.insert(value, deque((task,)))
+        else:
+            node.task.append(task)
+
+    def delete(self, value: int):
+        """ removes the oldest task with priority == value if there is one """
+
+        node = self.tree.search(value)
+        if node != self.tree.nil:
+            self.__take(node)
+
+    def __take(self, node) -> QueuedTask:
+        """ pops the oldest task of node's bucket, dropping the node with its last task """
+
+        self.version += 1
+        self.count -= 1
+        value, bucket = node.value, node.task
+        task = bucket.popleft()
+        if not bucket:
+            self.tree.delete(value)
+        return QueuedTask(value, task)
+
+    def pop_min(self) -> QueuedTask:
+        """ removes and returns the oldest task of the lowest priority, nil if the map is empty """
+
+        node = self.tree.peek_min()
+        return self.nil if node == self.tree.nil else self.__take(node)
+
+    def pop_max(self) -> QueuedTask:
+        """ removes and returns the oldest task of the highest priority, nil if the map is empty """
+
+        node = self.tree.peek_max()
+        return self.nil if node == self.tree.nil else self.__take(node)
+
+    def peek_min(self):
+        node = self.tree.peek_min()
+        return self.nil if node == self.tree.nil else BucketHead(node)
+
+    def peek_max(self):
+        node = self.tree.peek_max()
+        return self.nil if node == self.tree.nil else BucketHead(node)
+
+    def replace(self, value: int, task: str) -> bool:
+        """ changes the oldest task with priority == value, False if there is none """
+
+        node = self.tree.search(value)
+        if node == self.tree.nil:
+            return False
+        node.task[0] = task
+        self.version += 1
+        return True
+
+    def bucket(self, value: int) -> deque:
+        """ tasks waiting with priority == value, oldest first; empty when there are none """
+
+        node = self.tree.search(value)
+        return deque() if node == self.tree.nil else node.task
+
+    def range(self, lo: int, hi: int):
+        """ yields every task with lo <= priority <= hi, by priority and then in queue order """
+
+        for node in self.tree.range(lo, hi):
+            for task in node.task:
+                yield QueuedTask(node.value, task)
+
+    def __iter__(self):
+        for node in self.tree:
+            for task in node.task:
+                yield QueuedTask(node.value, task)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value: int) -> bool:
+        return self.tree.search(value) != self.tree.nil
+
+    def priorities(self) -> int:
+        """ number of distinct priorities, which is the size of the backend tree """
+
+        return len(self.tree)
@@ -0,0 +1,302 @@
+""" persistent red-black tree: every change makes a new version sharing all untouched nodes with the old one
+
+The tree is left-leaning (a red link only ever leans left), which keeps insert and delete short enough to write
+as recursions that return the new root of each subtree. Nodes have no parent pointers and a node reachable from
+any published version is never written again: an operation copies the O(log n) nodes on its path before it
+changes them. Nodes created by the running operation carry its stamp and are changed in place, so a rotation
+does not copy a node the same operation copied a moment ago.
+"""
+
+from collections import deque
+from itertools import count
+
+from structs.rbt import gc_paused
+from structs.sorted_map import SortedMap
+
+RED = "red"
+BLACK = "black"
+
+# one counter for all trees: trees sharing nodes, like a snapshot and its source, must never share a stamp
+_STAMPS = count()
+
+
+class PersistentNode:
+    """ node of a PersistentRBTree, read only once the operation that made it is over """
+
+    __slots__ = ("value", "task", "color", "left", "right", "size", "stamp")
+
+    def __init__(self, value: int, task: str, color: str, left, right, size: int, stamp: int):
+        self.value = value
+        self.task = task
+        self.color = color
+        self.left = left
+        self.right = right
+        self.size = size
+        self.stamp = stamp
+
+    def __str__(self):
+        return f"{self.task}"
+
+
+class PersistentRBTree(SortedMap):
+    """ SortedMap whose versions are roots: snapshot is O(1) and undo/redo step between kept versions
+
+    Every change keeps (root before, edit) on the undo history, at most history entries of it, where an edit is
+    (priority, task before, task after) and None stands for no task. A snapshot is a tree on the current root
+    without history; it stays exactly as it is however the tree goes on changing, so readers need no lock.
+    Searches return nodes that must not be written to, a task changes through replace.
+    """
+
+    nil = PersistentNode(0, "", BLACK, None, None, 0, -1)
+    # the rebalancing looks at grandchildren without checking for leaves first
+    nil.left = nil.right = nil
+    # changes never touch nodes readers may hold, see snapshot
+    persistent = True
+
+    def __init__(self, root=None, history: int = 1000):
+        self.root = self.nil if root is None else root
+        self.version = 0
+        self.undo_history = deque(maxlen=history)
+        self.redo_history = []
+        self.stamp = next(_STAMPS)
+
+    @classmethod
+    def from_sorted(cls, items):
+        """ builds a tree from (priority, task) pairs sorted by priority in O(n), as one operation without history
+
+        A left-leaning tree cannot take the midpoint build of the other backends as it is, its red links have to
+        lean left. Seen as a 2-3 tree it is easy though: with the greatest black height n tasks allow, a subtree
+        becomes a black node with two children while they can hold the rest and a black node with a red left
+        child, three subtrees below them, once they cannot.
+        """
+
+        items = list(items)
+        for i in range(1, len(items)):
+            if items[i][0] < items[i - 1][0]:
+                raise ValueError("items have to be sorted by priority")
+
+        tree = cls()
+        nil, stamp = tree.nil, tree.stamp
+        with gc_paused():
+            # (lo, hi, black height, parent, is_left) of every subtree still to build
+            stack = [(0, len(items), (len(items) + 1).bit_length() - 1, None, False)]
+            while stack:
+                lo, hi, height, parent, is_left = stack.pop()
+                n = hi - lo
+                if not n:
+                    continue
+                # most tasks a subtree of black height height - 1 holds, a perfect tree of 3-nodes
+                capacity = 3 ** (height - 1) - 1
+                if n - 1 <= 2 * capacity:
+                    mid = lo + (n - 1) // 2
+                    node = PersistentNode(*items[mid], BLACK, nil, nil, n, stamp)
+                    stack.append((lo, mid, height - 1, node, True))
+                    stack.append((mid + 1, hi, height - 1, node, False))
+                else:
+                    first = (n - 2) // 3
+                    second = (n - 2 - first) // 2
+                    red, black = lo + first, lo + first + 1 + second
+                    node = PersistentNode(*items[black], BLACK, nil, nil, n, stamp)
+                    node.left = PersistentNode(*items[red], RED, nil, nil, first + second + 1, stamp)
+                    stack.append((lo, red, height - 1, node.left, True))
+                    stack.append((red + 1, black, height - 1, node.left, False))
+                    stack.append((black + 1, hi, height - 1, node, False))
+                if parent is None:
+                    tree.root = node
+                elif is_left:
+                    parent.left = node
+                else:
+                    parent.right = node
+        return tree
+
+    def snapshot(self):
+        """ the current version as a tree of its own, O(1) """
+
+        return type(self)(self.root, history=0)
+
+    def search(self, value: int):
+        node = self.root
+        while node != self.nil:
+            if value == node.value:
+                return node
+            node = node.left if value < node.value else node.right
+        return self.nil
+
+    def __own(self, node):
+        """ node itself if the running operation made it, a copy it may change otherwise """
+
+        if node.stamp == self.stamp or node == self.nil:
+            return node
+        return PersistentNode(node.value, node.task, node.color, node.left, node.right, node.size, self.stamp)
+
+    def __commit(self, root, edit: tuple):
+        """ publishes root as the new version, remembering the one before for undo """
+
+        self.undo_history.append((self.root, edit))
+        self.redo_history.clear()
+        self.root = root
+        self.version += 1
+
+    def insert(self, value: int, task: str):
+        """ adds a task, an existing priority gets its task replaced """
+
+        before = self.search(value)
+        self.stamp = next(_STAMPS)
+        root = self.__own(self.__insert(self.root, value, task))
+        root.color = BLACK
+        self.__commit(root, (value, None if before == self.nil else before.task, task))
+
+    def replace(self, value: int, task: str) -> bool:
+        """ changes the task of an existing priority in a new version, False if there is none """
+
+        if self.search(value) == self.nil:
+            return False
+        self.insert(value, task)
+        return True
+
+    def delete(self, value: int):
+        """ removes the node with priority == value if there is one """
+
+        node = self.search(value)
+        if node == self.nil:
+            return
+        self.stamp = next(_STAMPS)
+        root = self.root
+        if not self.__is_red(root.left) and not self.__is_red(root.right):
+            root = self.__own(root)
+            root.color = RED
+        root = self.__delete(root, value)
+        if root != self.nil:
+            root = self.__own(root)
+            root.color = BLACK
+        self.__commit(root, (value, node.task, None))
+
+    def undo(self):
+        """ goes back to the version before the last change, returns its edit (priority, task before, task after)
+        or None when there is nothing to undo """
+
+        if not self.undo_history:
+            return None
+        root, edit = self.undo_history.pop()
+        self.redo_history.append((self.root, edit))
+        self.root = root
+        self.version += 1
+        return edit
+
+    def redo(self):
+        """ reapplies the last undone change, returns its edit or None when there is nothing to redo """
+
+        if not self.redo_history:
+            return None
+        root, edit = self.redo_history.pop()
+        self.undo_history.append((self.root, edit))
+        self.root = root
+        self.version += 1
+        return edit
+
+    def __is_red(self, node) -> bool:
+        return node.color == RED
+
+    def __insert(self, node, value: int, task: str):
+        if node == self.nil:
+            return PersistentNode(value, task, RED, self.nil, self.nil, 1, self.stamp)
+        node = self.__own(node)
+        if value < node.value:
+            node.left = self.__insert(node.left, value, task)
+        elif value > node.value:
+            node.right = self.__insert(node.right, value, task)
+        else:
+            node.task = task
+        return self.__balance(node)
+
+    def __delete(self, node, value: int):
+        """ removes value from the subtree of node, which has to contain it """
+
+        node = self.__own(node)
+        if value < node.value:
+            if not self.__is_red(node.left) and not self.__is_red(node.left.left):
+                node = self.__move_red_left(node)
+            node.left = self.__delete(node.left, value)
+        else:
+            if self.__is_red(node.left):
+                node = self.__rotate_right(node)
+            if value == node.value and node.right == self.nil:
+                return self.nil
+            if not self.__is_red(node.right) and not self.__is_red(node.right.left):
+                node = self.__move_red_right(node)
+            if value == node.value:
+                # this copy takes the successor's place, the successor is removed below
+                successor = node.right
+                while successor.left != self.nil:
+                    successor = successor.left
+                node.value, node.task = successor.value, successor.task
+                node.right = self.__delete_min(node.right)
+            else:
+                node.right = self.__delete(node.right, value)
+        return self.__balance(node)
+
+    def __delete_min(self, node):
+        if node.left == self.nil:
+            return self.nil
+        node = self.__own(node)
+        if not self.__is_red(node.left) and not self.__is_red(node.left.left):
+            node = self.__move_red_left(node)
+        node.left = self.__delete_min(node.left)
+        return self.__balance(node)
+
+    def __rotate_left(self, node):
+        child = self.__own(node.right)
+        node.right = child.left
+        child.left = node
+        child.color = node.color
+        node.color = RED
+        child.size = node.size
+        node.size = node.left.size + node.right.size + 1
+        return child
+
+    def __rotate_right(self, node):
+        child = self.__own(node.left)
+        node.left = child.right
+        child.right = node
+        child.color = node.color
+        node.color = RED
+        child.size = node.size
+        node.size = node.left.size + node.right.size + 1
+        return child
+
+    def __flip_colors(self, node):
+        node.color = BLACK if node.color == RED else RED
+        node.left = self.__own(node.left)
+        node.right = self.__own(node.right)
+        for child in (node.left, node.right):
+            if child != self.nil:
+                child.color = BLACK if child.color == RED else RED
+
+    def __move_red_left(self, node):
+        """ makes node.left or one of its children red, so the delete can go left """
+
+        self.__flip_colors(node)
+        if self.__is_red(node.right.left):
+            node.right = self.__rotate_right(self.__own(node.right))
+            node = self.__rotate_left(node)
+            self.__flip_colors(node)
+        return node
+
+    def __move_red_right(self, node):
+        self.__flip_colors(node)
+        if self.__is_red(node.left.left):
+            node = self.__rotate_right(node)
+            self.__flip_colors(node)
+        return node
+
+    def __balance(self, node):
+        """ restores the left-leaning shape on the way back up, node is owned """
+
+        if self.__is_red(node.right) and not self.__is_red(node.left):
+            node = self.__rotate_left(node)
+        if self.__is_red(node.left) and self.__is_red(node.left.left):
+            node = self.__rotate_right(node)
+        if self.__is_red(node.left) and self.__is_red(node.right):
+            self.__flip_colors(node)
+        node.size = node.left.size + node.right.size + 1
+        return node
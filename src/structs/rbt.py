@@ -1,6 +1,31 @@
+import gc
+import heapq
+from collections import Counter
+from contextlib import contextmanager
+
+from structs.sorted_map import SortedMap
+
+
+@contextmanager
+def gc_paused():
+    """ bulk builds allocate millions of linked nodes, letting the cyclic collector rescan them on the way costs
+    more than the build itself """
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
 class RBNode:
     """ Red-Black tree node implementation """
 
+    # no per-instance __dict__: keeps nodes small when the tree holds millions of tasks
+    __slots__ = ("value", "task", "color", "left", "right", "parent", "size")
+
     def __init__(self, value: int, task: str, color="red"):
         # new nodes by default has to be red
         self.value = value
@@ -9,6 +34,8 @@ class RBNode:
         self.left = None
         self.right = None
         self.parent = None
+        # number of nodes in the subtree rooted here, nil leaves count as 0
+        self.size = 1
 
     def grandparent(self):
         """ returns grandparent of a node if exists """
@@ -37,15 +64,121 @@ class RBNode:
         return f"{self.task}"
 
 
-class RBTree:
+class RBTree(SortedMap):
     """ Red-Black tree implementation """
 
     # nil node for tree
     nil = RBNode(0, "", "black")
+    nil.size = 0
+    # class of the nodes the tree creates, subclasses may store tasks differently
+    node_cls = RBNode
 
     def __init__(self):
         # by default tree root is black
         self.root = self.nil
+        # cached extremes, so queue style peeks are O(1)
+        self.min_node = self.nil
+        self.max_node = self.nil
+        # bumped by every structural change, lets views skip work when nothing happened
+        self.version = 0
+
+    @classmethod
+    def from_sorted(cls, items):
+        """ builds a tree from (priority, task) pairs sorted by priority in O(n) """
+
+        tree = cls()
+        with gc_paused():
+            nodes = [tree.node_cls(value, task) for value, task in items]
+            for i in range(1, len(nodes)):
+                if nodes[i].value < nodes[i - 1].value:
+                    raise ValueError("items have to be sorted by priority")
+            tree.__link_sorted(nodes)
+        return tree
+
+    def __link_sorted(self, nodes: list):
+        """ links already sorted nodes into a balanced red-black tree in O(n) """
+
+        self.version += 1
+        self.root = self.nil
+        self.min_node = nodes[0] if nodes else self.nil
+        self.max_node = nodes[-1] if nodes else self.nil
+        if not nodes:
+            return
+
+        # splitting at the middle gives minimal height, so only the deepest level can be incomplete:
+        # colouring exactly that level red keeps every path at the same black height
+        red_depth = len(nodes).bit_length() - 1
+
+        stack = [(0, len(nodes), None, False, 0)]
+        while stack:
+            lo, hi, parent, is_left, depth = stack.pop()
+            if lo == hi:
+                continue
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.parent = parent
+            node.left = node.right = self.nil
+            node.size = hi - lo
+            node.color = "red" if depth == red_depth and depth > 0 else "black"
+
+            if parent is None:
+                self.root = node
+            elif is_left:
+                parent.left = node
+            else:
+                parent.right = node
+
+            stack.append((lo, mid, node, True, depth + 1))
+            stack.append((mid + 1, hi, node, False, depth + 1))
+
+    def __nodes(self) -> list:
+        """ all nodes in priority order """
+
+        return list(self.in_order())
+
+    def _worth_rebuild(self, batch_size: int) -> bool:
+        """ one linear merge beats batch_size separate O(log n) updates, protected so subclasses that track the
+        nodes a batch removes can pick the same path """
+
+        return batch_size * max(1, len(self).bit_length()) >= len(self)
+
+    def insert_many(self, items):
+        """ inserts a batch of (priority, task) pairs, merging and relinking the whole tree when the batch is large """
+
+        batch = sorted(items, key=lambda item: item[0])
+        if not self._worth_rebuild(len(batch)):
+            for value, task in batch:
+                self.insert(value, task)
+            return
+
+        # existing nodes are reused, so references held by callers stay valid
+        with gc_paused():
+            new_nodes = [self.node_cls(value, task) for value, task in batch]
+            self.__link_sorted(list(heapq.merge(self.__nodes(), new_nodes, key=lambda node: node.value)))
+
+    def delete_many(self, values) -> int:
+        """ deletes one node per given priority, returns how many were found and removed """
+
+        batch = Counter(values)
+        if not self._worth_rebuild(sum(batch.values())):
+            removed = 0
+            for value, count in batch.items():
+                for _ in range(count):
+                    if self.search(value) == self.nil:
+                        break
+                    self.delete(value)
+                    removed += 1
+            return removed
+
+        kept = []
+        for node in self.__nodes():
+            if batch[node.value] > 0:
+                batch[node.value] -= 1
+            else:
+                kept.append(node)
+        removed = len(self) - len(kept)
+        self.__link_sorted(kept)
+        return removed
 
     def search(self, value: int):
         """ searching for node with val == value """
@@ -62,7 +195,8 @@ class RBTree:
     def insert(self, value: int, task: str):
         """ inserting new node into the tree """
 
-        node = RBNode(value, task)
+        node = self.node_cls(value, task)
+        self.version += 1
 
         # leaves always has to be black
         node.left = self.nil
@@ -71,8 +205,9 @@ class RBTree:
         parent = None
         cur_node = self.root
 
-        # looking for place to insert
+        # looking for place to insert, every node on the way gets one more descendant
         while cur_node != self.nil:
+            cur_node.size += 1
             parent = cur_node
             if node.value < cur_node.value:
                 cur_node = cur_node.left
@@ -90,6 +225,12 @@ class RBTree:
         else:
             parent.right = node
 
+        # equal priorities go right, so a new node never replaces the minimum on a tie but does replace the maximum
+        if self.min_node == self.nil or node.value < self.min_node.value:
+            self.min_node = node
+        if self.max_node == self.nil or node.value >= self.max_node.value:
+            self.max_node = node
+
         if node.parent is None:
             node.color = "black"
             return
@@ -103,8 +244,11 @@ class RBTree:
     def balance_insert(self, new_node: RBNode):
         """ fixing violations after inserting a node """
 
+        # iterations and colour writes, reported to count_fixup once the loop is done
+        iterations = recolorings = 0
         # red node can not have a red child
         while new_node.parent.color == "red":
+            iterations += 1
             if new_node.parent == new_node.grandparent().right:
                 u = new_node.uncle()  # parent parent left
                 if u.color == "red":
@@ -112,13 +256,15 @@ class RBTree:
                     new_node.parent.color = "black"
                     new_node.grandparent().color = "red"  # parent parent
                     new_node = new_node.grandparent()  # parent parent
+                    recolorings += 3
                 else:
                     if new_node == new_node.parent.left:
                         new_node = new_node.parent
-                        self.__rotate_right(new_node)
+                        self._rotate_right(new_node)
                     new_node.parent.color = "black"
                     new_node.grandparent().color = "red"  # parent parent
-                    self.__rotate_left(new_node.grandparent())  # parent parent
+                    self._rotate_left(new_node.grandparent())  # parent parent
+                    recolorings += 2
             else:
                 u = new_node.uncle()  # parent parent right
 
@@ -127,17 +273,20 @@ class RBTree:
                     new_node.parent.color = "black"
                     new_node.grandparent().color = "red"  # parent parent
                     new_node = new_node.grandparent()  # parent parent
+                    recolorings += 3
                 else:
                     if new_node == new_node.parent.right:
                         new_node = new_node.parent
-                        self.__rotate_left(new_node)
+                        self._rotate_left(new_node)
                     new_node.parent.color = "black"
                     new_node.grandparent().color = "red"  # parent parent
-                    self.__rotate_right(new_node.grandparent())  # parent parent
+                    self._rotate_right(new_node.grandparent())  # parent parent
+                    recolorings += 2
             if new_node == self.root:
                 break
         # root always has to be black
         self.root.color = "black"
+        self.count_fixup("insert", iterations, recolorings + 1)
 
     def delete(self, value: int):
         """Deleting node with val == value if node exists"""
@@ -149,17 +298,32 @@ class RBTree:
         if node_to_delete == self.nil:
             return
 
+        self.delete_node(node_to_delete)
+
+    def delete_node(self, node_to_delete: RBNode):
+        """ unlinks a node that is in the tree, skipping the search delete(value) would do """
+
+        self.version += 1
+
+        # neighbours keep their identity through the unlinking, so they can be taken as new extremes up front
+        if node_to_delete is self.min_node:
+            self.min_node = self.successor(node_to_delete)
+        if node_to_delete is self.max_node:
+            self.max_node = self.predecessor(node_to_delete)
+
         # save original color of node to delete
         original_color = node_to_delete.color
 
         # Case 1: node has no left child -> replace with right child
         if node_to_delete.left == self.nil:
             x = node_to_delete.right
+            x_parent = node_to_delete.parent
             self.__replace_node(node_to_delete, x)
 
         # Case 2: node has no right child -> replace with left child
         elif node_to_delete.right == self.nil:
             x = node_to_delete.left
+            x_parent = node_to_delete.parent
             self.__replace_node(node_to_delete, x)
 
         # Case 3: node has two children -> replace with successor
@@ -174,7 +338,10 @@ class RBTree:
             x = successor.right
 
             # if the successor has right child we'll lose him -> do not forget to swap successor with its right child
-            if successor.parent != node_to_delete:
+            if successor.parent == node_to_delete:
+                x_parent = successor
+            else:
+                x_parent = successor.parent
                 self.__replace_node(successor, x)
                 successor.right = node_to_delete.right
                 successor.right.parent = successor
@@ -185,17 +352,30 @@ class RBTree:
             successor.left.parent = successor
             successor.color = node_to_delete.color
 
+        # subtree sizes from the spot that lost a node up to the root
+        self.__update_sizes(x_parent)
+
         # if original node was black -> we need to balance the tree
         if original_color == "black":
-            self.__balance_delete(x)
+            self.__balance_delete(x, x_parent)
 
-    def __balance_delete(self, node: RBNode):
+    def __update_sizes(self, node: RBNode):
+        """ recomputes subtree sizes from node up to the root """
+
+        while node is not None:
+            node.size = node.left.size + node.right.size + 1
+            node = node.parent
+
+    def __balance_delete(self, node: RBNode, parent: RBNode):
         """ fixing violations after removing a node """
 
+        iterations = recolorings = 0
+        # node may be the shared nil leaf, so its parent is tracked explicitly
         while node != self.root and node.color == "black":
+            iterations += 1
             # Case 1: we are on the left side
-            if node == node.parent.left:
-                s = node.sibling()  # parent right
+            if node == parent.left:
+                s = parent.right
 
                 # by the default our node color is black then our sibling has to be black too
                 if s.color == "red":
@@ -203,13 +383,14 @@ class RBTree:
                     s.color = "black"
 
                     # our common parent has to be red then
-                    node.parent.color = "red"
+                    parent.color = "red"
 
                     # do the left rotation to make root become black
-                    self.__rotate_left(node.parent)
+                    self._rotate_left(parent)
 
                     # now our sibling has changed so look at our new sibling
-                    s = node.sibling()  # parent right
+                    s = parent.right
+                    recolorings += 2
 
                 # black children has to have red parent
                 if s.left.color == "black" and s.right.color == "black":
@@ -217,53 +398,67 @@ class RBTree:
                     s.color = "red"
 
                     # going upwards to in the root direction
-                    node = node.parent
+                    node = parent
+                    parent = node.parent
+                    recolorings += 1
 
                 else:
                     # parent is black and left children is red -> look at the right children
                     if s.right.color == "black":
                         s.left.color = "black"
                         s.color = "red"
-                        self.__rotate_right(s)
-                        s = node.sibling()  # parent right
+                        self._rotate_right(s)
+                        s = parent.right
+                        recolorings += 2
 
-                    s.color = node.parent.color
-                    node.parent.color = "black"
+                    s.color = parent.color
+                    parent.color = "black"
                     s.right.color = "black"
-                    self.__rotate_left(node.parent)
+                    self._rotate_left(parent)
 
                     # ending while loop
                     node = self.root
+                    recolorings += 3
             else:
-                s = node.sibling()  # parent left
+                s = parent.left
                 if s.color == "red":
                     s.color = "black"
-                    node.parent.color = "red"
-                    self.__rotate_right(node.parent)
-                    s = node.sibling()  # parent left
+                    parent.color = "red"
+                    self._rotate_right(parent)
+                    s = parent.left
+                    recolorings += 2
 
                 # red node has to have black children
-                if s.right.color == "black" and s.right.color == "black":
+                if s.left.color == "black" and s.right.color == "black":
                     s.color = "red"
-                    node = node.parent
+                    node = parent
+                    parent = node.parent
+                    recolorings += 1
                 else:
                     if s.left.color == "black":
                         s.right.color = "black"
                         s.color = "red"
-                        self.__rotate_left(s)
-                        s = node.sibling()  # parent left
+                        self._rotate_left(s)
+                        s = parent.left
+                        recolorings += 2
 
-                    s.color = node.parent.color
-                    node.parent.color = "black"
+                    s.color = parent.color
+                    parent.color = "black"
                     s.left.color = "black"
-                    self.__rotate_right(node.parent)
+                    self._rotate_right(parent)
                     # ending while loop
                     node = self.root
+                    recolorings += 3
         # root always has to be black
         node.color = "black"
+        self.count_fixup("delete", iterations, recolorings + 1)
+
+    def count_fixup(self, op: str, iterations: int, recolorings: int):
+        """ called after every fix-up loop of op ("insert" or "delete") with its iterations and colour writes,
+        a no-op here; InstrumentedRBTree records them """
 
-    def __rotate_right(self, node: RBNode):
-        """ right rotation around node """
+    def _rotate_right(self, node: RBNode):
+        """ right rotation around node, protected so subclasses can count rotations """
 
         left_child = node.left
         node.left = left_child.right
@@ -283,8 +478,11 @@ class RBTree:
         left_child.right = node
         node.parent = left_child
 
-    def __rotate_left(self, node: RBNode):
-        """ left rotation around node """
+        left_child.size = node.size
+        node.size = node.left.size + node.right.size + 1
+
+    def _rotate_left(self, node: RBNode):
+        """ left rotation around node, protected so subclasses can count rotations """
 
         right_child = node.right
         node.right = right_child.left
@@ -304,6 +502,9 @@ class RBTree:
         right_child.left = node
         node.parent = right_child
 
+        right_child.size = node.size
+        node.size = node.left.size + node.right.size + 1
+
     def __replace_node(self, old_node: RBNode, new_node: RBNode):
         """ forgetting about old_node and placing new_node instead """
         if old_node.parent is None:
@@ -320,29 +521,136 @@ class RBTree:
             node = node.left
         return node
 
-    def __pre_order(self, node: RBNode):
-        if not node:
-            return
-        yield node
-        yield from self.__pre_order(node.left)
-        yield from self.__pre_order(node.right)
+    def __find_max(self, node: RBNode) -> RBNode:
+        """ finds maximum val node in a tree """
+        while node.right != self.nil:
+            node = node.right
+        return node
 
-    def __in_order(self, node: RBNode):
-        if not node or node == self.nil:
-            return
-        yield from self.__in_order(node.left)
-        yield node
-        yield from self.__in_order(node.right)
+    def in_order(self):
+        """ nodes in priority order, threads through parent pointers so it needs neither recursion nor a stack """
 
-    def __post_order(self, node: RBNode):
-        if not node:
+        nil = self.nil
+        node = self.root
+        if node is nil:
             return
-        yield from self.__post_order(node.left)
-        yield from self.__post_order(node.right)
-        yield node
+        while node.left is not nil:
+            node = node.left
+        while node is not None:
+            yield node
+            if node.right is not nil:
+                node = node.right
+                while node.left is not nil:
+                    node = node.left
+            else:
+                child = node
+                node = node.parent
+                while node is not None and child is node.right:
+                    child = node
+                    node = node.parent
+
+    def minimum(self) -> RBNode:
+        """ node with the lowest priority, nil for an empty tree """
+        return self.min_node
+
+    def maximum(self) -> RBNode:
+        """ node with the highest priority, nil for an empty tree """
+        return self.max_node
+
+    def peek_min(self) -> RBNode:
+        return self.min_node
+
+    def peek_max(self) -> RBNode:
+        return self.max_node
+
+    def pop_min(self) -> RBNode:
+        """ removes and returns the lowest priority node, nil if the tree is empty """
+
+        node = self.min_node
+        if node != self.nil:
+            self.delete_node(node)
+        return node
+
+    def pop_max(self) -> RBNode:
+        """ removes and returns the highest priority node, nil if the tree is empty """
+
+        node = self.max_node
+        if node != self.nil:
+            self.delete_node(node)
+        return node
+
+    def successor(self, node: RBNode) -> RBNode:
+        """ next node in priority order or nil, walks parent pointers so no recursion is involved """
+
+        if node.right != self.nil:
+            return self.__find_min(node.right)
+        parent = node.parent
+        while parent is not None and node == parent.right:
+            node = parent
+            parent = parent.parent
+        return parent if parent is not None else self.nil
+
+    def predecessor(self, node: RBNode) -> RBNode:
+        """ previous node in priority order or nil """
+
+        if node.left != self.nil:
+            return self.__find_max(node.left)
+        parent = node.parent
+        while parent is not None and node == parent.left:
+            node = parent
+            parent = parent.parent
+        return parent if parent is not None else self.nil
+
+    def range(self, lo: int, hi: int):
+        """ yields nodes with lo <= priority <= hi in ascending order, O(log n + k) """
+
+        node = self.ceiling(lo)
+        while node != self.nil and node.value <= hi:
+            yield node
+            node = self.successor(node)
+
+    def cursor(self, value=None, reverse=False):
+        """ cursor starting at ceiling(value), or floor(value) when reverse, or at the first node if value is None """
+
+        if value is None:
+            node = self.maximum() if reverse else self.minimum()
+        else:
+            node = self.floor(value) if reverse else self.ceiling(value)
+        return RBCursor(self, node, reverse)
+
+
+class RBCursor:
+    """ lazy ordered cursor over RBTree, can change direction and be resumed later
+
+    node is the one the next step returns, nil once the cursor ran off the end.
+    A cursor whose pending node got deleted has to be recreated with tree.cursor(last value).
+    """
+
+    def __init__(self, tree: RBTree, node: RBNode, reverse=False):
+        self.tree = tree
+        self.node = node
+        self.reverse = reverse
 
     def __iter__(self):
-        return self.__in_order(self.root)
+        return self
+
+    def __next__(self) -> RBNode:
+        node = self.node
+        if node == self.tree.nil:
+            raise StopIteration
+        self.node = self.tree.predecessor(node) if self.reverse else self.tree.successor(node)
+        return node
 
-    def __len__(self):
-        return sum(1 for _ in self.__in_order(self.root))
+    def __reversed__(self):
+        """ same position, other direction """
+        return RBCursor(self.tree, self.node, not self.reverse)
+
+    def take(self, n: int) -> list:
+        """ up to n next nodes, the cursor stays positioned right after them """
+
+        nodes = []
+        for node in self:
+            nodes.append(node)
+            if len(nodes) == n:
+                break
+        return nodes
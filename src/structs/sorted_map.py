@@ -0,0 +1,228 @@
+from abc import ABC, abstractmethod
+
+
+class SortedMap(ABC):
+    """ priority -> task map kept as a search tree, the interface TaskStore, TaskService, TaskServer and
+    DisplayTree program against
+
+    A backend has
+        nil         sentinel leaf and the result of every failed lookup, its size is 0
+        root        nil while the map is empty
+        version     bumped by every change, views compare it to skip work
+    and its nodes have value, task (writable), left, right, size (nodes in the subtree) and color. Backends that
+    are not binary trees set drawable to False; their root is their own business and the handles they return
+    only promise value and task.
+
+    Inserting a priority that is already there is up to the backend, callers check with search first.
+    The queries below only follow child links and subtree sizes; backends with parent pointers or cached extremes
+    override the ones they can answer faster.
+    """
+
+    nil = None
+    # nodes form a binary tree tree_layout can place, backends without one are only shown by count
+    drawable = True
+    # insert queues another task under an existing priority instead of colliding with it, see TaskMultiMap
+    multimap = False
+    # changes leave the nodes of earlier versions alone, see PersistentRBTree
+    persistent = False
+    # tasks must be strings, the nodes cannot hold anything else such as TaskMultiMap's buckets, see ArenaRBTree
+    text_tasks = False
+
+    @classmethod
+    @abstractmethod
+    def from_sorted(cls, items):
+        """ builds a map from (priority, task) pairs sorted by priority in O(n) """
+
+    @abstractmethod
+    def search(self, value: int):
+        """ node with priority == value, nil if there is none """
+
+    @abstractmethod
+    def insert(self, value: int, task: str):
+        pass
+
+    @abstractmethod
+    def delete(self, value: int):
+        """ removes the node with priority == value if there is one """
+
+    def replace(self, value: int, task: str) -> bool:
+        """ changes the task of an existing priority, False if there is none """
+
+        node = self.search(value)
+        if node == self.nil:
+            return False
+        node.task = task
+        # the tree cannot see changes made to a node's task
+        self.version += 1
+        return True
+
+    def in_order(self):
+        """ nodes in ascending priority order, with an explicit stack instead of recursion """
+
+        stack = []
+        node = self.root
+        while stack or node != self.nil:
+            while node != self.nil:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    def pre_order(self):
+        """ node, left subtree, right subtree, driven by an explicit stack """
+
+        nil = self.nil
+        stack = [self.root] if self.root != nil else []
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.right != nil:
+                stack.append(node.right)
+            if node.left != nil:
+                stack.append(node.left)
+
+    def post_order(self):
+        """ left subtree, right subtree, node, driven by an explicit stack """
+
+        nil = self.nil
+        stack = [self.root] if self.root != nil else []
+        last = None
+        while stack:
+            node = stack[-1]
+            # descending while the children of node are not visited yet
+            if last is None or last.left == node or last.right == node:
+                if node.left != nil:
+                    stack.append(node.left)
+                elif node.right != nil:
+                    stack.append(node.right)
+                else:
+                    yield stack.pop()
+            # coming back from the left subtree
+            elif node.left == last and node.right != nil:
+                stack.append(node.right)
+            else:
+                yield stack.pop()
+            last = node
+
+    def __iter__(self):
+        return self.in_order()
+
+    def __len__(self):
+        return self.root.size
+
+    def __contains__(self, value: int) -> bool:
+        return self.search(value) != self.nil
+
+    def minimum(self):
+        """ node with the lowest priority, nil for an empty map """
+
+        node = self.root
+        while node != self.nil and node.left != self.nil:
+            node = node.left
+        return node
+
+    def maximum(self):
+        """ node with the highest priority, nil for an empty map """
+
+        node = self.root
+        while node != self.nil and node.right != self.nil:
+            node = node.right
+        return node
+
+    def peek_min(self):
+        return self.minimum()
+
+    def peek_max(self):
+        return self.maximum()
+
+    def pop_min(self):
+        """ removes and returns the lowest priority node, nil if the map is empty """
+
+        node = self.minimum()
+        if node != self.nil:
+            self.delete(node.value)
+        return node
+
+    def pop_max(self):
+        """ removes and returns the highest priority node, nil if the map is empty """
+
+        node = self.maximum()
+        if node != self.nil:
+            self.delete(node.value)
+        return node
+
+    def select(self, k: int):
+        """ returns node with k-th highest priority (k = 0 is the highest), nil if out of range """
+
+        node = self.root
+        while node != self.nil:
+            higher = node.right.size
+            if k < higher:
+                node = node.right
+            elif k == higher:
+                return node
+            else:
+                k -= higher + 1
+                node = node.left
+        return self.nil
+
+    def rank(self, value: int) -> int:
+        """ returns number of tasks with priority higher than value, so select(rank(value)) finds value """
+
+        count = 0
+        node = self.root
+        while node != self.nil:
+            if value < node.value:
+                count += node.right.size + 1
+                node = node.left
+            else:
+                node = node.right
+        return count
+
+    def floor(self, value: int):
+        """ node with the highest priority <= value or nil """
+
+        result = self.nil
+        node = self.root
+        while node != self.nil:
+            if node.value <= value:
+                result = node
+                node = node.right
+            else:
+                node = node.left
+        return result
+
+    def ceiling(self, value: int):
+        """ node with the lowest priority >= value or nil """
+
+        result = self.nil
+        node = self.root
+        while node != self.nil:
+            if node.value >= value:
+                result = node
+                node = node.left
+            else:
+                node = node.right
+        return result
+
+    def range(self, lo: int, hi: int):
+        """ yields nodes with lo <= priority <= hi in ascending order, O(log n + k) """
+
+        stack = []
+        node = self.root
+        while stack or node != self.nil:
+            while node != self.nil:
+                if node.value < lo:
+                    # the whole left subtree is below the range
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if node.value > hi:
+                return
+            yield node
+            node = node.right
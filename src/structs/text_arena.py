@@ -0,0 +1,132 @@
+""" dictionary encoded task descriptions: every distinct description is stored once in a TextArena and nodes of
+an ArenaRBTree hold its small integer id instead of their own string
+
+Templated descriptions ("call customer 17", "call customer 18", ... repeated all over the tree) then cost one
+string per distinct text plus a shared int per node. Entries are reference counted: the last node to let go of
+a description frees its slot, which the next new description reuses.
+"""
+
+from array import array
+
+from structs.rbt import RBNode, RBTree
+
+# the task slot of RBNode, holding an arena id while the node is in a tree and the plain string once it left it
+_TASK = RBNode.task
+
+
+class TextArena:
+    """ id -> description with a reference count per id """
+
+    def __init__(self):
+        # None marks a free id
+        self.texts = []
+        # the key is the very string in texts, so each description exists once
+        self.ids = {}
+        self.refcounts = array("Q")
+        self.free = []
+
+    def acquire(self, text: str) -> int:
+        """ id of text with one more reference, storing text if it is new """
+
+        ref = self.ids.get(text)
+        if ref is None:
+            if self.free:
+                ref = self.free.pop()
+                self.texts[ref] = text
+            else:
+                ref = len(self.texts)
+                self.texts.append(text)
+                self.refcounts.append(0)
+            self.ids[text] = ref
+        self.refcounts[ref] += 1
+        return ref
+
+    def release(self, ref: int):
+        """ drops one reference, the description is freed with its last one """
+
+        self.refcounts[ref] -= 1
+        if self.refcounts[ref] == 0:
+            del self.ids[self.texts[ref]]
+            self.texts[ref] = None
+            self.free.append(ref)
+
+    def text(self, ref: int) -> str:
+        return self.texts[ref]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class ArenaNode(RBNode):
+    """ RBNode whose task reads and writes go through the arena of its tree, see ArenaRBTree """
+
+    __slots__ = ()
+    arena = None
+
+    def __init__(self, value: int, task: str, color="red"):
+        # RBNode.__init__ would assign task through the property below
+        self.value = value
+        _TASK.__set__(self, self.arena.acquire(task))
+        self.color = color
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.size = 1
+
+    @property
+    def task(self) -> str:
+        ref = _TASK.__get__(self)
+        return ref if ref.__class__ is str else self.arena.text(ref)
+
+    @task.setter
+    def task(self, task: str):
+        ref = _TASK.__get__(self)
+        if ref.__class__ is str:
+            # detached from the tree, it keeps a string of its own
+            _TASK.__set__(self, task)
+            return
+        _TASK.__set__(self, self.arena.acquire(task))
+        self.arena.release(ref)
+
+    def detach(self):
+        """ swaps the arena id for the string itself and releases the id, for nodes that leave the tree """
+
+        ref = _TASK.__get__(self)
+        if ref.__class__ is not str:
+            _TASK.__set__(self, self.arena.text(ref))
+            self.arena.release(ref)
+
+
+class ArenaRBTree(RBTree):
+    """ RBTree keeping its descriptions in a TextArena
+
+    Nodes still show a plain task string, so str(node), lookups, snapshots and in-place task changes work as
+    before. A node that leaves the tree through delete, a pop or delete_many gets its description back as a
+    string of its own, so popped nodes stay readable however the arena is reused.
+    """
+
+    # every task goes into the arena's dictionary
+    text_tasks = True
+
+    def __init__(self, arena: TextArena = None):
+        super(ArenaRBTree, self).__init__()
+        self.arena = arena if arena is not None else TextArena()
+        self.node_cls = type("ArenaNode", (ArenaNode,), {"__slots__": (), "arena": self.arena})
+
+    def delete_node(self, node_to_delete: RBNode):
+        super(ArenaRBTree, self).delete_node(node_to_delete)
+        node_to_delete.detach()
+
+    def delete_many(self, values) -> int:
+        values = list(values)
+        if not self._worth_rebuild(len(values)):
+            # one delete_node per value
+            return super(ArenaRBTree, self).delete_many(values)
+        # the rebuilding path relinks the kept nodes without going through delete_node
+        nodes = list(self.in_order())
+        removed = super(ArenaRBTree, self).delete_many(values)
+        kept = set(map(id, self.in_order()))
+        for node in nodes:
+            if id(node) not in kept:
+                node.detach()
+        return removed
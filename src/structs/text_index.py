@@ -0,0 +1,154 @@
+""" secondary index from task descriptions to priorities: exact, prefix and token lookups without scanning the tree
+
+Matching ignores case. A token is a run of letters, digits or underscores, so "Write report #12" has the tokens
+write, report and 12.
+"""
+
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+TOKEN = re.compile(r"\w+")
+# strings per block of SortedStrings, blocks split at twice this
+BLOCK_SIZE = 512
+
+
+def normalize(text: str) -> str:
+    return text.casefold()
+
+
+def tokenize(text: str) -> set:
+    return set(TOKEN.findall(normalize(text)))
+
+
+class SortedStrings:
+    """ sorted list kept as a list of blocks, so an insert moves at most one block instead of the whole list """
+
+    def __init__(self, strings=()):
+        strings = sorted(strings)
+        self.blocks = [strings[i:i + BLOCK_SIZE] for i in range(0, len(strings), BLOCK_SIZE)]
+        self.maxes = [block[-1] for block in self.blocks]
+
+    def add(self, string: str):
+        if not self.blocks:
+            self.blocks.append([string])
+            self.maxes.append(string)
+            return
+        index = min(bisect_left(self.maxes, string), len(self.blocks) - 1)
+        block = self.blocks[index]
+        insort(block, string)
+        self.maxes[index] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            self.blocks[index:index + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self.maxes[index:index + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+
+    def remove(self, string: str):
+        index = bisect_left(self.maxes, string)
+        block = self.blocks[index]
+        del block[bisect_left(block, string)]
+        if block:
+            self.maxes[index] = block[-1]
+        else:
+            del self.blocks[index], self.maxes[index]
+
+    def starting_at(self, string: str):
+        """ yields every string >= string in order """
+
+        index = bisect_left(self.maxes, string)
+        if index == len(self.blocks):
+            return
+        block = self.blocks[index]
+        yield from block[bisect_left(block, string):]
+        for block in self.blocks[index + 1:]:
+            yield from block
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+
+class TextIndex:
+    """ every description with the priorities it is stored under, kept in sync by TaskStore
+
+    exact maps a description to a Counter of its priorities; a priority is counted as often as it holds that
+    description, which only happens in multimap stores. tokens maps a token to the descriptions containing it, so
+    a query's tokens have to appear in one and the same task. Lookups return priorities in ascending order.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.tokens = {}
+        self.descriptions = SortedStrings()
+
+    @classmethod
+    def from_items(cls, items):
+        """ indexes (priority, task) pairs in one pass and sorts the descriptions once """
+
+        index = cls()
+        for priority, task in items:
+            index.__count(priority, task)
+        index.descriptions = SortedStrings(index.exact)
+        return index
+
+    def __count(self, priority: int, task: str) -> bool:
+        """ adds to the exact and token maps, True if the description was not indexed before """
+
+        text = normalize(task)
+        priorities = self.exact.get(text)
+        is_new = priorities is None
+        if is_new:
+            priorities = self.exact[text] = Counter()
+            for token in tokenize(text):
+                self.tokens.setdefault(token, set()).add(text)
+        priorities[priority] += 1
+        return is_new
+
+    def add(self, priority: int, task: str):
+        if self.__count(priority, task):
+            self.descriptions.add(normalize(task))
+
+    def remove(self, priority: int, task: str):
+        text = normalize(task)
+        priorities = self.exact.get(text)
+        if priorities is None or not priorities[priority]:
+            return
+        priorities[priority] -= 1
+        if priorities[priority] > 0:
+            return
+        del priorities[priority]
+        if priorities:
+            return
+        del self.exact[text]
+        self.descriptions.remove(text)
+        for token in tokenize(text):
+            holders = self.tokens[token]
+            holders.discard(text)
+            if not holders:
+                del self.tokens[token]
+
+    def find_exact(self, text: str) -> list:
+        """ priorities whose description equals text """
+
+        return sorted(self.exact.get(normalize(text), ()))
+
+    def find_prefix(self, prefix: str, limit: int = None) -> list:
+        """ priorities whose description starts with prefix, at most limit descriptions are collected """
+
+        prefix = normalize(prefix)
+        found = set()
+        for count, text in enumerate(self.descriptions.starting_at(prefix)):
+            if not text.startswith(prefix) or (limit is not None and count >= limit):
+                break
+            found.update(self.exact[text])
+        return sorted(found)
+
+    def find_tokens(self, query: str) -> list:
+        """ priorities of tasks whose description contains every token of query, in any order """
+
+        holders = sorted((self.tokens.get(token, set()) for token in tokenize(query)), key=len)
+        if not holders:
+            return []
+        texts = holders[0].intersection(*holders[1:])
+        return sorted({priority for text in texts for priority in self.exact[text]})
+
+    def __len__(self):
+        return len(self.exact)
@@ -0,0 +1,120 @@
+""" hierarchical timer wheel: deadlines for any hashable keys, expired in O(expired) instead of a scan
+
+Time is cut into ticks of resolution seconds. Level 0 has one slot per tick for the next 2**slot_bits ticks, each
+level above covers 2**slot_bits times the span of the one below, and a timer sits in the lowest level its
+deadline fits in. Whenever level 0 wraps around, the next slot of level 1 is moved down (cascaded), and so on up.
+A timer is moved at most once per level, so scheduling, cancelling and expiring are O(1) amortised whatever the
+number of pending timers. Deadlines beyond the top level wait in it and are cascaded again until they fit.
+"""
+
+import time
+
+
+class TimerWheel:
+    """ keys with deadlines on clock's time scale; advance expires every key whose deadline has passed
+
+    clock is injectable, tests pass a function returning a fake time. A key has at most one deadline, scheduling
+    it again moves it. A deadline is rounded up to the tick boundary at or after it, so a key never expires before
+    its deadline and at most one resolution after it. Expired keys come out tick by tick, in scheduling order
+    within a tick, and are passed to on_expire as well when it is given.
+    """
+
+    def __init__(self, resolution: float = 1., slot_bits: int = 6, levels: int = 4, clock=time.monotonic,
+                 on_expire=None):
+        self.resolution = resolution
+        self.slot_bits = slot_bits
+        self.mask = (1 << slot_bits) - 1
+        self.clock = clock
+        self.on_expire = on_expire
+        # last tick that has been expired
+        self.tick = self.__tick_of(clock())
+        # slot dicts map key -> deadline, so cancelling is a dict delete
+        self.wheels = [[{} for _ in range(1 << slot_bits)] for _ in range(levels)]
+        # key -> (deadline, slot dict it is in)
+        self.timers = {}
+
+    def __tick_of(self, moment: float) -> int:
+        return int(moment // self.resolution)
+
+    def __place(self, key, deadline: float, earliest: int):
+        """ files key under the lowest level whose span reaches its deadline tick, but not before earliest """
+
+        # rounded up: the tick whose start is the first one at or after the deadline
+        tick = max(int(-(-deadline // self.resolution)), earliest)
+        level = min(((tick - self.tick).bit_length() - 1) // self.slot_bits, len(self.wheels) - 1)
+        if level <= 0:
+            slot = self.wheels[0][tick & self.mask]
+        else:
+            slot = self.wheels[level][(tick >> (self.slot_bits * level)) & self.mask]
+        slot[key] = deadline
+        self.timers[key] = (deadline, slot)
+
+    def schedule(self, key, deadline: float):
+        """ key expires with the first tick boundary at or after deadline; a deadline already passed expires with the
+        next tick boundary, once an advance reaches it """
+
+        if key in self.timers:
+            self.cancel(key)
+        # the slot of the current tick has been expired already
+        self.__place(key, deadline, self.tick + 1)
+
+    def schedule_in(self, key, ttl: float):
+        self.schedule(key, self.clock() + ttl)
+
+    def cancel(self, key) -> bool:
+        """ False if key had no deadline """
+
+        timer = self.timers.pop(key, None)
+        if timer is None:
+            return False
+        del timer[1][key]
+        return True
+
+    def deadline(self, key):
+        """ deadline of key, None if it has none """
+
+        timer = self.timers.get(key)
+        return None if timer is None else timer[0]
+
+    def advance(self, now: float = None) -> list:
+        """ expires every key whose deadline, rounded up to a tick boundary, is at or before now (the clock's time by
+        default), returns them """
+
+        target = self.__tick_of(self.clock() if now is None else now)
+        expired = []
+        while self.tick < target:
+            if not self.timers:
+                # nothing to cascade or expire on the way
+                self.tick = target
+                break
+            self.tick += 1
+            self.__cascade(1)
+            slot = self.wheels[0][self.tick & self.mask]
+            if slot:
+                expired.extend(slot)
+                for key in slot:
+                    del self.timers[key]
+                slot.clear()
+        if self.on_expire is not None:
+            for key in expired:
+                self.on_expire(key)
+        return expired
+
+    def __cascade(self, level: int):
+        """ moves the slot of level that the current tick has reached one level down, after the levels above it """
+
+        shift = self.slot_bits * level
+        if level == len(self.wheels) or self.tick & ((1 << shift) - 1):
+            return
+        self.__cascade(level + 1)
+        wheel = self.wheels[level]
+        index = (self.tick >> shift) & self.mask
+        slot, wheel[index] = wheel[index], {}
+        for key, deadline in slot.items():
+            self.__place(key, deadline, self.tick)
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key) -> bool:
+        return key in self.timers
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import json
+
+
+class TaskClient:
+    """ asyncio client for task_server, any number of calls can be in flight on one connection """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.ids = itertools.count()
+        self.waiting = {}
+        self.receiver = None
+        # why calls fail once the receiver stopped, None while it runs
+        self.closed = None
+
+    async def connect(self, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        if path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.receiver = asyncio.create_task(self.__receive())
+        return self
+
+    async def __receive(self):
+        closed = ConnectionError("server closed the connection")
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.waiting.pop(response["id"], None)
+                if future is None or future.done():
+                    # the server answers lines it could not parse with no id, and callers may have given up on a call
+                    continue
+                if response["ok"]:
+                    future.set_result(response["result"])
+                else:
+                    future.set_exception(RuntimeError(response["error"]))
+        except asyncio.CancelledError:
+            closed = ConnectionError("client closed the connection")
+            raise
+        except Exception as error:
+            closed = ConnectionError(f"reading responses failed: {type(error).__name__}: {error}")
+        finally:
+            # nothing answers calls any more, neither the ones in flight nor later ones
+            self.closed = closed
+            waiting, self.waiting = self.waiting, {}
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(closed)
+
+    def send(self, op: str, **args) -> asyncio.Future:
+        """ queues one request and returns the future of its result without flushing the socket """
+
+        future = asyncio.get_running_loop().create_future()
+        if self.closed is not None:
+            future.set_exception(self.closed)
+            return future
+        request_id = next(self.ids)
+        self.waiting[request_id] = future
+        self.writer.write(json.dumps({"id": request_id, "op": op, **args}).encode() + b"\n")
+        return future
+
+    async def call(self, op: str, **args):
+        future = self.send(op, **args)
+        await self.writer.drain()
+        return await future
+
+    async def call_many(self, requests) -> list:
+        """ pipelines (op, args) pairs in one write and gathers their results in order """
+
+        futures = [self.send(op, **args) for op, args in requests]
+        await self.writer.drain()
+        return list(await asyncio.gather(*futures))
+
+    async def insert(self, priority: int, task: str) -> str:
+        return await self.call("insert", priority=priority, task=task)
+
+    async def delete(self, priority: int) -> bool:
+        return await self.call("delete", priority=priority)
+
+    async def find(self, priority: int):
+        return await self.call("find", priority=priority)
+
+    async def pop(self):
+        return await self.call("pop")
+
+    async def range(self, lo: int, hi: int, limit: int = None) -> list:
+        return await self.call("range", lo=lo, hi=hi, limit=limit)
+
+    async def wait(self, timeout: float = None):
+        """ pops the highest priority task, waiting for one on the server; a caller giving up on it, through
+        cancellation or asyncio.wait_for, cancels the wait there so its task stays queued """
+
+        future = self.send("wait", timeout=timeout)
+        await self.writer.drain()
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.done():
+                self.cancel_wait()
+            raise
+
+    def cancel_wait(self):
+        """ ends the wait this connection has pending on the server, which then answers it with None """
+
+        if self.closed is None and not self.writer.is_closing():
+            self.send("cancel")
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
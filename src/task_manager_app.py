@@ -1,19 +1,41 @@
 import PIL.Image
+import argparse
 import ctypes
-from structs.rbt import RBTree
+import functools
+import math
+import queue
+import sys
+import threading
+from storage.task_store import TaskStore
+from structs.concurrent_rbt import RWLock
+from task_service import ADDED, BACKENDS, TaskService, search_mode
 import customtkinter as ctk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import networkx as nx
+from tree_layout import expanded_viewport, layout_bounds, layout_changes, layout_tree, summary_at
 
 SCALE = 2.
+DATA_DIR = "../data"
+SYNC_INTERVAL_MS = 1000
+EXPIRE_INTERVAL_MS = 1000
+NODE_SIZE = 1000
+MAX_LABELS = 300
+# levels shown before zooming in, deeper subtrees are summarised
+FULL_VIEW_DEPTH = 8
+ZOOM_STEP = 1.25
+RENDER_POLL_MS = 30
+FIGURE_SIZE = 5
 
 ctk.set_appearance_mode("light")
 ctk.set_widget_scaling(SCALE)
 ctk.set_window_scaling(SCALE)
 
 myappid = "mycompany.myproduct.subproduct.version"
-ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+
+
+@functools.lru_cache(maxsize=None)
+def load_icon(name: str) -> ctk.CTkImage:
+    """ decodes ../icons/<name>.png once, every later button showing it shares the same image """
+
+    return ctk.CTkImage(PIL.Image.open(f"../icons/{name}.png").convert("RGBA"))
 
 
 class Button(ctk.CTkButton):
@@ -28,8 +50,7 @@ class Button(ctk.CTkButton):
 class AddButton(Button):
     def __init__(self, master):
         super(AddButton, self).__init__(master=master, text="")
-        self.img = PIL.Image.open("../icons/plus.png").convert("RGBA")
-        self.ico = ctk.CTkImage(self.img)
+        self.ico = load_icon("plus")
         self.configure(command=self.add_task_action, image=self.ico, width=10, height=10)
         self.parent = master
 
@@ -47,21 +68,18 @@ class AddButton(Button):
         self.parent.priority_entry.delete(0, ctk.END)
         self.parent.description_entry.delete(0, ctk.END)
 
-        collision_check = self.parent.parent.parent.data.search(int(priority))
+        result = self.parent.parent.parent.service.add(int(priority), description)
 
-        if collision_check == RBTree.nil:
-            self.parent.parent.parent.data.insert(int(priority), description)
+        if result == ADDED:
             self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.add_success)
         else:
-            collision_check.task = description
             self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.change_success)
 
 
 class DeleteButton(Button):
     def __init__(self, master):
         super(DeleteButton, self).__init__(master=master, text="")
-        self.img = PIL.Image.open("../icons/minus.png").convert("RGBA")
-        self.ico = ctk.CTkImage(self.img)
+        self.ico = load_icon("minus")
         self.configure(command=self.delete_task_action, image=self.ico, width=10, height=10)
         self.parent = master
 
@@ -74,44 +92,70 @@ class DeleteButton(Button):
         if not priority:
             return
 
-        res = self.parent.parent.parent.data.search(int(priority))
-
-        if res == RBTree.nil:
+        if not self.parent.parent.parent.service.delete(int(priority)):
             self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.error_output)
             return
 
-        self.parent.parent.parent.data.delete(int(priority))
         self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.delete_success)
 
 
 class FindButton(Button):
     def __init__(self, master):
         super(FindButton, self).__init__(master=master, text="")
-        self.img = PIL.Image.open("../icons/find.png").convert("RGBA")
-        self.ico = ctk.CTkImage(self.img)
+        self.ico = load_icon("find")
         self.configure(command=self.find_task_action, image=self.ico, width=10, height=10)
         self.parent = master
+        # priorities found for the last (text, tree version) query and the one shown, so pressing again shows the
+        # next match; a change of the tree since then makes the query run again
+        self.query = (None, None)
+        self.matches = []
+        self.shown = None
 
     def find_task_action(self):
         priority = self.parent.priority_entry.get()
+        text = self.parent.description_entry.get()
 
+        if text and (not priority or (text == self.query[0] and priority == str(self.shown))):
+            self.find_text(text)
+            return
         if not priority:
             return
 
         self.parent.description_entry.delete(0, ctk.END)
 
-        res = self.parent.parent.parent.data.search(int(priority))
-        if res != RBTree.nil:
-            self.parent.description_entry.insert(0, res)
+        task = self.parent.parent.parent.service.find(int(priority))
+        if task is not None:
+            self.parent.description_entry.insert(0, task)
         else:
             self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.error_output)
 
+    def find_text(self, text: str):
+        """ shows the priority of the next task matching text, highest first; see search_mode for "exact" and
+        prefix* queries """
+
+        service = self.parent.parent.parent.service
+        query = (text, service.tree.version)
+        if query != self.query:
+            if text != self.query[0]:
+                self.shown = None
+            self.query = query
+            mode, words = search_mode(text)
+            self.matches = service.find_text(words, mode)[::-1]
+        self.parent.priority_entry.delete(0, ctk.END)
+        if not self.matches:
+            self.query = (None, None)
+            self.parent.description_entry.delete(0, ctk.END)
+            self.parent.description_entry.configure(placeholder_text=self.parent.description_entry.error_output)
+            return
+        following = self.matches.index(self.shown) + 1 if self.shown in self.matches else 0
+        self.shown = self.matches[following % len(self.matches)]
+        self.parent.priority_entry.insert(0, str(self.shown))
+
 
 class UpdateButton(Button):
     def __init__(self, master):
         super(UpdateButton, self).__init__(master=master, text="")
-        self.img = PIL.Image.open("../icons/update.png").convert("RGBA")
-        self.ico = ctk.CTkImage(self.img)
+        self.ico = load_icon("update")
         self.configure(command=self.update_button_action, image=self.ico, width=10, height=10)
         self.parent = master
 
@@ -174,48 +218,267 @@ class ToolBar(ctk.CTkFrame):
 
 
 class DisplayTree(ctk.CTkFrame):
+    """ tree view that keeps its matplotlib artists between updates and only patches what changed
+
+    Only the part of the tree inside the viewport is laid out; subtrees that are too small to see or lie below it
+    are drawn as summary squares. Scroll zooms, dragging pans, double-clicking a summary opens it and right click
+    goes back to the whole tree.
+    """
+
     def __init__(self, master):
-        super(DisplayTree, self).__init__(master)
-        self.fig, self.ax = plt.subplots(figsize=(5, 5))
+        # sized like the figure so the window does not jump when the canvas appears
+        super(DisplayTree, self).__init__(master, width=FIGURE_SIZE * 100 / SCALE, height=FIGURE_SIZE * 100 / SCALE)
 
+        self.parent = master
+        self.fig = self.ax = self.canvas = None
+        self.labelled = {}
+        self.summaries = []
+        self.summary_texts = []
+        self.viewport = None
+        self.limits = None
+        self.rendered_state = None
+        self.pending_state = None
+        self.render_cancel = None
+        self.results = queue.Queue()
+        self.background = None
+        self.pan_start = None
+
+        # spins while a layout is being computed
+        self.progress = ctk.CTkProgressBar(self, mode="indeterminate", height=4, corner_radius=0)
+        self.progress.set(0)
+        self.progress.pack(fill="x", side="bottom")
+
+    def create_canvas(self):
+        """ matplotlib is the slowest import of the app, it is loaded when the tree is drawn for the first time """
+
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+
+        # a bare Figure, pyplot would also import and register its own window managers
+        self.fig = Figure(figsize=(FIGURE_SIZE, FIGURE_SIZE))
+        self.ax = self.fig.add_subplot()
         self.ax.axis("off")
 
-        self.parent = master
-        self.graph = nx.Graph()
-        self.coords = {}
-        self.labels = {}
+        # all nodes, all summaries and all edges are one artist each; animated artists are left out of full
+        # redraws and blitted on top of the saved background
+        self.edges = LineCollection([], colors="gray", zorder=1, animated=True)
+        self.ax.add_collection(self.edges)
+        self.nodes = self.ax.scatter([], [], s=NODE_SIZE, zorder=2, animated=True)
+        self.summary_marks = self.ax.scatter([], [], s=NODE_SIZE, marker="s", color="lightgray", zorder=2,
+                                             animated=True)
+        self.texts = {}
 
         self.canvas = FigureCanvasTkAgg(self.fig, master=self)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.mpl_connect("scroll_event", self.on_scroll)
+        self.canvas.mpl_connect("button_press_event", self.on_press)
+        self.canvas.mpl_connect("motion_notify_event", self.on_motion)
+        self.canvas.mpl_connect("button_release_event", self.on_release)
         self.canvas.draw()
 
         self.canvas.get_tk_widget().pack(fill=ctk.BOTH, expand=True)
 
-    def RBT_to_graph(self, node, pos_x, pos_y, level=0, x_offset=2):
-        if node == RBTree.nil:
-            return
-        self.graph.add_node(node.value, color=node.color)
-        self.coords[node.value] = (pos_x, pos_y)
-        self.labels[node.value] = node.task
+    @property
+    def tree(self):
+        return self.parent.parent.data
+
+    def on_draw(self, event):
+        """ a full redraw leaves the static background, which later updates are blitted onto """
 
-        if node.left != RBTree.nil:
-            self.graph.add_edge(node.value, node.left.value)
-            self.RBT_to_graph(node.left, pos_x - x_offset, pos_y - 1, level + 1, x_offset / 2)
-        if node.right != RBTree.nil:
-            self.graph.add_edge(node.value, node.right.value)
-            self.RBT_to_graph(node.right, pos_x + x_offset, pos_y - 1, level + 1, x_offset / 2)
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.edges)
+        self.ax.draw_artist(self.nodes)
+        self.ax.draw_artist(self.summary_marks)
+        for text in self.texts.values():
+            self.ax.draw_artist(text)
+        for text in self.summary_texts:
+            self.ax.draw_artist(text)
+
+    def on_scroll(self, event):
+        if event.xdata is None or self.limits is None:
+            return
+        scale = 1 / ZOOM_STEP if event.button == "up" else ZOOM_STEP
+        x_min, x_max, y_min, y_max = self.limits
+        self.viewport = (event.xdata - (event.xdata - x_min) * scale, event.xdata + (x_max - event.xdata) * scale,
+                         event.ydata - (event.ydata - y_min) * scale, event.ydata + (y_max - event.ydata) * scale)
+        self.draw_graph()
+
+    def on_press(self, event):
+        if event.xdata is None:
+            return
+        if event.button == 3:
+            self.viewport = None
+            self.draw_graph()
+        elif event.dblclick:
+            summary = summary_at(self.summaries, event.xdata, event.ydata)
+            if summary is not None:
+                self.viewport = expanded_viewport(summary)
+                self.draw_graph()
+        elif event.button == 1:
+            self.pan_start = (event.x, event.y, self.limits)
+
+    def on_motion(self, event):
+        if self.pan_start is None:
+            return
+        x, y, (x_min, x_max, y_min, y_max) = self.pan_start
+        dx = (event.x - x) * (x_max - x_min) / self.ax.bbox.width
+        dy = (event.y - y) * (y_max - y_min) / self.ax.bbox.height
+        self.set_limits((x_min - dx, x_max - dx, y_min - dy, y_max - dy))
+        self.canvas.draw_idle()
+
+    def on_release(self, event):
+        if self.pan_start is None:
+            return
+        self.pan_start = None
+        self.viewport = self.limits
+        self.draw_graph()
+
+    def set_limits(self, limits: tuple):
+        self.limits = limits
+        self.ax.set_xlim(limits[0], limits[1])
+        self.ax.set_ylim(limits[2], limits[3])
+
+    def patch_labels(self, layout: dict):
+        """ creates, moves or removes only the labels of nodes that changed """
+
+        if len(layout) > MAX_LABELS:
+            # labels of this many nodes overlap into noise anyway
+            layout = {}
+
+        removed, changed = layout_changes(self.labelled, layout)
+        for value in removed:
+            self.texts.pop(value).remove()
+        for value in changed:
+            node = layout[value]
+            text = self.texts.get(value)
+            if text is None:
+                self.texts[value] = self.ax.text(node.x, node.y, node.label, ha="center", va="center", zorder=3,
+                                                 fontsize=10, color="gray", fontweight="bold", animated=True)
+            else:
+                text.set_position((node.x, node.y))
+                text.set_text(node.label)
+        self.labelled = layout
+
+    def patch_summaries(self, summaries: list):
+        """ summaries are few, their captions are rebuilt from scratch """
+
+        import numpy as np
+
+        for text in self.summary_texts:
+            text.remove()
+        self.summary_texts = [self.ax.text(summary.x, summary.y, f"{summary.count}\n{summary.lo}..{summary.hi}",
+                                           ha="center", va="center", zorder=3, fontsize=7, color="dimgray",
+                                           animated=True)
+                              for summary in summaries] if len(summaries) <= MAX_LABELS else []
+        self.summary_marks.set_offsets(np.array([(summary.x, summary.y) for summary in summaries]).reshape(-1, 2))
+        self.summaries = summaries
 
     def draw_graph(self):
-        self.graph.clear()
-        self.ax.clear()
-        self.coords = {}
-        self.labels = {}
-        self.RBT_to_graph(self.parent.parent.data.root, 0, 0)
-
-        colors = [nx.get_node_attributes(self.graph, 'color').get(node) for node in self.graph.nodes()]
-        nx.draw(self.graph, self.coords, with_labels=True, labels=self.labels, node_size=1000, node_color=colors,
-                font_size=10, font_color="gray", font_weight="bold", edge_color='gray', ax=self.ax)
+        """ asks for a layout of the current viewport; it is computed on a worker thread and applied when ready """
+
+        if self.canvas is None:
+            self.create_canvas()
+
+        tree = self.tree
+        if not tree.drawable:
+            self.show_undrawable(tree)
+            return
+
+        viewport = self.viewport or (-.5, len(tree) - .5, -FULL_VIEW_DEPTH - .5, .5)
+        state = (tree.version, viewport, self.ax.bbox.width, self.viewport is None)
+        if state in (self.rendered_state, self.pending_state):
+            return
+
+        # a newer request makes any render still in flight stale
+        self.cancel_render()
+        self.render_cancel = threading.Event()
+        self.pending_state = state
+
+        # a subtree narrower than one node on screen cannot show its nodes apart
+        node_px = math.sqrt(NODE_SIZE) * self.fig.dpi / 72
+        min_width = (viewport[1] - viewport[0]) * node_px / self.ax.bbox.width
+        # a persistent tree hands the worker its current version, which no later change can touch
+        snapshot = tree.snapshot() if tree.persistent else None
+        threading.Thread(target=self.layout_worker,
+                         args=(state, viewport, min_width, self.render_cancel, snapshot), daemon=True).start()
+
+        self.progress.start()
+        self.after(RENDER_POLL_MS, self.poll_render)
+
+    def show_undrawable(self, tree):
+        """ backends that are not binary trees have nothing to lay out, the view just tells how many tasks there are """
+
+        self.ax.set_title(f"{len(tree)} tasks in a {type(tree).__name__}, the tree view needs a binary tree backend",
+                          fontsize=8, color="gray")
         self.canvas.draw()
 
+    def layout_worker(self, state: tuple, viewport: tuple, min_width: float, cancel: threading.Event,
+                      snapshot=None):
+        """ runs off the Tk thread; holding the read lock keeps the tree still while it is walked, a snapshot
+        stays still without it """
+
+        if snapshot is not None:
+            result = layout_tree(snapshot, viewport, min_width, cancel)
+        else:
+            with self.parent.parent.lock.read_locked:
+                if cancel.is_set():
+                    return
+                result = layout_tree(self.tree, viewport, min_width, cancel)
+        if result is not None:
+            self.results.put((state, result))
+
+    def cancel_render(self):
+        if self.render_cancel is not None:
+            self.render_cancel.set()
+        self.pending_state = None
+
+    def poll_render(self):
+        """ picks up finished layouts on the Tk thread, the only one allowed to touch widgets and artists """
+
+        while True:
+            try:
+                state, (layout, summaries) = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if state == self.pending_state:
+                self.pending_state = None
+                self.apply_layout(state, layout, summaries)
+
+        if self.pending_state is not None:
+            self.after(RENDER_POLL_MS, self.poll_render)
+        else:
+            self.progress.stop()
+            self.progress.set(0)
+
+    def apply_layout(self, state: tuple, layout: dict, summaries: list):
+        import numpy as np
+
+        self.patch_labels(layout)
+        self.patch_summaries(summaries)
+
+        nodes = list(layout.values())
+        points = {value: (node.x, node.y) for value, node in layout.items()}
+        self.nodes.set_offsets(np.array(list(points.values())).reshape(-1, 2))
+        self.nodes.set_facecolor([node.color for node in nodes])
+        self.edges.set_segments([(points[item.parent], (item.x, item.y)) for item in nodes + summaries
+                                 if item.parent is not None])
+        self.rendered_state = state
+
+        _, viewport, _, full_view = state
+        limits = layout_bounds(layout, summaries) if full_view else viewport
+        if limits != self.limits or self.background is None:
+            # new limits invalidate the saved background, draw everything once
+            self.set_limits(limits)
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.ax.bbox)
+
 
 class MainMenu(ctk.CTkFrame):
     def __init__(self, master):
@@ -230,19 +493,69 @@ class MainMenu(ctk.CTkFrame):
 
 
 class TaskManagerApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, backend: str = "rbt"):
+        if sys.platform == "win32":
+            # has to happen before the window exists for the taskbar to pick up the icon
+            ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
         super(TaskManagerApp, self).__init__()
 
         self.title("Task Manager")
         self.resizable(False, False)
-        self.iconbitmap("../icons/icon1.ico")
-
-        self.data = RBTree()
+        if sys.platform == "win32":
+            # X11 and macOS Tk cannot read .ico files
+            self.iconbitmap("../icons/icon1.ico")
+
+        # every change is logged to ../data and the tree is rebuilt from there on the next start, the text index
+        # is only built when the find button first searches by description
+        self.store = TaskStore(DATA_DIR, tree_cls=BACKENDS[backend], text_index=False)
+        self.data = self.store.tree
+        # the tree is only changed from the Tk thread, under the write side; layout workers read under the read side
+        self.lock = RWLock()
+        # everything the buttons do goes through the service, the same code runs headless in task_service.py
+        self.service = TaskService(self.store, self.lock, before_change=self.cancel_render)
 
         self.menu = MainMenu(self)
         self.menu.pack(padx=0, pady=0)
 
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        if self.store.tree.persistent:
+            self.bind("<Control-z>", lambda event: self.step_history(self.service.undo))
+            self.bind("<Control-y>", lambda event: self.step_history(self.service.redo))
+        self.after(SYNC_INTERVAL_MS, self.sync_store)
+        self.after(EXPIRE_INTERVAL_MS, self.expire_tasks)
+
+    def cancel_render(self):
+        """ a layout being computed in the background must not see the tree halfway through a change """
+
+        self.menu.display_tree.cancel_render()
+
+    def sync_store(self):
+        """ flushes logged changes even when nobody is clicking """
+
+        self.store.sync()
+        self.after(SYNC_INTERVAL_MS, self.sync_store)
+
+    def step_history(self, step):
+        """ undo or redo of the last edit, the view follows at once """
+
+        if step():
+            self.menu.display_tree.draw_graph()
+
+    def expire_tasks(self):
+        """ deletes tasks whose time to live is up, they disappear from the drawing with the next update """
+
+        self.service.expire()
+        self.after(EXPIRE_INTERVAL_MS, self.expire_tasks)
+
+    def close(self):
+        self.store.close()
+        self.destroy()
+
 
 if __name__ == "__main__":
-    app = TaskManagerApp()
+    parser = argparse.ArgumentParser(description="task manager")
+    parser.add_argument("--backend", choices=BACKENDS, default="rbt", help="tree the tasks are kept in")
+    args = parser.parse_args()
+
+    app = TaskManagerApp(args.backend)
     app.mainloop()
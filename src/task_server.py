@@ -0,0 +1,248 @@
+""" headless task queue service on top of RBTree
+
+protocol: one JSON object per line in both directions
+    request   {"id": 1, "op": "insert", "priority": 5, "task": "write report"}
+    response  {"id": 1, "ok": true, "result": "added"}
+
+operations: insert, delete, find, pop (highest priority), range (lo, hi, limit), wait (pop, blocking until a task
+arrives, optional timeout in seconds), cancel, len. Clients may pipeline any number of requests; responses come back in
+request order and are flushed in batches. A line that is not a JSON object gets {"id": null, "ok": false,
+"error": ...} and the connection stays open.
+
+The requests of one connection run one after another, so a wait holds back every later request on its connection
+until it returns. Consumers that block in wait use a connection of their own for it. The server goes on reading
+while a wait blocks: a cancel request ends the wait with a null result, and so does the client closing the
+connection. A task popped for a wait that was cancelled or cannot be answered any more is put back.
+
+With --multimap equal priorities queue up instead of replacing each other, and delete, find and pop take the
+oldest task of a priority first.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+from itertools import islice
+
+from structs.multimap import TaskMultiMap
+from structs.rbt import RBTree
+
+READ_CHUNK = 1 << 16
+
+
+class TaskServer:
+    def __init__(self, tree: RBTree = None):
+        self.tree = tree if tree is not None else RBTree()
+        self.task_added = None
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None):
+        """ listens on a unix socket when path is given, on TCP otherwise; returns the asyncio server """
+
+        self.task_added = asyncio.Condition()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = b""
+        try:
+            while True:
+                if b"\n" not in pending:
+                    data = await reader.read(READ_CHUNK)
+                    if not data:
+                        break
+                    pending += data
+                *lines, pending = pending.split(b"\n")
+
+                # every complete request of this read is answered with a single write
+                responses = []
+                for index, line in enumerate(lines):
+                    if not line.strip():
+                        continue
+                    try:
+                        request = json.loads(line)
+                        if not isinstance(request, dict):
+                            raise ValueError("a request has to be a JSON object")
+                    except ValueError as error:
+                        # JSONDecodeError and UnicodeDecodeError included
+                        responses.append(json.dumps(self.error_response(None, error)).encode() + b"\n")
+                        continue
+                    if request.get("op") != "wait":
+                        responses.append(json.dumps(await self.execute(request)).encode() + b"\n")
+                        continue
+
+                    if responses:
+                        # do not hold earlier answers back while blocking
+                        writer.write(b"".join(responses))
+                        responses = []
+                    # lines after the wait are read on while it blocks, the requests among them run after it
+                    pending = b"\n".join(lines[index + 1:] + [pending])
+                    response, pending = await self.__watched_wait(request, reader, writer, pending)
+                    if response is None:
+                        return
+                    responses.append(json.dumps(response).encode() + b"\n")
+                    break
+                if responses:
+                    writer.write(b"".join(responses))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def __watched_wait(self, request: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                             pending: bytes) -> tuple:
+        """ runs a wait request while reading on, returns its response, None once the connection is gone, and
+        pending with the bytes read meanwhile
+
+        A cancel request among the lines read meanwhile ends the wait with a null result. A task popped for a wait
+        that was cancelled or whose connection is gone goes back into the tree.
+        """
+
+        waiting = asyncio.ensure_future(self.execute(request))
+        cancelled = closed = False
+        while not (cancelled or closed):
+            reading = asyncio.ensure_future(reader.read(READ_CHUNK))
+            done, _ = await asyncio.wait((waiting, reading), return_when=asyncio.FIRST_COMPLETED)
+            if reading in done:
+                try:
+                    data = reading.result()
+                except ConnectionError:
+                    data = b""
+                closed = not data
+                pending += data
+                cancelled = any(self.__is_cancel(line) for line in pending.split(b"\n")[:-1])
+            else:
+                # data that came in meanwhile stays in the reader's buffer for the next read
+                reading.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await reading
+            if waiting in done:
+                break
+        if not waiting.done():
+            waiting.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await waiting
+        response = waiting.result() if not waiting.cancelled() else {"id": request.get("id"), "result": None,
+                                                                      "ok": True}
+        closed = closed or reader.at_eof() or writer.is_closing()
+        if (cancelled or closed) and response.get("result") is not None:
+            await self.put_back(*response["result"])
+            response["result"] = None
+        return None if closed else response, pending
+
+    @staticmethod
+    def __is_cancel(line: bytes) -> bool:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return False
+        return isinstance(request, dict) and request.get("op") == "cancel"
+
+    async def execute(self, request: dict) -> dict:
+        try:
+            return {"id": request.get("id"), "result": await self.__dispatch(request), "ok": True}
+        except Exception as error:
+            # whatever one request does wrong, e.g. an OverflowError from a priority of 1e400, is answered to it
+            return self.error_response(request.get("id"), error)
+
+    @staticmethod
+    def error_response(request_id, error: Exception) -> dict:
+        return {"id": request_id, "ok": False, "error": f"{type(error).__name__}: {error}"}
+
+    async def __dispatch(self, request: dict):
+        op = request["op"]
+        if op == "insert":
+            return await self.insert(int(request["priority"]), str(request["task"]))
+        if op == "delete":
+            return self.delete(int(request["priority"]))
+        if op == "find":
+            node = self.tree.search(int(request["priority"]))
+            return None if node == self.tree.nil else node.task
+        if op == "pop":
+            return self.pop()
+        if op == "range":
+            nodes = self.tree.range(int(request["lo"]), int(request["hi"]))
+            return [[node.value, node.task] for node in islice(nodes, request.get("limit"))]
+        if op == "wait":
+            return await self.wait(request.get("timeout"))
+        if op == "cancel":
+            # a wait it could end has seen it while it was blocking, see handle_client
+            return None
+        if op == "len":
+            return len(self.tree)
+        raise ValueError(f"unknown operation {op!r}")
+
+    async def insert(self, priority: int, task: str) -> str:
+        """ same collision rule as the GUI: an existing priority gets its task replaced, unless the tree is a
+        TaskMultiMap that queues it """
+
+        if not self.tree.multimap and self.tree.replace(priority, task):
+            return "changed"
+
+        self.tree.insert(priority, task)
+        async with self.task_added:
+            self.task_added.notify()
+        return "added"
+
+    async def put_back(self, priority: int, task: str):
+        """ returns a popped task nobody received to the queue; a plain tree keeps a task inserted under its
+        priority since, as that one would have replaced it anyway """
+
+        if self.tree.multimap or self.tree.search(priority) == self.tree.nil:
+            self.tree.insert(priority, task)
+            async with self.task_added:
+                self.task_added.notify()
+
+    def delete(self, priority: int) -> bool:
+        if self.tree.search(priority) == self.tree.nil:
+            return False
+        self.tree.delete(priority)
+        return True
+
+    def pop(self):
+        """ removes the highest priority task, returns [priority, task] or None """
+
+        node = self.tree.pop_max()
+        if node == self.tree.nil:
+            return None
+        return [node.value, node.task]
+
+    async def wait(self, timeout: float = None):
+        """ pops the highest priority task, waiting for one to be inserted if the queue is empty; later requests
+        on the same connection wait with it """
+
+        async with self.task_added:
+            try:
+                await asyncio.wait_for(self.task_added.wait_for(lambda: len(self.tree) > 0), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.pop()
+
+
+async def serve(host: str, port: int, path: str = None, multimap: bool = False):
+    server = TaskServer(TaskMultiMap() if multimap else None)
+    await server.start(host, port, path)
+    print(f"serving tasks on {path or f'{host}:{server.port}'}")
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="headless task queue server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this unix socket path instead of TCP")
+    parser.add_argument("--multimap", action="store_true", help="queue tasks of equal priority in FIFO order")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.unix, args.multimap))
@@ -0,0 +1,306 @@
+""" task operations of the app without any widgets: the Tk buttons call into TaskService, and so can scripts
+
+headless use, run from src/:
+    python task_service.py add 5 "write report"
+    python task_service.py find 5
+    python task_service.py delete 5
+    python task_service.py search write report  priorities of the tasks containing every word, the commands
+                                                tokens, prefix and exact pick a SEARCH_MODES entry instead
+    python task_service.py run commands.txt      one "add|change|delete|find <priority> [description]" or
+                                                "search|tokens|prefix|exact <text>" per line,
+                                                "-" reads them from stdin; scripts can also give a task a time
+                                                to live with "ttl <priority> <seconds>" and delete the tasks
+                                                whose time is up with "expire"; with the persistent backend
+                                                "undo" and "redo" step through the script's changes
+"""
+
+import argparse
+import contextlib
+import shlex
+import sys
+import time
+
+from storage.task_store import TaskStore
+from structs.array_rbt import ArrayRBTree
+from structs.avl import AVLTree
+from structs.bplus_tree import BPlusTree
+from structs.concurrent_rbt import RWLock
+from structs.multimap import TaskMultiMap
+from structs.persistent_rbt import PersistentRBTree
+from structs.rbt import RBTree
+from structs.text_arena import ArenaRBTree
+from structs.timer_wheel import TimerWheel
+
+DATA_DIR = "../data"
+# tree backends a store can be opened with, they share the SortedMap interface and the files on disk
+BACKENDS = {"rbt": RBTree, "avl": AVLTree, "bptree": BPlusTree, "rbt-arena": ArenaRBTree,
+            "rbt-array": ArrayRBTree, "persistent": PersistentRBTree}
+
+# how search matches a query against the descriptions, see TextIndex
+SEARCH_MODES = ("tokens", "prefix", "exact")
+
+
+def search_mode(query: str) -> tuple:
+    """ (mode, text) of a query typed into the GUI: "text" in double quotes matches the whole description, text*
+    its start and anything else every word of it """
+
+    query = query.strip()
+    if len(query) > 1 and query[0] == query[-1] == '"':
+        return "exact", query[1:-1]
+    if len(query) > 1 and query.endswith("*"):
+        return "prefix", query[:-1]
+    return "tokens", query
+
+ADDED = "added"
+CHANGED = "changed"
+
+
+class TaskService:
+    """ add/change/delete/find on a TaskStore with the rules the GUI has always had
+
+    Adding a priority that already exists changes its description instead, unless the store keeps a TaskMultiMap:
+    then every add queues one more task and delete and find work on the oldest task of the priority. With a lock
+    every change is made under its write side and every lookup under its read side. before_change is called before
+    the write side is requested, the GUI uses it to stop layout workers that hold the read side.
+
+    A task can be given a time to live. The store keeps its deadline as wall_clock time, so it survives restarts,
+    and a TimerWheel on clock's time scale fires it, never before the deadline and at most one tick of the wheel
+    (a second) after it; the wheel is filled from the store on start and after undo and redo. expire deletes the tasks whose deadline has passed through the store like delete does and calls
+    on_expire(priority, task) for each.
+    """
+
+    def __init__(self, store: TaskStore, lock: RWLock = None, before_change=None, clock=time.monotonic,
+                 on_expire=None, wall_clock=time.time):
+        self.store = store
+        self.lock = lock
+        self.before_change = before_change
+        self.deadlines = TimerWheel(clock=clock)
+        self.on_expire = on_expire
+        self.wall_clock = wall_clock
+        for priority in store.deadlines:
+            self.__sync_deadline(priority)
+
+    @property
+    def tree(self):
+        return self.store.tree
+
+    def __changing(self):
+        if self.before_change is not None:
+            self.before_change()
+        return self.lock.write_locked if self.lock is not None else contextlib.nullcontext()
+
+    def __reading(self):
+        return self.lock.read_locked if self.lock is not None else contextlib.nullcontext()
+
+    def add(self, priority: int, task: str, ttl: float = None) -> str:
+        """ inserts a new task or changes the description of an existing one, returns ADDED or CHANGED;
+        with ttl the task expires ttl seconds from now, without it an existing deadline is kept """
+
+        if not task:
+            raise ValueError("task description is empty")
+        if ttl is not None:
+            # refused before the store changes, not after the task is logged
+            self.__check_deadlines()
+        with self.__changing():
+            is_new = self.tree.multimap or self.tree.search(priority) == self.tree.nil
+            if is_new:
+                self.store.insert(priority, task)
+            else:
+                self.store.update(priority, task)
+            if ttl is not None:
+                self.__schedule(priority, ttl)
+        return ADDED if is_new else CHANGED
+
+    def __check_deadlines(self):
+        if self.tree.multimap:
+            raise ValueError("deadlines need one task per priority")
+
+    def __schedule(self, priority: int, ttl: float):
+        self.__check_deadlines()
+        self.store.set_deadline(priority, self.wall_clock() + ttl)
+        self.deadlines.schedule_in(priority, ttl)
+
+    def __sync_deadline(self, priority: int):
+        """ puts the store's deadline of priority on the wheel, translated to the wheel's clock """
+
+        deadline = self.store.deadlines.get(priority)
+        if deadline is None:
+            self.deadlines.cancel(priority)
+        else:
+            self.deadlines.schedule(priority, self.deadlines.clock() + deadline - self.wall_clock())
+
+    def expire_in(self, priority: int, ttl: float) -> bool:
+        """ gives an existing task a new deadline, False if there is none """
+
+        with self.__changing():
+            if self.tree.search(priority) == self.tree.nil:
+                return False
+            self.__schedule(priority, ttl)
+        return True
+
+    def deadline(self, priority: int):
+        """ time on the clock's scale the task expires at, None if it has no deadline """
+
+        return self.deadlines.deadline(priority)
+
+    def expire(self, now: float = None) -> list:
+        """ deletes every task whose deadline has passed, returns their (priority, task) pairs """
+
+        expired = []
+        priorities = self.deadlines.advance(now)
+        if not priorities:
+            return expired
+        with self.__changing():
+            for priority in priorities:
+                node = self.tree.search(priority)
+                if node != self.tree.nil:
+                    expired.append((priority, node.task))
+                    self.store.delete(priority)
+        if self.on_expire is not None:
+            for priority, task in expired:
+                self.on_expire(priority, task)
+        return expired
+
+    def change(self, priority: int, task: str) -> bool:
+        """ changes the description of an existing task only, False if there is none """
+
+        if not task:
+            raise ValueError("task description is empty")
+        with self.__changing():
+            if self.tree.search(priority) == self.tree.nil:
+                return False
+            self.store.update(priority, task)
+        return True
+
+    def delete(self, priority: int) -> bool:
+        """ False if there is no task with this priority """
+
+        with self.__changing():
+            if self.tree.search(priority) == self.tree.nil:
+                return False
+            self.store.delete(priority)
+            self.deadlines.cancel(priority)
+        return True
+
+    def find(self, priority: int):
+        """ description of the task, None if there is none """
+
+        with self.__reading():
+            node = self.tree.search(priority)
+            return None if node == self.tree.nil else node.task
+
+    def find_text(self, query: str, mode: str = "tokens") -> list:
+        """ ascending priorities of the tasks matching query, mode is one of SEARCH_MODES; builds the store's
+        text index if it has none yet """
+
+        with self.__reading():
+            # the first search pays for reading every description, opening the store does not
+            index = self.store.build_index()
+            if mode == "tokens":
+                return index.find_tokens(query)
+            if mode == "prefix":
+                return index.find_prefix(query)
+            if mode == "exact":
+                return index.find_exact(query)
+        raise ValueError(f"unknown search mode {mode!r}")
+
+    def undo(self) -> bool:
+        """ takes back the last change, False if there is none; needs a persistent backend """
+
+        if not self.tree.persistent:
+            raise ValueError("undo needs a persistent tree backend")
+        with self.__changing():
+            edit = self.store.undo()
+            if edit is not None:
+                self.__sync_deadline(edit[0])
+        return edit is not None
+
+    def redo(self) -> bool:
+        if not self.tree.persistent:
+            raise ValueError("redo needs a persistent tree backend")
+        with self.__changing():
+            edit = self.store.redo()
+            if edit is not None:
+                self.__sync_deadline(edit[0])
+        return edit is not None
+
+    def __len__(self):
+        return len(self.tree)
+
+    def sync(self):
+        self.store.sync()
+
+    def close(self):
+        self.store.close()
+
+
+def run_command(service: TaskService, words: list):
+    """ executes one split command line, returns the text to show for it """
+
+    op = words[0]
+    if op == "expire":
+        return f"{len(service.expire())} expired"
+    if op in ("undo", "redo"):
+        return f"{op} done" if getattr(service, op)() else f"nothing to {op}"
+    if op in SEARCH_MODES or op == "search":
+        priorities = service.find_text(" ".join(words[1:]), "tokens" if op == "search" else op)
+        return " ".join(map(str, priorities)) if priorities else "not found"
+    priority = int(words[1])
+    if op == "add":
+        return service.add(priority, " ".join(words[2:]))
+    if op == "change":
+        return CHANGED if service.change(priority, " ".join(words[2:])) else "not found"
+    if op == "ttl":
+        return "expires" if service.expire_in(priority, float(words[2])) else "not found"
+    if op == "delete":
+        return "deleted" if service.delete(priority) else "not found"
+    if op == "find":
+        task = service.find(priority)
+        return "not found" if task is None else task
+    raise ValueError(f"unknown command {op!r}")
+
+
+def run_script(service: TaskService, lines, quiet: bool = False) -> int:
+    """ executes one command per line as fast as the store allows, returns the number of commands """
+
+    count = 0
+    for line in lines:
+        words = shlex.split(line, comments=True)
+        if not words:
+            continue
+        result = run_command(service, words)
+        if not quiet:
+            print(result)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="task manager without a display")
+    parser.add_argument("--data", default=DATA_DIR, help="directory of the task store")
+    parser.add_argument("--backend", choices=BACKENDS, default="rbt")
+    parser.add_argument("--multimap", action="store_true", help="queue tasks of equal priority instead of replacing")
+    parser.add_argument("--quiet", action="store_true", help="do not print results of script commands")
+    parser.add_argument("command", choices=("add", "change", "delete", "find", "search", *SEARCH_MODES, "run"))
+    parser.add_argument("args", nargs="+")
+    args = parser.parse_args()
+
+    tree_cls = BACKENDS[args.backend]
+    if args.multimap:
+        try:
+            tree_cls = TaskMultiMap.of(tree_cls)
+        except ValueError as error:
+            parser.error(f"--multimap with --backend {args.backend}: {error}")
+    # the text index is built by the first search, commands that never search do not read every description
+    service = TaskService(TaskStore(args.data, tree_cls=tree_cls))
+    try:
+        if args.command == "run":
+            if args.args[0] == "-":
+                run_script(service, sys.stdin, args.quiet)
+            else:
+                with open(args.args[0], encoding="utf-8") as script:
+                    run_script(service, script, args.quiet)
+        else:
+            print(run_command(service, [args.command] + args.args))
+    finally:
+        service.close()
@@ -1,7 +1,31 @@
+import asyncio
+import json
+import math
 import pytest
 import random
+import re
 import string
-from TaskManager.src.structs.rbt import RBTree
+import threading
+from structs.rbt import RBTree
+from structs.array_rbt import ArrayRBTree
+from structs.avl import AVLTree
+from structs.bplus_tree import BPlusTree, _Leaf
+from structs.instrumented_rbt import Histogram, InstrumentedRBTree, TreeStats, instrument, uninstrument
+from structs.multimap import TaskMultiMap
+from structs.persistent_rbt import PersistentRBTree
+from structs.text_arena import ArenaRBTree
+from structs.text_index import TextIndex
+from structs.timer_wheel import TimerWheel
+from structs.concurrent_rbt import ConcurrentRBTree, RWLock
+from storage.task_store import TaskStore
+from storage.snapshot import write_snapshot
+from storage.mapped_snapshot import MappedSnapshot
+from storage.sharded_store import ShardedStore
+from task_server import TaskServer
+from task_client import TaskClient
+from task_service import ADDED, CHANGED, TaskService, run_script, search_mode
+from benchmarks.tree_layout import zoom_in
+from tree_layout import expanded_viewport, layout_bounds, layout_changes, layout_tree, summary_at
 
 
 def rand_description_generator(size=3):
@@ -24,3 +48,1055 @@ def test_rbt(data, expected):
 
     for idx, val in enumerate(rbt):
         assert str(val) == expected[idx]
+
+
+def check_rb_invariants(tree):
+    """ walks the tree and checks ordering, red-red and black-height rules, returns black height """
+
+    def walk(node, lo, hi):
+        if node == tree.nil:
+            return 1
+        assert lo is None or node.value >= lo
+        assert hi is None or node.value <= hi
+        if node.color == "red":
+            assert node.left.color == "black" and node.right.color == "black"
+        if hasattr(node, "size"):
+            assert node.size == node.left.size + node.right.size + 1
+        left_height = walk(node.left, lo, node.value)
+        right_height = walk(node.right, node.value, hi)
+        assert left_height == right_height
+        return left_height + (node.color == "black")
+
+    assert tree.root.color == "black"
+    return walk(tree.root, None, None)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_array_rbt(seed):
+    rng = random.Random(seed)
+    compact, expected = ArrayRBTree(), {}
+    keys = rng.sample(range(10_000), 2_000)
+    for key in keys:
+        compact.insert(key, str(key))
+        expected[key] = str(key)
+    for key in rng.sample(keys, 1_500):
+        compact.delete(key)
+        del expected[key]
+    for key in rng.sample(range(10_000, 20_000), 500):
+        compact.insert(key, str(key))
+        expected[key] = str(key)
+
+    check_rb_invariants(compact)
+    assert [(node.value, str(node)) for node in compact] == sorted(expected.items())
+    assert len(compact) == len(expected)
+    for key in keys[:100]:
+        node = compact.search(key)
+        assert (node == compact.nil) == (key not in expected)
+
+    # a handle kept past its delete does not read the task that reuses its slot
+    kept = compact.search(keys[0]) if keys[0] in expected else compact.root
+    priority = kept.value
+    compact.delete(priority)
+    compact.insert(-1, "reuses the slot")
+    with pytest.raises(ValueError):
+        kept.task
+    assert compact.search(-1).task == "reuses the slot" and compact.search(priority) == compact.nil
+    check_rb_invariants(compact)
+
+
+def test_array_rbt_sorted_map():
+    items = [(key, f"task {key}") for key in range(0, 2_000, 2)]
+    compact = ArrayRBTree.from_sorted(items)
+    check_rb_invariants(compact)
+    assert [(node.value, node.task) for node in compact] == items and len(compact) == len(items)
+    assert compact.select(0).value == 1_998 and compact.rank(1_000) == 499 and compact.select(499).value == 1_000
+    assert [node.value for node in compact.range(9, 15)] == [10, 12, 14]
+    assert compact.replace(10, "changed") and compact.search(10).task == "changed"
+
+    # popped nodes stay readable after their slot is reused
+    popped = compact.pop_max()
+    compact.insert(1, "reuses the slot")
+    assert (popped.value, popped.task) == (1_998, "task 1998") and compact.pop_min().value == 0
+    check_rb_invariants(compact)
+    with pytest.raises(ValueError):
+        ArrayRBTree.from_sorted([(2, "b"), (1, "a")])
+
+    # priorities outside int64 are refused without using up a slot
+    free = len(compact.free)
+    with pytest.raises(ValueError):
+        compact.insert(1 << 63, "too high")
+    assert len(compact.free) == free and len(compact) == len(items) - 1
+    with pytest.raises(ValueError):
+        ArrayRBTree.from_sorted([(-1 << 64, "too low")])
+
+    # among equal priorities the popped node is the one removed, as in RBTree
+    for tree in (ArrayRBTree(), RBTree()):
+        for task in "abc":
+            tree.insert(5, task)
+        assert tree.pop_max().task == "c" and [node.task for node in tree] == ["a", "b"]
+        assert tree.pop_min().task == "a" and [node.task for node in tree] == ["b"]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_rbt_delete_and_order_statistics(seed):
+    rng = random.Random(seed)
+    rbt, expected = RBTree(), {}
+    keys = rng.sample(range(10_000), 2_000)
+    for key in keys:
+        rbt.insert(key, str(key))
+        expected[key] = str(key)
+    for key in rng.sample(keys, 1_500):
+        rbt.delete(key)
+        del expected[key]
+
+    check_rb_invariants(rbt)
+    assert [(node.value, str(node)) for node in rbt] == sorted(expected.items())
+    assert len(rbt) == len(expected)
+
+    descending = sorted(expected, reverse=True)
+    for k in (0, 1, len(descending) // 2, len(descending) - 1):
+        assert rbt.select(k).value == descending[k]
+        assert rbt.rank(descending[k]) == k
+    assert rbt.select(len(descending)) == RBTree.nil
+
+
+def test_rbt_range_queries_and_cursor():
+    rbt = RBTree()
+    for key in range(0, 100, 10):
+        rbt.insert(key, f"task {key}")
+
+    assert [node.value for node in rbt.range(15, 50)] == [20, 30, 40, 50]
+    assert rbt.floor(35).value == 30 and rbt.ceiling(35).value == 40
+    assert rbt.floor(-1) == RBTree.nil and rbt.ceiling(91) == RBTree.nil
+    assert rbt.successor(rbt.search(90)) == RBTree.nil
+    assert rbt.predecessor(rbt.search(10)).value == 0
+
+    cursor = rbt.cursor(25)
+    assert [node.value for node in cursor.take(3)] == [30, 40, 50]
+    # resumes where it stopped, then walks back the other way
+    assert next(cursor).value == 60
+    assert [node.value for node in reversed(cursor).take(3)] == [70, 60, 50]
+    assert [node.value for node in rbt.cursor(reverse=True)][:2] == [90, 80]
+
+
+@pytest.mark.parametrize("n_tasks", [0, 1, 2, 3, 7, 8, 100, 1000])
+def test_rbt_from_sorted(n_tasks):
+    rbt = RBTree.from_sorted((key, str(key)) for key in range(n_tasks))
+    check_rb_invariants(rbt)
+    assert [node.value for node in rbt] == list(range(n_tasks))
+    assert len(rbt) == n_tasks
+
+    with pytest.raises(ValueError):
+        RBTree.from_sorted([(2, "b"), (1, "a")])
+
+
+@pytest.mark.parametrize("batch_size", [5, 2_000])
+def test_rbt_batched_insert_and_delete(batch_size):
+    rng = random.Random(batch_size)
+    rbt = RBTree.from_sorted((key, str(key)) for key in range(0, 4_000, 2))
+    kept = rbt.search(10)
+
+    batch = rng.sample(range(1, 4_000, 2), batch_size)
+    rbt.insert_many((key, str(key)) for key in batch)
+    check_rb_invariants(rbt)
+    assert [node.value for node in rbt] == sorted(list(range(0, 4_000, 2)) + batch)
+
+    assert rbt.delete_many(batch + [-1]) == batch_size
+    check_rb_invariants(rbt)
+    assert [node.value for node in rbt] == list(range(0, 4_000, 2))
+    assert rbt.search(10) is kept
+
+
+def recursive_orders(node, nil):
+    """ reference pre/in/post orders of the subtree at node """
+
+    if node is nil:
+        return [], [], []
+    left, right = recursive_orders(node.left, nil), recursive_orders(node.right, nil)
+    return ([node] + left[0] + right[0],
+            left[1] + [node] + right[1],
+            left[2] + right[2] + [node])
+
+
+@pytest.mark.parametrize("tree_cls", [RBTree, AVLTree, PersistentRBTree])
+def test_iterative_traversals(tree_cls):
+    tree = tree_cls()
+    keys = random.Random(5).sample(range(1_000), 300)
+    for key in keys:
+        tree.insert(key, str(key))
+
+    pre, ino, post = recursive_orders(tree.root, tree.nil)
+    assert list(tree.pre_order()) == pre
+    assert list(tree.in_order()) == ino == list(tree)
+    assert list(tree.post_order()) == post
+    assert [node.value for node in tree] == sorted(keys)
+
+
+def test_avl_remove():
+    avl = AVLTree()
+    for key in range(100):
+        avl.insert(key, str(key))
+    for key in range(0, 100, 3):
+        avl.delete(key)
+
+    assert [(node.priority, node.task) for node in avl] == [(key, str(key)) for key in range(100) if key % 3]
+    assert avl.search(3) == avl.nil and avl.search(4).task == "4"
+    assert AVLTree.height(avl.root) <= 9
+
+
+def check_avl_invariants(tree):
+    def walk(node, lo, hi):
+        if node == tree.nil:
+            return 0
+        assert (lo is None or node.value > lo) and (hi is None or node.value < hi)
+        left_height, right_height = walk(node.left, lo, node.value), walk(node.right, node.value, hi)
+        assert abs(left_height - right_height) <= 1
+        assert node.height == max(left_height, right_height) + 1
+        assert node.size == node.left.size + node.right.size + 1
+        return node.height
+
+    walk(tree.root, None, None)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sorted_map_backends_agree(seed):
+    rng = random.Random(seed)
+    rbt, avl, expected = RBTree(), AVLTree(), {}
+    for _ in range(3_000):
+        key = rng.randrange(1_000)
+        if key in expected and rng.random() < .5:
+            rbt.delete(key)
+            avl.delete(key)
+            del expected[key]
+        elif key not in expected:
+            rbt.insert(key, str(key))
+            avl.insert(key, str(key))
+            expected[key] = str(key)
+
+    check_rb_invariants(rbt)
+    check_avl_invariants(avl)
+    items = sorted(expected.items())
+    for tree in (rbt, avl):
+        assert [(node.value, str(node)) for node in tree] == items and len(tree) == len(items)
+        assert [node.value for node in tree.range(100, 200)] == [key for key, _ in items if 100 <= key <= 200]
+        assert tree.floor(500).value == max(key for key in expected if key <= 500)
+        assert tree.ceiling(500).value == min(key for key in expected if key >= 500)
+        assert tree.select(0).value == items[-1][0] and tree.rank(items[-1][0]) == 0
+        assert (items[0][0] in tree) and (-1 not in tree)
+        assert tree.pop_max().value == items[-1][0] and tree.pop_min().value == items[0][0]
+    check_avl_invariants(avl)
+
+    rebuilt = AVLTree.from_sorted(items)
+    check_avl_invariants(rebuilt)
+    assert [(node.value, node.task) for node in rebuilt] == items
+
+
+def test_task_store_survives_restart(tmp_path):
+    store = TaskStore(str(tmp_path), compact_every=50)
+    for priority in range(120):
+        store.insert(priority, f"task {priority}")
+    store.delete(7)
+    store.update(8, "changed")
+    store.close()
+
+    # a crash in the middle of an append leaves a torn record behind
+    with open(tmp_path / f"tasks.wal.{store.generation}", "ab") as log:
+        log.write(b"\x01\x02\x03")
+
+    reopened = TaskStore(str(tmp_path))
+    check_rb_invariants(reopened.tree)
+    assert reopened.search(7) == RBTree.nil
+    assert reopened.search(8).task == "changed"
+    assert [node.value for node in reopened.tree] == [priority for priority in range(120) if priority != 7]
+
+    reopened.insert(500, "after restart")
+    reopened.close()
+    assert TaskStore(str(tmp_path)).search(500).task == "after restart"
+
+
+def test_wal_hands_every_append_to_the_os(tmp_path):
+    # nothing is synced yet, but a process dying now would leave every record in the file
+    store = TaskStore(str(tmp_path), sync_every=10 ** 6, sync_interval=10 ** 6)
+    store.insert(1, "one")
+    store.delete(1)
+    store.insert(2, "two")
+    assert store.log.pending == 3
+    assert [(node.value, node.task) for node in TaskStore(str(tmp_path)).tree] == [(2, "two")]
+    store.close()
+
+
+def test_mapped_snapshot(tmp_path):
+    rbt = RBTree.from_sorted((priority, f"задача {priority}") for priority in range(0, 1_000, 5))
+    path = str(tmp_path / "tasks.snapshot")
+    write_snapshot(rbt, path, generation=3)
+
+    with MappedSnapshot(path) as snapshot:
+        assert snapshot.generation == 3 and len(snapshot) == len(rbt)
+        assert str(snapshot.search(25)) == str(rbt.search(25))
+        assert snapshot.search(26) == snapshot.nil
+        assert [node.value for node in snapshot.range(12, 31)] == [15, 20, 25, 30]
+        assert [(node.value, str(node)) for node in snapshot] == [(node.value, str(node)) for node in rbt]
+
+
+def test_concurrent_rbt_stress():
+    tree = ConcurrentRBTree(chunk_size=64)
+    n_writers, n_keys = 4, 2_000
+    errors = []
+
+    def writer(offset):
+        rng = random.Random(offset)
+        # every writer owns keys == offset mod n_writers and ends with the odd ones of them inserted
+        for key in range(offset, n_keys, n_writers):
+            tree.insert(key, str(key))
+        for key in rng.sample(range(offset, n_keys, n_writers), n_keys // n_writers):
+            if key % 2 == 0:
+                tree.delete(key)
+
+    def reader():
+        try:
+            for _ in range(20):
+                seen = [node.value for node in tree]
+                assert seen == sorted(seen)
+                tree.search(random.randrange(n_keys))
+                tree.range(100, 200)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(n_writers)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    check_rb_invariants(tree.tree)
+    assert [value for value, _ in tree.snapshot()] == list(range(1, n_keys, 2))
+    assert len(tree) == n_keys // 2
+
+
+def test_task_server_roundtrip():
+    async def scenario():
+        server = TaskServer()
+        await server.start(port=0)
+        producer = await TaskClient().connect(port=server.port)
+        consumer = await TaskClient().connect(port=server.port)
+
+        waiting = asyncio.ensure_future(consumer.wait(timeout=5))
+        await asyncio.sleep(0.05)
+        assert await producer.insert(3, "three") == "added"
+        assert await waiting == [3, "three"]
+
+        results = await producer.call_many([("insert", {"priority": p, "task": f"task {p}"}) for p in range(10)])
+        assert results == ["added"] * 10
+        assert await producer.insert(4, "four") == "changed"
+        assert await producer.find(4) == "four" and await producer.find(42) is None
+        assert await producer.range(2, 6, limit=3) == [[2, "task 2"], [3, "task 3"], [4, "four"]]
+        assert await consumer.pop() == [9, "task 9"]
+        assert await producer.delete(0) and not await producer.delete(0)
+        assert await consumer.wait(timeout=0.01) == [8, "task 8"]
+        with pytest.raises(RuntimeError):
+            await producer.call("explode")
+        with pytest.raises(RuntimeError, match="OverflowError"):
+            await producer.call("find", priority=1e400)
+        assert await producer.find(4) == "four"
+
+        # lines that are not JSON objects get an error and the connection stays usable
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b'{"op": \n[]\n\xff\n{"id": 7, "op": "len"}\n')
+        await writer.drain()
+        answers = [json.loads(await reader.readline()) for _ in range(4)]
+        assert [answer["ok"] for answer in answers] == [False, False, False, True]
+        assert answers[0]["id"] is None and answers[3] == {"id": 7, "result": 7, "ok": True}
+        writer.close()
+        await writer.wait_closed()
+
+        # a call given up on is answered late without taking the client down with it
+        while await consumer.pop() is not None:
+            pass
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(consumer.call("wait", timeout=0.2), 0.01)
+        assert await consumer.pop() is None
+        assert await producer.insert(4, "four") == "added" and await consumer.pop() == [4, "four"]
+
+        # a wait given up on is cancelled on the server and does not take the next task with it
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(consumer.wait(timeout=5), 0.01)
+        assert await producer.insert(7, "seven") == "added" and await producer.call("len") == 1
+        assert await consumer.pop() == [7, "seven"]
+
+        # nor does a wait whose connection closed
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b'{"id": 1, "op": "wait"}\n')
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        writer.close()
+        await writer.wait_closed()
+        await asyncio.sleep(0.05)
+        assert await producer.insert(8, "eight") == "added" and await producer.call("len") == 1
+        assert await producer.pop() == [8, "eight"]
+
+        await producer.close()
+        await asyncio.sleep(0)
+        with pytest.raises(ConnectionError):
+            await producer.find(4)
+        await consumer.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_rbt_priority_queue():
+    rbt = RBTree()
+    assert rbt.peek_max() == RBTree.nil and rbt.pop_min() == RBTree.nil
+
+    keys = random.Random(9).sample(range(5_000), 1_000)
+    for key in keys:
+        rbt.insert(key, str(key))
+    rbt.delete(max(keys))
+    assert rbt.peek_max().value == sorted(keys)[-2] and rbt.peek_min().value == min(keys)
+
+    popped = [rbt.pop_max().value for _ in range(300)] + [rbt.pop_min().value for _ in range(300)]
+    assert popped == sorted(keys)[-2:-302:-1] + sorted(keys)[:300]
+    check_rb_invariants(rbt)
+    assert [node.value for node in rbt] == sorted(keys)[300:-301]
+    assert rbt.peek_min() is rbt.search(sorted(keys)[300])
+
+    rbt.delete_node(rbt.search(sorted(keys)[500]))
+    assert rbt.search(sorted(keys)[500]) == RBTree.nil and len(rbt) == 398
+
+
+def test_tree_layout_and_changes():
+    rbt = RBTree()
+    for key in (2, 1, 3):
+        rbt.insert(key, f"task {key}")
+
+    layout, summaries = layout_tree(rbt)
+    assert layout[2] == (1, 0, "black", "task 2", None) and not summaries
+    assert (layout[1].x, layout[1].y, layout[1].parent) == (0, -1, 2)
+    assert (layout[3].x, layout[3].y) == (2, -1)
+    assert layout_bounds(layout) == (-.5, 2.5, -1.5, .5)
+
+    assert layout_changes(layout, layout_tree(rbt)[0]) == (set(), [])
+    rbt.search(3).task = "renamed"
+    assert layout_changes(layout, layout_tree(rbt)[0]) == (set(), [3])
+    rbt.delete(1)
+    # ranks shift left once the lowest priority is gone
+    assert layout_changes(layout, layout_tree(rbt)[0]) == ({1}, [2, 3])
+
+
+def test_tree_layout_culls_and_summarises():
+    rbt = RBTree.from_sorted((key, str(key)) for key in range(100_000))
+
+    nodes, summaries = layout_tree(rbt, viewport=(-.5, 99_999.5, -6.5, .5))
+    assert len(nodes) == 2 ** 7 - 1
+    assert sum(summary.count for summary in summaries) + len(nodes) == len(rbt)
+    assert [summary.lo for summary in summaries] == sorted(summary.lo for summary in summaries)
+
+    summary = summary_at(summaries, summaries[0].x, summaries[0].y)
+    assert summary is summaries[0] and summary_at(summaries, -10, 0) is None
+    nodes, summaries = layout_tree(rbt, viewport=expanded_viewport(summary), min_width=2)
+    assert all(summary.x_lo - .5 <= node.x <= summary.x_hi + .5 or node.y > summary.y for node in nodes.values())
+    assert all(node.x == node_value for node_value, node in nodes.items())
+    assert len(nodes) + len(summaries) < 200
+
+
+def test_tree_layout_cancel():
+    rbt = RBTree.from_sorted((key, str(key)) for key in range(10_000))
+    cancel = threading.Event()
+    assert layout_tree(rbt, cancel=cancel) is not None
+    cancel.set()
+    assert layout_tree(rbt, cancel=cancel) is None
+
+
+@pytest.mark.parametrize("n_tasks", [0, 10, 5_000])
+def test_tree_layout_benchmark_runs(n_tasks):
+    tree = RBTree.from_sorted((priority, f"task {priority}") for priority in range(n_tasks))
+    rows = zoom_in(tree, n_tasks)
+    # zooming ends with a view that has nothing left to summarise, or after the last step
+    assert 1 <= len(rows) <= 3 and (not rows[-1][3] or len(rows) == 3)
+
+
+def test_task_service(tmp_path):
+    service = TaskService(TaskStore(str(tmp_path)), RWLock())
+    assert service.add(5, "first") == ADDED
+    assert service.add(5, "second") == CHANGED
+    assert service.find(5) == "second"
+    assert service.change(6, "missing") is False
+    assert service.delete(6) is False
+    with pytest.raises(ValueError):
+        service.add(7, "")
+
+    assert run_script(service, ["add 1 'write report'", "# comment", "", "delete 5", "find 1"], quiet=True) == 3
+    assert service.find(1) == "write report" and service.find(5) is None
+    service.close()
+
+    # the service only went through the store, so everything is back after a restart
+    reopened = TaskService(TaskStore(str(tmp_path)))
+    assert [(node.value, node.task) for node in reopened.tree] == [(1, "write report")]
+    reopened.close()
+
+
+def test_instrumented_rbt():
+    random.seed(17)
+    plain, counted = RBTree(), InstrumentedRBTree()
+    keys = random.sample(range(10_000), 2000)
+    for key in keys:
+        plain.insert(key, str(key))
+        counted.insert(key, str(key))
+    for key in keys[::3]:
+        plain.delete(key)
+        counted.delete(key)
+
+    # recording must not change how the tree is shaped
+    shape = lambda tree: [(node.value, node.color, node.parent and node.parent.value) for node in tree.pre_order()]
+    assert shape(counted) == shape(plain)
+    check_rb_invariants(counted)
+
+    stats = counted.stats.as_dict()
+    assert stats["fixup_calls"]["insert"] > 0 and stats["fixup_iterations"]["delete"] > 0
+    assert stats["rotations"]["left"] + stats["rotations"]["right"] > 0
+    assert stats["path_length"]["insert"]["count"] == len(keys)
+    assert stats["latency_seconds"]["delete"]["count"] == len(keys[::3])
+    counted.search(keys[1])
+    counted.search(-1)
+    assert counted.stats.paths["search"].count == 2
+    assert 'rbtree_rotations_total{direction="left"}' in counted.stats.prometheus()
+    assert 'rbtree_operation_seconds_bucket{op="search",le="+Inf"} 2' in counted.stats.prometheus()
+
+    # a live tree is switched on and off without copying
+    instrument(plain)
+    plain.insert(-5, "x")
+    assert isinstance(uninstrument(plain), TreeStats) and type(plain) is RBTree
+    assert plain.search(-5).task == "x"
+
+    # subclasses keep their own behaviour while recorded and get their class back
+    arena_tree = instrument(ArenaRBTree())
+    for key in range(10):
+        arena_tree.insert(key, "shared")
+    assert isinstance(arena_tree, ArenaRBTree) and len(arena_tree.arena) == 1
+    assert arena_tree.stats.fixup_calls["insert"] > 0 and arena_tree.stats.rotations["left"] > 0
+    uninstrument(arena_tree)
+    assert type(arena_tree) is ArenaRBTree
+
+    histogram = Histogram((1, float("inf")))
+    histogram.observe(1234567.125)
+    assert "_sum{op=\"x\"} 1234567.125" in "\n".join(histogram.prometheus("t", 'op="x"'))
+
+
+def check_bplus_invariants(tree):
+    """ sorted unique keys within separator bounds, every non-root node at least half full, correct child counts,
+    all leaves at one depth and linked in order """
+
+    least = tree.fanout // 2
+    leaves = []
+
+    def walk(node, lo, hi, is_root):
+        assert len(node.keys) <= tree.fanout and (is_root or len(node.keys) >= least)
+        assert all((lo is None or key >= lo) and (hi is None or key < hi) for key in node.keys)
+        if type(node) is _Leaf:
+            assert list(node.keys) == sorted(set(node.keys)) and len(node.tasks) == len(node.keys)
+            leaves.append(node)
+            return len(node.keys), 1
+        assert len(node.children) == len(node.counts) == len(node.keys) + 1
+        bounds = [lo] + list(node.keys) + [hi]
+        walked = [walk(child, bounds[i], bounds[i + 1], False) for i, child in enumerate(node.children)]
+        assert [count for count, _ in walked] == list(node.counts)
+        assert len({depth for _, depth in walked}) == 1
+        return sum(node.counts), walked[0][1] + 1
+
+    assert walk(tree.root, None, None, True)[0] == len(tree)
+    assert all(left.next is right and right.prev is left for left, right in zip(leaves, leaves[1:]))
+
+
+@pytest.mark.parametrize("fanout", [4, 5, 64])
+def test_bplus_tree(fanout):
+    rng = random.Random(fanout)
+    tree, expected = BPlusTree(fanout), {}
+    for step in range(10_000):
+        key = rng.randrange(2_000)
+        if key in expected and rng.random() < .55:
+            tree.delete(key)
+            del expected[key]
+        else:
+            tree.insert(key, str(key))
+            expected[key] = str(key)
+    check_bplus_invariants(tree)
+
+    items = sorted(expected.items())
+    keys = [key for key, _ in items]
+    assert list(tree.items()) == items == [(entry.value, entry.task) for entry in tree]
+    assert [entry.value for entry in tree.range(300, 700)] == [key for key in keys if 300 <= key <= 700]
+    for value in (-1, 0, 999, 2_000):
+        assert tree.rank(value) == len([key for key in keys if key > value])
+        below, above = [key for key in keys if key <= value], [key for key in keys if key >= value]
+        assert tree.floor(value) == tree.nil if not below else tree.floor(value).value == below[-1]
+        assert tree.ceiling(value) == tree.nil if not above else tree.ceiling(value).value == above[0]
+    assert tree.select(0).value == keys[-1] and tree.select(len(keys) - 1).value == keys[0]
+
+    tree.search(keys[0]).task = "changed"
+    assert tree.search(keys[0]).task == "changed" and tree.search(-1) == tree.nil
+
+    rebuilt = BPlusTree.from_sorted(items, fanout)
+    check_bplus_invariants(rebuilt)
+    assert list(rebuilt.items()) == items
+
+    half = len(keys) // 2
+    popped = [rebuilt.pop_max().value for _ in range(half)] + [rebuilt.pop_min().value for _ in keys[half:]]
+    assert popped == keys[::-1][:half] + keys[:len(keys) - half] and rebuilt.pop_min() == rebuilt.nil
+    check_bplus_invariants(rebuilt)
+
+
+def test_task_store_backends(tmp_path):
+    """ a store written with one backend opens with any other """
+
+    store = TaskStore(str(tmp_path), compact_every=40, tree_cls=BPlusTree)
+    for priority in range(100):
+        store.insert(priority, f"task {priority}")
+    store.delete(5)
+    store.update(6, "changed")
+    store.close()
+
+    for tree_cls in (RBTree, AVLTree, BPlusTree, ArenaRBTree, PersistentRBTree, ArrayRBTree):
+        store = TaskStore(str(tmp_path), tree_cls=tree_cls)
+        assert len(store.tree) == 99 and store.search(6).task == "changed" and store.search(5) == store.tree.nil
+        store.close()
+
+
+@pytest.mark.parametrize("backend", [RBTree, AVLTree, BPlusTree, ArrayRBTree])
+def test_task_multimap(backend):
+    multimap = TaskMultiMap.of(backend)()
+    for i in range(3_000):
+        multimap.insert(i % 50, f"task {i}")
+
+    # the tree only grows with the number of distinct priorities
+    assert len(multimap) == 3_000 and multimap.priorities() == 50 == len(multimap.tree)
+    assert multimap.search(7).task == "task 7" and list(multimap.bucket(7))[:2] == ["task 7", "task 57"]
+    assert [(entry.value, entry.task) for entry in multimap.range(3, 3)][:2] == [(3, "task 3"), (3, "task 53")]
+
+    popped = [multimap.pop_max() for _ in range(61)]
+    assert [entry.task for entry in popped[:3]] == ["task 49", "task 99", "task 149"]
+    assert popped[60].value == 48 and popped[60].task == "task 48"
+    multimap.delete(0)
+    assert multimap.pop_min().task == "task 50"
+
+    rebuilt = TaskMultiMap.of(backend).from_sorted((entry.value, entry.task) for entry in multimap)
+    assert [(entry.value, entry.task) for entry in rebuilt] == [(entry.value, entry.task) for entry in multimap]
+    while rebuilt.pop_min() != rebuilt.nil:
+        pass
+    assert len(rebuilt) == 0 and rebuilt.priorities() == 0
+
+
+@pytest.mark.parametrize("backend", [PersistentRBTree, ArenaRBTree])
+def test_task_multimap_refuses_backends(backend):
+    with pytest.raises(ValueError):
+        TaskMultiMap.of(backend)
+
+
+def test_task_multimap_store(tmp_path):
+    service = TaskService(TaskStore(str(tmp_path), compact_every=25, tree_cls=TaskMultiMap))
+    for i in range(60):
+        assert service.add(i % 3, f"task {i}") == ADDED
+    service.delete(1)
+    assert service.change(2, "changed") and service.find(2) == "changed"
+    # deadlines are refused before anything is queued or logged
+    with pytest.raises(ValueError):
+        service.add(5, "timed", ttl=10)
+    assert service.find(5) is None and len(service.tree) == 59
+    service.close()
+
+    # log replay and snapshots keep the queue order of every priority
+    reopened = TaskStore(str(tmp_path), tree_cls=TaskMultiMap)
+    assert len(reopened.tree) == 59 and list(reopened.tree.bucket(1))[:2] == ["task 4", "task 7"]
+    assert list(reopened.tree.bucket(2))[:2] == ["changed", "task 5"]
+    reopened.close()
+
+
+def test_task_server_multimap():
+    async def scenario():
+        server = TaskServer(TaskMultiMap())
+        await server.start(port=0)
+        for i in range(4):
+            assert await server.insert(5, f"task {i}") == "added"
+        assert server.pop() == [5, "task 0"] and server.delete(5)
+        assert await server.execute({"op": "find", "priority": 5}) == {"id": None, "ok": True, "result": "task 2"}
+        await server.close()
+
+    asyncio.run(scenario())
+
+
+def scan_text(tree, matches) -> list:
+    return sorted({node.value for node in tree if matches(node.task.casefold())})
+
+
+@pytest.mark.parametrize("tree_cls", [RBTree, TaskMultiMap])
+def test_text_index(tmp_path, tree_cls):
+    rng = random.Random(23)
+    words = ["write", "Report", "call", "bob", "fix", "bug", "12"]
+    describe = lambda: " ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) + f" #{rng.randrange(300)}"
+    service = TaskService(TaskStore(str(tmp_path), compact_every=500, tree_cls=tree_cls, text_index=True))
+    for _ in range(3000):
+        priority = rng.randrange(600)
+        action = rng.random()
+        if action < 0.55:
+            service.add(priority, describe())
+        elif action < 0.75:
+            # in place, the path the index could miss
+            service.change(priority, describe())
+        else:
+            service.delete(priority)
+
+    def check(tree, index):
+        for text in ("write report", "bob", "12", "nothing here", "fix bug #7"):
+            tokens = text.casefold().split()
+            assert index.find_tokens(text) == scan_text(tree, lambda task: set(tokens) <= set(re.findall(r"\w+", task)))
+            assert index.find_prefix(text) == scan_text(tree, lambda task: task.startswith(text.casefold()))
+        task = tree.peek_max().task
+        assert index.find_exact(task.upper()) == scan_text(tree, lambda other: other == task.casefold())
+        assert index.find_prefix("") == sorted({node.value for node in tree})
+
+    check(service.tree, service.store.index)
+    assert service.find_text("REPORT write") == service.store.index.find_tokens("write report")
+    assert run_script(service, ["search bob", "prefix call", "exact nothing"], quiet=True) == 3
+    service.close()
+
+    # rebuilt from the snapshot and logs it matches the index kept in sync by hand
+    reopened = TaskStore(str(tmp_path), tree_cls=tree_cls, text_index=True)
+    check(reopened.tree, reopened.index)
+    reopened.close()
+
+    # opened without an index, the first search builds it and later changes keep it in sync
+    lazy = TaskService(TaskStore(str(tmp_path), tree_cls=tree_cls))
+    assert lazy.store.index is None
+    assert lazy.find_text("bob") == scan_text(lazy.tree, lambda task: "bob" in re.findall(r"\w+", task))
+    lazy.add(1000, "lazy bob")
+    check(lazy.tree, lazy.store.index)
+    lazy.close()
+
+
+def test_search_mode():
+    assert search_mode("write report") == ("tokens", "write report")
+    assert search_mode(' "write report" ') == ("exact", "write report")
+    assert search_mode("wri*") == ("prefix", "wri")
+    assert search_mode('"') == ("tokens", '"') and search_mode("*") == ("tokens", "*")
+
+
+def test_text_index_many_descriptions():
+    index = TextIndex()
+    for priority in random.Random(5).sample(range(5000), 5000):
+        index.add(priority, f"task {priority:05}")
+    assert len(index.descriptions.blocks) > 1
+    assert index.find_prefix("task 0012") == list(range(120, 130))
+    assert len(index.find_prefix("task", limit=7)) == 7
+    for priority in range(0, 5000, 2):
+        index.remove(priority, f"TASK {priority:05}")
+    assert index.find_prefix("task 0012") == list(range(121, 130, 2))
+    assert len(index) == len(index.descriptions) == 2500
+    assert index.find_tokens("task") == list(range(1, 5000, 2))
+
+
+def test_timer_wheel():
+    rng = random.Random(31)
+    now = [0.]
+    fired = []
+    # small slots and few levels so cascades and deadlines beyond the top level both happen
+    wheel = TimerWheel(resolution=1, slot_bits=3, levels=3, clock=lambda: now[0], on_expire=fired.append)
+    deadlines = {key: rng.uniform(0, 2000) for key in range(3000)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    for key in range(0, 3000, 7):
+        assert wheel.cancel(key)
+        del deadlines[key]
+    assert not wheel.cancel(0) and wheel.deadline(1) == deadlines[1]
+
+    while now[0] < 2100:
+        now[0] += rng.uniform(0, 40)
+        expired = wheel.advance()
+        assert len(expired) == len(set(expired))
+        # never before the deadline, at most one tick after it
+        assert set(expired) == {key for key, deadline in deadlines.items() if math.ceil(deadline) <= int(now[0])}
+        assert all(deadlines[key] <= now[0] for key in expired)
+        # tick by tick, deadlines inside the tick the wheel started at come out with the next one
+        ticks = [max(1, math.ceil(deadlines.pop(key))) for key in expired]
+        assert ticks == sorted(ticks)
+        # deadlines in the past expire with the next tick, not never
+        key = f"late {now[0]}"
+        wheel.schedule(key, now[0] - 5)
+        deadlines[key] = (int(now[0]) + 1)
+    assert len(fired) > 2500 and len(wheel) == len(deadlines)
+
+
+def test_task_service_deadlines(tmp_path):
+    now = [100.]
+    expired = []
+    service = TaskService(TaskStore(str(tmp_path)), clock=lambda: now[0], on_expire=lambda *item: expired.append(item),
+                          wall_clock=lambda: now[0] + 10 ** 9)
+    service.add(1, "short", ttl=5)
+    service.add(2, "long", ttl=50)
+    service.add(3, "forever")
+    assert service.expire_in(3, 20) and not service.expire_in(4, 20)
+    service.add(1, "renamed")
+    assert service.deadline(1) == 105 and service.deadline(3) == 120
+
+    now[0] = 110
+    assert service.expire() == [(1, "renamed")] and expired == [(1, "renamed")]
+    service.delete(3)
+    now[0] = 200
+    assert service.expire() == [(2, "long")] and len(service) == 0
+    service.close()
+    assert list(TaskStore(str(tmp_path)).tree) == []
+
+    # deadlines are stored as wall-clock times and come back after a restart, from the log and from a snapshot
+    service = TaskService(TaskStore(str(tmp_path)), clock=lambda: now[0], wall_clock=lambda: now[0] + 10 ** 9)
+    service.add(4, "kept", ttl=30)
+    service.add(5, "dropped", ttl=30)
+    service.delete(5)
+    service.close()
+    now[0] = 500
+    service = TaskService(TaskStore(str(tmp_path)), clock=lambda: now[0] + 7, wall_clock=lambda: now[0] + 10 ** 9)
+    assert service.store.deadlines == {4: 200 + 30 + 10 ** 9} and service.deadline(5) is None
+    service.store.compact()
+    service.close()
+    service = TaskService(TaskStore(str(tmp_path)), clock=lambda: now[0], wall_clock=lambda: now[0] + 10 ** 9)
+    assert service.store.deadlines == {4: 200 + 30 + 10 ** 9}
+    # its time passed while the service was down, so the next tick expires it
+    now[0] += 1
+    assert service.expire() == [(4, "kept")]
+    service.close()
+
+
+class FailingRBTree(RBTree):
+    """ RBTree failing on negative priorities the way a full disk would fail a write """
+
+    def insert(self, value: int, task: str):
+        if value < 0:
+            raise OSError("no space left on device")
+        super(FailingRBTree, self).insert(value, task)
+
+
+def test_sharded_store():
+    rng = random.Random(41)
+    store = ShardedStore(4, lo=0, hi=4000, rebalance_every=10 ** 9)
+    try:
+        expected = {}
+        requests = []
+        for _ in range(4000):
+            priority = rng.randrange(4000)
+            op = rng.choice(("insert", "insert", "delete", "find"))
+            requests.append((op, (priority, f"task {priority}") if op == "insert" else (priority,)))
+        for (op, args), result in zip(requests, store.execute_many(requests)):
+            if op == "insert":
+                assert result == (CHANGED if args[0] in expected else ADDED)
+                expected[args[0]] = args[1]
+            elif op == "delete":
+                assert result == (expected.pop(args[0], None) is not None)
+            else:
+                assert result == expected.get(args[0])
+        assert len(store) == len(expected)
+
+        # scans across shard boundaries come back in order
+        in_range = sorted(item for item in expected.items() if 900 <= item[0] <= 3100)
+        assert store.range(900, 3100) == in_range and store.range(900, 3100, limit=5) == in_range[:5]
+        top = sorted(expected.items(), reverse=True)[:50]
+        assert store.pop_max(50) == top
+        for priority, _ in top:
+            del expected[priority]
+
+        # everything new lands in the lowest shard until rebalance spreads it over the neighbours
+        for priority in range(-3000, 0):
+            store.insert(priority, "hot")
+            expected[priority] = "hot"
+        assert max(store.sizes()) > 2 * len(store) / 4
+        assert store.rebalance() > 0
+        assert max(store.sizes()) <= 2 * len(store) / 4 and store.bounds == sorted(store.bounds)
+        assert store.range(-10 ** 6, 10 ** 6) == sorted(expected.items())
+        assert store.find(-1) == "hot" and store.find(4000) is None
+    finally:
+        store.close()
+
+    # winners spread over several shards, and a top shard left empty
+    store = ShardedStore(4, lo=0, hi=1000, rebalance_every=10 ** 9)
+    try:
+        for priority in (100, 300, 600, 900):
+            store.insert(priority, "t")
+        assert store.pop_max(2) == [(900, "t"), (600, "t")]
+        assert store.pop_max(1) == [(300, "t")] and store.range(0, 999) == [(100, "t")]
+    finally:
+        store.close()
+
+    # a request failing with any error is reported and leaves its shard serving
+    store = ShardedStore(2, lo=0, hi=1000, tree_cls=FailingRBTree)
+    try:
+        with pytest.raises(OSError):
+            store.insert(-1, "does not fit")
+        assert store.insert(999, "t") == ADDED and store.find(999) == "t"
+    finally:
+        store.close()
+    with pytest.raises(ValueError):
+        ShardedStore(2, tree_cls=TaskMultiMap)
+
+
+def test_arena_rbt():
+    rng = random.Random(47)
+    plain, arena = RBTree(), ArenaRBTree()
+    for _ in range(3000):
+        key, task = rng.randrange(1000), f"call customer {rng.randrange(20)}"
+        if plain.search(key) != plain.nil:
+            plain.search(key).task = arena.search(key).task = task
+        else:
+            plain.insert(key, task)
+            arena.insert(key, task)
+        if rng.random() < .2:
+            plain.delete(key)
+            arena.delete(key)
+    check_rb_invariants(arena)
+    assert [(node.value, str(node)) for node in arena] == [(node.value, str(node)) for node in plain]
+
+    def check_refcounts():
+        counts = {}
+        for node in arena:
+            counts[node.task] = counts.get(node.task, 0) + 1
+        assert {text: arena.arena.refcounts[arena.arena.ids[text]] for text in arena.arena.ids} == counts
+
+    check_refcounts()
+    assert len(arena.arena) <= 20
+
+    # popped nodes keep their text while the freed ids are handed to new descriptions
+    popped = [arena.pop_max() for _ in range(10)] + [arena.pop_min() for _ in range(10)]
+    expected = [plain.pop_max() for _ in range(10)] + [plain.pop_min() for _ in range(10)]
+    for node in list(arena):
+        arena.search(node.value).task = f"unique {node.value}"
+    assert [node.task for node in popped] == [node.task for node in expected]
+    check_refcounts()
+
+    # small batches delete node by node, large ones relink the tree
+    for step in (None, 2):
+        batch = [node.value for node in arena][:3] if step is None else [node.value for node in arena][::step]
+        assert arena.delete_many(batch) == len(batch)
+        check_rb_invariants(arena)
+        check_refcounts()
+    arena.delete_many([node.value for node in arena])
+    assert len(arena.arena) == 0 and len(arena.arena.free) == len(arena.arena.texts)
+
+
+def check_llrb_invariants(tree):
+    """ left-leaning red-black shape: red links lean left, never two in a row, equal black height """
+
+    def walk(node, lo, hi):
+        if node == tree.nil:
+            return 1
+        assert (lo is None or lo < node.value) and (hi is None or node.value < hi)
+        assert node.right.color == "black"
+        assert node.color == "black" or node.left.color == "black"
+        assert node.size == node.left.size + node.right.size + 1
+        left_height = walk(node.left, lo, node.value)
+        assert left_height == walk(node.right, node.value, hi)
+        return left_height + (node.color == "black")
+
+    assert tree.root.color == "black"
+    walk(tree.root, None, None)
+
+
+@pytest.mark.parametrize("n_tasks", [0, 1, 2, 3, 5, 7, 8, 26, 100, 1000])
+def test_persistent_rbt_from_sorted(n_tasks):
+    tree = PersistentRBTree.from_sorted((key, str(key)) for key in range(n_tasks))
+    check_llrb_invariants(tree)
+    assert [node.value for node in tree] == list(range(n_tasks)) and len(tree) == n_tasks
+    tree.insert(n_tasks // 2, "changed")
+    tree.delete(0)
+    check_llrb_invariants(tree)
+
+    with pytest.raises(ValueError):
+        PersistentRBTree.from_sorted([(2, "b"), (1, "a")])
+
+
+def test_persistent_rbt():
+    rng = random.Random(53)
+    tree, expected, versions = PersistentRBTree(), {}, []
+    for step in range(6000):
+        key = rng.randrange(1000)
+        if key in expected and rng.random() < .45:
+            tree.delete(key)
+            del expected[key]
+        else:
+            tree.insert(key, f"{key} at {step}")
+            expected[key] = f"{key} at {step}"
+        if step % 500 == 0:
+            versions.append((tree.snapshot(), sorted(expected.items())))
+    check_llrb_invariants(tree)
+    assert [(node.value, node.task) for node in tree] == sorted(expected.items())
+
+    # every snapshot still shows its point in time, untouched by the changes after it
+    for snapshot, items in versions:
+        check_llrb_invariants(snapshot)
+        assert [(node.value, node.task) for node in snapshot] == items and len(snapshot) == len(items)
+
+    # a change copies its path and shares everything else
+    before = tree.snapshot()
+    tree.insert(-1, "new")
+    shared = {id(node) for node in before} & {id(node) for node in tree}
+    assert len(tree) - len(shared) <= 2 * len(tree).bit_length() + 2
+
+    current = [(node.value, node.task) for node in tree]
+    tree.replace(-1, "renamed")
+    tree.delete(current[-1][0])
+    assert tree.undo() == (current[-1][0], current[-1][1], None)
+    assert tree.undo() == (-1, "new", "renamed")
+    assert [(node.value, node.task) for node in tree] == current
+    assert tree.redo() == (-1, "new", "renamed") and tree.search(-1).task == "renamed"
+    tree.insert(-2, "drops the redo")
+    assert tree.redo() is None
+
+    # writing to a snapshot leaves its source alone
+    source = PersistentRBTree.from_sorted((key, "original") for key in range(10))
+    fork = source.snapshot()
+    for key in range(100, 110):
+        fork.insert(key, "fork")
+    fork.replace(5, "changed in the fork")
+    fork.delete(3)
+    assert [(node.value, node.task) for node in source] == [(key, "original") for key in range(10)]
+    assert fork.search(5).task == "changed in the fork" and len(fork) == 19
+
+    rebuilt = PersistentRBTree.from_sorted(current)
+    check_llrb_invariants(rebuilt)
+    assert [(node.value, node.task) for node in rebuilt] == current and rebuilt.undo() is None
+    assert sorted(layout_tree(rebuilt)[0]) == [node.value for node in rebuilt]
+
+
+def test_task_service_undo(tmp_path):
+    service = TaskService(TaskStore(str(tmp_path), tree_cls=PersistentRBTree, text_index=True))
+    service.add(1, "first")
+    service.add(2, "second")
+    service.add(1, "changed")
+    service.delete(2)
+    assert service.undo() and service.undo()
+    assert service.find(1) == "first" and service.find(2) == "second"
+    assert service.redo() and service.find(1) == "changed"
+    assert service.find_text("first") == [] and service.find_text("changed") == [1]
+    assert run_script(service, ["undo", "undo", "undo", "undo"], quiet=True) == 4
+    assert len(service) == 0 and not service.undo()
+    service.redo()
+    service.close()
+
+    # the log holds what undo and redo did, and the next session starts without history
+    reopened = TaskService(TaskStore(str(tmp_path), tree_cls=PersistentRBTree))
+    assert [(node.value, node.task) for node in reopened.tree] == [(1, "first")] and not reopened.undo()
+    reopened.close()
+    plain = TaskService(TaskStore(str(tmp_path)))
+    with pytest.raises(ValueError):
+        plain.undo()
+    plain.close()
+
+    # undo and redo keep the deadlines in step with the tasks
+    now = [0.]
+    service = TaskService(TaskStore(str(tmp_path / "deadlines"), tree_cls=PersistentRBTree),
+                          clock=lambda: now[0], wall_clock=lambda: now[0])
+    service.add(7, "timed", ttl=10)
+    assert service.undo() and service.deadline(7) is None and service.store.deadlines == {}
+    assert service.redo() and service.deadline(7) == 10
+    service.delete(7)
+    assert service.undo() and service.deadline(7) == 10
+    service.close()
+    reopened = TaskStore(str(tmp_path / "deadlines"), tree_cls=PersistentRBTree)
+    assert reopened.deadlines == {7: 10}
+    reopened.close()
@@ -0,0 +1,93 @@
+""" positions, colours and labels of tree nodes for DisplayTree, kept free of any GUI imports
+
+A node's x is its in-order rank, so nodes never collapse onto each other however deep the tree is, and its
+y is minus its depth. Subtrees outside the viewport are skipped, and subtrees that are too narrow to tell their
+nodes apart or that lie below the viewport become one summary glyph. The work is bounded by what is visible,
+not by the size of the tree. Subtree sizes come from RBTree's order-statistic augmentation.
+"""
+
+from collections import namedtuple
+
+NodeLayout = namedtuple("NodeLayout", "x y color label parent")
+SummaryLayout = namedtuple("SummaryLayout", "x y count lo hi x_lo x_hi parent")
+
+UNBOUNDED = (float("-inf"), float("inf"), float("-inf"), float("inf"))
+CANCEL_CHECK = 1024
+
+
+def layout_tree(tree, viewport: tuple = None, min_width: float = 0., cancel=None) -> tuple:
+    """ returns (nodes, summaries): priority -> NodeLayout for drawn nodes and a list of SummaryLayout
+
+    viewport is (x_min, x_max, y_min, y_max) in layout units, None lays out the whole tree. A subtree with more
+    than one node spanning less than min_width units is summarised. cancel is an optional threading.Event,
+    checked every CANCEL_CHECK nodes; a cancelled layout returns None.
+    """
+
+    nodes, summaries = {}, []
+    nil = tree.nil
+    if tree.root == nil:
+        return nodes, summaries
+
+    x_min, x_max, y_min, _ = viewport or UNBOUNDED
+    stack = [(tree.root, 0, 0, None)]
+    visited = 0
+    while stack:
+        visited += 1
+        if cancel is not None and visited % CANCEL_CHECK == 0 and cancel.is_set():
+            return None
+        node, base, depth, parent = stack.pop()
+        size = node.size
+        if base + size - 1 < x_min or base > x_max:
+            continue
+
+        if size > 1 and (size < min_width or -depth < y_min):
+            lo, hi = node, node
+            while lo.left != nil:
+                lo = lo.left
+            while hi.right != nil:
+                hi = hi.right
+            summaries.append(SummaryLayout((2 * base + size - 1) / 2, -depth, size, lo.value, hi.value,
+                                           base, base + size - 1, parent))
+            continue
+
+        x = base + node.left.size
+        nodes[node.value] = NodeLayout(x, -depth, node.color, node.task, parent)
+        if node.right != nil:
+            stack.append((node.right, x + 1, depth + 1, node.value))
+        if node.left != nil:
+            stack.append((node.left, base, depth + 1, node.value))
+    return nodes, summaries
+
+
+def layout_changes(old: dict, new: dict) -> tuple:
+    """ (removed, changed) priorities between two layouts; changed covers new, moved, recoloured and relabelled """
+
+    removed = old.keys() - new.keys()
+    changed = [value for value, node in new.items() if old.get(value) != node]
+    return removed, changed
+
+
+def layout_bounds(nodes: dict, summaries: list = (), margin: float = .5) -> tuple:
+    """ (x_min, x_max, y_min, y_max) around all nodes and summaries """
+
+    points = [(node.x, node.y) for node in nodes.values()] + [(summary.x, summary.y) for summary in summaries]
+    if not points:
+        return -1., 1., -1., 1.
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return min(xs) - margin, max(xs) + margin, min(ys) - margin, max(ys) + margin
+
+
+def summary_at(summaries: list, x: float, y: float):
+    """ summary glyph covering the point, None if there is none """
+
+    for summary in summaries:
+        if summary.x_lo - .5 <= x <= summary.x_hi + .5 and abs(summary.y - y) <= .5:
+            return summary
+    return None
+
+
+def expanded_viewport(summary: SummaryLayout, levels: int = 4) -> tuple:
+    """ viewport that opens a summarised subtree a few levels down """
+
+    return summary.x_lo - .5, summary.x_hi + .5, summary.y - levels - .5, summary.y + .5